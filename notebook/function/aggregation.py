@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+
+
+def _segment_starts(codes):
+    # 並べ替え済みのキーのコード列から、値が変わる位置（各グループの先頭）を求める
+    n = len(codes[0]) if codes else 0
+    if n == 0:
+        return np.array([], dtype=np.int64)
+    changed = np.zeros(n, dtype=bool)
+    changed[0] = True
+    for code in codes:
+        code = np.asarray(code)
+        changed[1:] |= code[1:] != code[:-1]
+    return np.flatnonzero(changed)
+
+
+def _key_of(values, position):
+    key = tuple(value[position] for value in values)
+    return key[0] if len(key) == 1 else key
+
+
+def split_by(df, keys):
+    """
+    データフレームを keys の値ごとに分割し、(キー, 部分データフレーム) を順に返します。
+    キーごとに df[df[key] == value] で絞り込む代わりに、1回の並べ替えで全グループを切り出します。
+
+    Parameters:
+    - df (pd.DataFrame): 入力データフレーム
+    - keys (list): 分割キーの列（1列の場合はキーをスカラーで返す）
+
+    Yields:
+    (キー, pd.DataFrame)
+    """
+    keys = list(keys)
+    if df.empty:
+        return
+
+    # キーを整数コードにしてから安定ソート（同じキーの中では元の行順を保つ）
+    codes = [pd.factorize(df[key], sort=True)[0] for key in keys]
+    order = np.lexsort(codes[::-1])
+    sorted_df = df.iloc[order]
+    sorted_codes = [code[order] for code in codes]
+
+    starts = _segment_starts(sorted_codes)
+    ends = np.append(starts[1:], len(sorted_df))
+    key_values = [sorted_df[key].to_numpy() for key in keys]
+    for start, end in zip(starts, ends):
+        yield _key_of(key_values, start), sorted_df.iloc[start:end]
+
+
+# 密な (グループ × 期間) 配列で集計する上限のセル数（超える場合は groupby で集計する）
+MAX_DENSE_CELLS = 50_000_000
+
+# 整数のキーを値そのままのコードとして使う値の範囲の上限
+MAX_DIRECT_RANGE = 1_000_000
+
+_NS_PER_DAY = 86_400 * 10**9
+
+
+def _codes(series):
+    # キーを 0 始まりの整数コードと、コードに対応する値に変換する（値の昇順）
+    if isinstance(series.dtype, pd.CategoricalDtype) and not series.isna().any():
+        return series.cat.codes.to_numpy().astype(np.int64), series.cat.categories
+    values = series.to_numpy()
+    if np.issubdtype(values.dtype, np.integer) and len(values):
+        low, high = int(values.min()), int(values.max())
+        if high - low < MAX_DIRECT_RANGE:
+            # 店舗ID などの範囲の狭い整数はハッシュせずに値の差をそのままコードにする
+            return values.astype(np.int64) - low, np.arange(low, high + 1)
+    code, unique = pd.factorize(series, sort=True)
+    return code.astype(np.int64), unique
+
+
+def _date_bins(dates, freq):
+    # 日付を日単位の整数にして、日ごとに期間の番号を求める（日付の種類は数百程度なので安価）
+    nanoseconds = dates.to_numpy().astype("datetime64[ns]").view(np.int64)
+    days = nanoseconds // _NS_PER_DAY
+    if len(days) and (days * _NS_PER_DAY == nanoseconds).all():
+        first_day = int(days.min())
+        date_codes = days - first_day
+        unique_dates = pd.to_datetime(
+            np.arange(first_day, int(days.max()) + 1) * _NS_PER_DAY
+        )
+    else:
+        date_codes, unique_dates = pd.factorize(dates, sort=True)
+    grouped = pd.Series(np.arange(len(unique_dates)), index=pd.DatetimeIndex(unique_dates)).groupby(
+        pd.Grouper(freq=freq)
+    )
+    bin_of_date = grouped.ngroup().to_numpy()
+    labels = grouped.size().index
+    return bin_of_date[date_codes], labels
+
+
+def _group_codes(df, keys):
+    # 複数のキーを1つの整数コードにまとめる（キーの値の辞書順）
+    codes = []
+    uniques = []
+    for key in keys:
+        code, unique = _codes(df[key])
+        codes.append(code)
+        uniques.append(unique)
+    shape = [len(unique) for unique in uniques]
+    combined = np.ravel_multi_index(codes, shape) if len(codes) > 1 else codes[0]
+
+    if np.prod(shape, dtype=np.float64) <= max(len(df), 1):
+        # キーの組み合わせが行数以下なら、組み合わせのコードをそのまま使う（値のない組み合わせは後で除く）
+        n_groups = int(np.prod(shape))
+        groups = np.arange(n_groups)
+        group_codes = combined
+    else:
+        group_codes, groups = pd.factorize(combined, sort=True)
+    group_keys = np.unravel_index(groups, shape)
+    key_values = [np.asarray(unique)[code] for unique, code in zip(uniques, group_keys)]
+    return group_codes, key_values
+
+
+def iter_series(df, keys, value, freq="D", fill=True, date_column="日付"):
+    """
+    keys の値ごとに value を期間で集計した時系列を、全行に対する1回の集計で計算して順に返します。
+    キーと期間を整数コードにして (グループ × 期間) の配列へ np.bincount で足し込むので、
+    系列の数が増えても行の走査は1回だけです。
+
+    Parameters:
+    - df (pd.DataFrame): 入力データフレーム（生データ、または SalesCube.rollup の結果）
+    - keys (list): 系列を分けるキーの列（1列の場合はキーをスカラーで返す）
+    - value (str): 集計する列（'売上', '売上個数' など）
+    - freq (str): 期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと, 'Q': 四半期ごと, 'Y': 年ごと)
+    - fill (bool): 値のない期間を 0 で埋めるかどうか（pd.pivot_table と pd.Grouper で集計した場合と同じ）、デフォルトは True
+    - date_column (str): 日付の列、デフォルトは '日付'
+
+    Yields:
+    (キー, pd.Series): 日付をインデックスとする時系列（キーの昇順）
+    """
+    keys = list(keys)
+    if df.empty:
+        return
+
+    bin_codes, labels = _date_bins(df[date_column], freq)
+    group_codes, key_values = _group_codes(df, keys)
+    n_groups = len(key_values[0])
+    n_bins = len(labels)
+
+    if n_groups * n_bins > MAX_DENSE_CELLS:
+        yield from _iter_series_groupby(df, keys, value, freq, fill, date_column)
+        return
+
+    # (グループ, 期間) ごとの合計と件数を1回の走査で求める
+    cells = group_codes.astype(np.int64) * n_bins + bin_codes
+    values = df[value].to_numpy()
+    sums = np.bincount(cells, weights=values, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+    counts = np.bincount(cells, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+    if np.issubdtype(values.dtype, np.integer):
+        sums = sums.round().astype(np.int64)
+
+    for group in np.flatnonzero(counts.any(axis=1)):
+        observed = np.flatnonzero(counts[group])
+        if fill:
+            # 最初と最後の値のある期間の間を 0 で埋める（resample と同じ範囲）
+            positions = slice(observed[0], observed[-1] + 1)
+        else:
+            positions = observed
+        series = pd.Series(sums[group, positions], index=labels[positions], name=value)
+        series.index.name = date_column
+        yield _key_of(key_values, group), series
+
+
+def _iter_series_groupby(df, keys, value, freq, fill, date_column):
+    # グループ × 期間 が大きすぎる場合（商品ID単位など）は groupby の結果をグループごとに切り出す
+    grouped = (
+        df.groupby(keys + [pd.Grouper(key=date_column, freq=freq)], observed=True, sort=True)[value]
+        .sum()
+    )
+    index = grouped.index
+    starts = _segment_starts([index.codes[i] for i in range(len(keys))])
+    ends = np.append(starts[1:], len(grouped))
+    key_values = [index.get_level_values(i) for i in range(len(keys))]
+    dates = index.get_level_values(len(keys))
+    values = grouped.to_numpy()
+
+    for start, end in zip(starts, ends):
+        series = pd.Series(values[start:end], index=dates[start:end], name=value)
+        if fill:
+            series = series.resample(freq).sum()
+        yield _key_of(key_values, start), series
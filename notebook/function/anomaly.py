@@ -0,0 +1,303 @@
+"""
+売上個数の異常値検出。
+
+固定の閾値（売上個数 > 10 など）の代わりに、次の規則で全行を一括でスコアリングします。
+- 商品ごと・店舗ごとのロバストzスコア（中央値とMADによる）
+- 店舗 × 商品カテゴリ の日次合計の、同じ曜日の過去数週の中央値（季節ベースライン）からのずれ
+- 商品ごとの四分位範囲（IQR）による外れ値
+
+統計量は 年/月 のパーティションを順に読み込んで集計するので（1か月分ずつ2回走査）、全履歴にも使えます。
+出力の異常値テーブルは結合済みデータと同じ列を持つので、
+eda_sales_quantity_abnormal_value の描画関数（separate_plots）にそのまま渡せます。
+"""
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from . import schema
+from .cube import is_dataset
+
+# ロバストzスコアを計算する単位
+GROUP_KEYS = ["商品ID", "店舗ID"]
+
+# 季節ベースラインを計算する単位（日次合計）
+SEASONAL_KEYS = ["店舗ID", "商品カテゴリ"]
+
+# 正規分布の場合に MAD・平均絶対偏差 を標準偏差に換算する係数
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+# Iglewicz と Hoaglin の修正zスコアの目安
+DEFAULT_Z_THRESHOLD = 3.5
+DEFAULT_IQR_K = 1.5
+DEFAULT_SEASONAL_WEEKS = 4
+
+# 統計量の計算に使う列
+STATISTICS_COLUMNS = ["日付", "店舗ID", "商品ID", "商品カテゴリ"]
+
+
+def _first_where(groups, values, mask):
+    # 並べ替え済みの各グループで、mask が最初に True になる行の値
+    return pd.Series(values[mask], index=groups[mask]).groupby(level=0, sort=False).first()
+
+
+def _weighted_median_like(groups, values, weights, q):
+    # 値の昇順に並べた (グループ, 値, 件数) から、件数で重み付けした分位点を求める
+    # （下側と上側の分位点の平均。q=0.5 の場合は np.median と同じ値になる）
+    cumulative = pd.Series(weights).groupby(groups).cumsum().to_numpy()
+    total = pd.Series(weights).groupby(groups).transform("sum").to_numpy()
+    target = q * total
+    lower = _first_where(groups, values, cumulative >= target)
+    upper = _first_where(groups, values, cumulative > target)
+    return (lower + upper.reindex(lower.index)) / 2
+
+
+def histogram_statistics(counts):
+    """
+    (キー, 値) ごとの件数から、キーごとの 中央値・MAD・平均絶対偏差・第1/第3四分位 を正確に計算します。
+    売上個数のように値の種類が少ない列は、全行を保持せずに件数だけで分位点が求まります。
+
+    Parameters:
+    - counts (pd.Series): (キー, 値) の MultiIndex を持つ件数
+
+    Returns:
+    pd.DataFrame: キーをインデックスとする統計量
+    """
+    counts = counts[counts > 0].sort_index()
+    groups = counts.index.get_level_values(0).to_numpy()
+    values = counts.index.get_level_values(1).to_numpy().astype(np.float64)
+    weights = counts.to_numpy().astype(np.float64)
+
+    median = _weighted_median_like(groups, values, weights, 0.5)
+    q1 = _weighted_median_like(groups, values, weights, 0.25)
+    q3 = _weighted_median_like(groups, values, weights, 0.75)
+
+    # 中央値からの偏差の分布（偏差の昇順に並べ直す）
+    deviations = np.abs(values - median.reindex(groups).to_numpy())
+    order = np.lexsort([deviations, pd.factorize(groups, sort=True)[0]])
+    mad = _weighted_median_like(groups[order], deviations[order], weights[order], 0.5)
+    total = pd.Series(weights).groupby(groups).sum()
+    mean_ad = pd.Series(deviations * weights).groupby(groups).sum() / total
+
+    statistics = pd.DataFrame(
+        {
+            "件数": total,
+            "中央値": median,
+            "MAD": mad,
+            "平均絶対偏差": mean_ad,
+            "第1四分位": q1,
+            "第3四分位": q3,
+        }
+    )
+    statistics.index.name = counts.index.names[0]
+    return statistics
+
+
+def robust_scale(statistics):
+    # MAD が 0 の場合（ほとんどの行が同じ値）は平均絶対偏差で代用し、それも 0 の場合は NaN
+    scale = MAD_SCALE * statistics["MAD"]
+    scale = scale.where(scale > 0, MEAN_AD_SCALE * statistics["平均絶対偏差"])
+    return scale.where(scale > 0)
+
+
+def seasonal_baseline(daily, weeks=DEFAULT_SEASONAL_WEEKS):
+    """
+    系列（店舗 × 商品カテゴリ）ごとの日次合計について、同じ曜日の過去 weeks 週の中央値を季節ベースラインとし、
+    ベースラインからのずれのロバストzスコアを計算します。
+    系列 × 日付 の行列でまとめて計算します（売上のない日は 0 とする）。
+
+    Parameters:
+    - daily (pd.Series): SEASONAL_KEYS + ['日付'] の MultiIndex を持つ日次合計
+    - weeks (int): ベースラインに使う過去の週数
+
+    Returns:
+    pd.DataFrame: SEASONAL_KEYS + ['日付'] の列と '日次合計', '季節ベースライン', '季節z' の列
+    """
+    matrix = daily.unstack("日付", fill_value=0)
+    dates = pd.date_range(matrix.columns.min(), matrix.columns.max(), freq="D")
+    matrix = matrix.reindex(columns=dates, fill_value=0)
+    values = matrix.to_numpy().astype(np.float64)
+
+    # 7日ずつずらした過去の値を重ねて中央値を取る（過去が足りない日は NaN）
+    lagged = np.full((weeks,) + values.shape, np.nan)
+    for week in range(1, weeks + 1):
+        lag = 7 * week
+        if lag < values.shape[1]:
+            lagged[week - 1, :, lag:] = values[:, :-lag]
+    with warnings.catch_warnings():
+        # 過去がまったくない先頭の週は All-NaN になる
+        warnings.simplefilter("ignore", RuntimeWarning)
+        baseline = np.nanmedian(lagged, axis=0)
+        residual = values - baseline
+        scale = MAD_SCALE * np.nanmedian(np.abs(residual), axis=1, keepdims=True)
+        fallback = MEAN_AD_SCALE * np.nanmean(np.abs(residual), axis=1, keepdims=True)
+    scale = np.where(scale > 0, scale, fallback)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(scale > 0, residual / scale, np.nan)
+
+    series = matrix.index.to_frame(index=False)
+    index = pd.MultiIndex.from_arrays(
+        [np.repeat(series[key].to_numpy(), len(dates)) for key in series.columns]
+        + [np.tile(dates, len(series))],
+        names=list(series.columns) + ["日付"],
+    )
+    return pd.DataFrame(
+        {"日次合計": values.ravel(), "季節ベースライン": baseline.ravel(), "季節z": z.ravel()},
+        index=index,
+    )
+
+
+def collect_statistics(frames, value="売上個数", seasonal_weeks=DEFAULT_SEASONAL_WEEKS):
+    """
+    データを順に読み込みながら、スコアリングに使う統計量を集計します（1回目の走査）。
+
+    Parameters:
+    - frames (iterable): 結合済みデータのデータフレーム（パーティションごとなど）
+    - value (str): 対象の列、デフォルトは '売上個数'
+    - seasonal_weeks (int): 季節ベースラインに使う過去の週数
+
+    Returns:
+    dict: '商品ID' と '店舗ID' → histogram_statistics の戻り値、'季節' → seasonal_baseline の戻り値
+    """
+    counts = {key: None for key in GROUP_KEYS}
+    daily = None
+    for df in frames:
+        for key in GROUP_KEYS:
+            chunk_counts = df.groupby([key, value], observed=True).size()
+            counts[key] = chunk_counts if counts[key] is None else counts[key].add(chunk_counts, fill_value=0)
+        chunk_daily = df.groupby(SEASONAL_KEYS + [df["日付"].dt.normalize()], observed=True)[value].sum()
+        daily = chunk_daily if daily is None else daily.add(chunk_daily, fill_value=0)
+
+    if daily is None:
+        raise ValueError("no rows to collect statistics from")
+    statistics = {key: histogram_statistics(counts[key]) for key in GROUP_KEYS}
+    statistics["季節"] = seasonal_baseline(daily, weeks=seasonal_weeks)
+    return statistics
+
+
+def score_rows(df, statistics, value="売上個数", z_threshold=DEFAULT_Z_THRESHOLD, iqr_k=DEFAULT_IQR_K, min_rules=2):
+    """
+    行ごとの異常スコアを計算します（行に対する Python のループはない）。
+
+    追加する列:
+    - 商品z / 店舗z: 商品ごと・店舗ごとのロバストzスコア (値 - 中央値) / (1.4826 × MAD)
+    - 季節z: その行の 店舗 × 商品カテゴリ の日次合計の、季節ベースラインからのずれのロバストzスコア
+    - IQR外れ値: 商品ごとの 第3四分位 + iqr_k × IQR を超えるかどうか（整数の列なので IQR が 0 の場合は 1 とする）
+    - 異常ルール数: |商品z|, |店舗z|, |季節z| が z_threshold を超えた数と IQR外れ値 の合計
+    - 異常スコア: |商品z|, |店舗z|, |季節z| の最大値
+    - 異常: 異常ルール数 が min_rules 以上かどうか
+
+    Parameters:
+    - df (pd.DataFrame): 結合済みデータ
+    - statistics (dict): collect_statistics の戻り値
+    - value (str): 対象の列、デフォルトは '売上個数'
+    - z_threshold (float): ロバストzスコアの閾値、デフォルトは 3.5
+    - iqr_k (float): IQR の何倍を外れ値とするか、デフォルトは 1.5
+    - min_rules (int): 異常とするのに必要なルールの数、デフォルトは 2
+
+    Returns:
+    pd.DataFrame: df にスコアの列を加えたもの（入力は変更しない）
+    """
+    scored = df.copy(deep=False)
+    x = scored[value].to_numpy().astype(np.float64)
+
+    z_columns = []
+    for key, column in (("商品ID", "商品z"), ("店舗ID", "店舗z")):
+        group_statistics = statistics[key]
+        position = group_statistics.index.get_indexer(scored[key].to_numpy())
+        median = np.where(position >= 0, group_statistics["中央値"].to_numpy()[position], np.nan)
+        scale = np.where(position >= 0, robust_scale(group_statistics).to_numpy()[position], np.nan)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scored[column] = np.where(scale > 0, (x - median) / scale, 0.0)
+        z_columns.append(column)
+
+    seasonal = statistics["季節"]
+    position = seasonal.index.get_indexer(
+        pd.MultiIndex.from_arrays(
+            [scored[key] for key in SEASONAL_KEYS] + [scored["日付"].dt.normalize()]
+        )
+    )
+    seasonal_z = seasonal["季節z"].to_numpy()
+    scored["季節z"] = np.where(position >= 0, seasonal_z[position], np.nan)
+    z_columns.append("季節z")
+
+    item_statistics = statistics["商品ID"]
+    position = item_statistics.index.get_indexer(scored["商品ID"].to_numpy())
+    q1 = np.where(position >= 0, item_statistics["第1四分位"].to_numpy()[position], np.nan)
+    q3 = np.where(position >= 0, item_statistics["第3四分位"].to_numpy()[position], np.nan)
+    scored["IQR外れ値"] = x > q3 + iqr_k * np.maximum(q3 - q1, 1)
+
+    absolute = np.abs(scored[z_columns].to_numpy())
+    exceeded = np.nan_to_num(absolute) > z_threshold
+    scored["異常ルール数"] = (exceeded.sum(axis=1) + scored["IQR外れ値"].to_numpy()).astype("int8")
+    scored["異常スコア"] = np.nanmax(np.nan_to_num(absolute), axis=1)
+    scored["異常"] = scored["異常ルール数"].to_numpy() >= min_rules
+    return scored
+
+
+def detect_anomalies(
+    source,
+    output_path=None,
+    value="売上個数",
+    z_threshold=DEFAULT_Z_THRESHOLD,
+    iqr_k=DEFAULT_IQR_K,
+    min_rules=2,
+    seasonal_weeks=DEFAULT_SEASONAL_WEEKS,
+    only_anomalies=True,
+):
+    """
+    結合済みデータ全体をスコアリングして、異常値テーブルを作成します。
+    source にParquetデータセットのディレクトリを指定した場合は、年/月 のパーティションを1か月分ずつ読み込みます
+    （統計量の集計とスコアリングで2回走査する）。
+
+    Parameters:
+    - source (pd.DataFrame, str, or pyarrow.dataset.Dataset): 結合済みデータ、create_data.save_merged_dataset の出力先ディレクトリ、
+      または開いたデータセット
+    - output_path (str): 指定した場合は異常値テーブルをParquetファイルに保存する
+    - value (str): 対象の列、デフォルトは '売上個数'
+    - z_threshold (float): ロバストzスコアの閾値、デフォルトは 3.5
+    - iqr_k (float): IQR の何倍を外れ値とするか、デフォルトは 1.5
+    - min_rules (int): 異常とするのに必要なルールの数、デフォルトは 2
+    - seasonal_weeks (int): 季節ベースラインに使う過去の週数、デフォルトは 4
+    - only_anomalies (bool): 異常と判定した行だけを返すかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame: 結合済みデータの列にスコアの列を加えた異常値テーブル（日付順）
+    """
+    if is_dataset(source):
+        from . import create_data
+
+        def frames(columns=None):
+            return create_data.iter_merged_dataset(source, columns=columns)
+
+        statistics_frames = frames(STATISTICS_COLUMNS + [value])
+    else:
+        def frames(columns=None):
+            return [source]
+
+        statistics_frames = frames()
+
+    statistics = collect_statistics(statistics_frames, value=value, seasonal_weeks=seasonal_weeks)
+
+    tables = []
+    for df in frames():
+        scored = score_rows(
+            df, statistics, value=value, z_threshold=z_threshold, iqr_k=iqr_k, min_rules=min_rules
+        )
+        if only_anomalies:
+            scored = scored[scored["異常"].to_numpy()]
+        tables.append(scored)
+
+    table = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame()
+    if "日付" in table.columns:
+        table = table.sort_values(by="日付", kind="mergesort", ignore_index=True)
+    table = schema.apply_schema(table)
+
+    if output_path is not None:
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        table.to_parquet(output_path, index=False)
+    return table
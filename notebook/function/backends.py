@@ -0,0 +1,64 @@
+"""
+描画ライブラリの遅延読み込み。
+
+matplotlib・seaborn・japanize_matplotlib は読み込むだけで数百ミリ秒〜数秒かかるので、
+集計だけを使うスクリプトが eda_by_store などを import したときには読み込まず、
+最初に描画したとき（属性に初めてアクセスしたとき）に読み込みます:
+    from .backends import mdates, plt, sns
+
+    plt.figure(figsize=(12, 8))  # ここで matplotlib.pyplot を読み込み、日本語フォントを設定する
+"""
+import importlib
+
+
+class LazyModule:
+    """
+    属性に初めてアクセスしたときにモジュールを読み込む代理オブジェクト。
+
+    Parameters:
+    - name (str): モジュール名（例: 'matplotlib.pyplot'）
+    - on_load (callable): 読み込んだ直後に1回だけ呼ぶ関数（引数なし）
+    """
+
+    def __init__(self, name, on_load=None):
+        self._name = name
+        self._on_load = on_load
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._on_load is not None:
+                self._on_load()
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule '{self._name}' ({state})>"
+
+
+_japanized = False
+
+
+def japanize():
+    """
+    グラフの日本語フォントを設定します（japanize_matplotlib、2回目以降は何もしない）。
+    """
+    global _japanized
+    if not _japanized:
+        import japanize_matplotlib
+
+        japanize_matplotlib.japanize()
+        _japanized = True
+
+
+plt = LazyModule("matplotlib.pyplot", on_load=japanize)
+mdates = LazyModule("matplotlib.dates")
+sns = LazyModule("seaborn", on_load=japanize)
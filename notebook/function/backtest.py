@@ -0,0 +1,299 @@
+"""
+日次の (店舗ID, 商品カテゴリ) 系列に対する、ローリングオリジン方式の予測のバックテスト。
+
+学習期間の終わり（オリジン）を horizon 日ずつ前へずらした複数の分割で、各モデルの予測と実績を比べます。
+(分割, モデル) の組み合わせはプロセスプールで並列に実行します。
+系列 × 日付 の行列と全期間の特徴量は最初に1回だけ計算して .npy ファイルに保存し、
+各ワーカーはそれをメモリマップして、各分割の学習期間の分だけを使います（分割ごとに計算し直さない）:
+    metrics = backtest.run_backtest(df, models=['seasonal_naive', 'lightgbm'], n_folds=4)
+    backtest.plot_backtest_by_store(df, models=['seasonal_naive', 'lightgbm'])
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import cache
+from .aggregation import split_by
+from .backends import plt, sns
+from .forecast import DEFAULT_HORIZON, DEFAULT_KEYS, GlobalForecaster
+from .growth import period_matrix
+
+DEFAULT_MODELS = ["seasonal_naive", "moving_average", "lightgbm"]
+
+DEFAULT_FOLDS = 4
+
+# moving_average の窓（日数）
+MOVING_AVERAGE_DAYS = 28
+
+METRICS = ["MAE", "RMSE", "MAPE"]
+
+
+class _Context:
+    # ワーカーが使う 行列・特徴量・系列のキー・日付（行列と特徴量はメモリマップ）
+    def __init__(self, directory, labels, dates, by, value):
+        self.matrix = np.load(os.path.join(directory, "matrix.npy"), mmap_mode="r")
+        self.features = np.load(os.path.join(directory, "features.npy"), mmap_mode="r")
+        self.labels = labels
+        self.dates = dates
+        self.by = by
+        self.value = value
+
+
+def seasonal_naive(context, cutoff, horizon):
+    """
+    オリジンまでの最後の7日間を繰り返す予測（同じ曜日の前週の値）。
+    """
+    last_week = np.asarray(context.matrix[:, cutoff - 6 : cutoff + 1])
+    return np.tile(last_week, -(-horizon // 7))[:, :horizon]
+
+
+def moving_average(context, cutoff, horizon):
+    """
+    オリジンまでの MOVING_AVERAGE_DAYS 日の平均を横ばいで延ばす予測。
+    """
+    window = np.asarray(context.matrix[:, cutoff - MOVING_AVERAGE_DAYS + 1 : cutoff + 1])
+    return np.repeat(window.mean(axis=1, keepdims=True), horizon, axis=1)
+
+
+def global_gbm(context, cutoff, horizon, backend="lightgbm"):
+    """
+    forecast.GlobalForecaster による予測（特徴量は全期間で計算済みのものを使う）。
+    プロセスプールで並列に実行するので、モデルのスレッド数は1にする。
+    """
+    model = GlobalForecaster(by=context.by, value=context.value, backend=backend, n_jobs=1)
+    model.fit_matrix(
+        np.asarray(context.matrix[:, : cutoff + 1]),
+        context.labels,
+        context.dates[: cutoff + 1],
+        features=context.features,
+    )
+    predicted = model.predict(horizon=horizon)
+    return predicted["予測"].to_numpy().reshape(len(context.labels), horizon)
+
+
+# モデルの名前 → (context, オリジンの位置, horizon) から 系列 × horizon の予測を返す関数
+MODELS = {
+    "seasonal_naive": seasonal_naive,
+    "moving_average": moving_average,
+    "lightgbm": lambda context, cutoff, horizon: global_gbm(context, cutoff, horizon, backend="lightgbm"),
+    "sklearn_gbm": lambda context, cutoff, horizon: global_gbm(context, cutoff, horizon, backend="sklearn"),
+}
+
+
+def rolling_origins(n_dates, n_folds=DEFAULT_FOLDS, horizon=DEFAULT_HORIZON, step=None, min_train=None):
+    """
+    ローリングオリジンの各分割の、学習期間の最後の位置を返します（古い順）。
+    最後の分割はデータの最後の horizon 日を検証期間にし、それより前の分割は step 日ずつ前へずらします。
+
+    Parameters:
+    - n_dates (int): 日数
+    - n_folds (int): 分割数
+    - horizon (int): 検証期間の日数
+    - step (int): 分割の間隔（日数）、None の場合は horizon
+    - min_train (int): 学習期間の最小の日数、None の場合は GlobalForecaster の特徴量に必要な日数 + 1
+
+    Returns:
+    list: オリジンの位置（この位置までで学習し、次の horizon 日を予測する）
+    """
+    step = horizon if step is None else step
+    min_train = GlobalForecaster().min_history + 1 if min_train is None else min_train
+    last = n_dates - horizon - 1
+    origins = [last - step * k for k in range(n_folds)][::-1]
+    origins = [origin for origin in origins if origin + 1 >= min_train]
+    if not origins:
+        raise ValueError("not enough history for a single fold")
+    return origins
+
+
+def _run_task(directory, labels, dates, by, value, model, fold, cutoff, horizon):
+    context = _Context(directory, labels, dates, by, value)
+    return fold, model, MODELS[model](context, cutoff, horizon)
+
+
+def backtest_predictions(
+    df,
+    models=None,
+    n_folds=DEFAULT_FOLDS,
+    horizon=DEFAULT_HORIZON,
+    step=None,
+    by=DEFAULT_KEYS,
+    value="売上",
+    workers=None,
+):
+    """
+    ローリングオリジンの各分割・各モデルの予測と実績を、プロセスプールで計算します。
+
+    Parameters:
+    - df (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+    - models (list): MODELS のキー、デフォルトは ['seasonal_naive', 'moving_average', 'lightgbm']
+    - n_folds (int): 分割数、デフォルトは 4
+    - horizon (int): 予測する日数、デフォルトは 28
+    - step (int): 分割の間隔（日数）、None の場合は horizon
+    - by (list): 系列を分けるキー、デフォルトは ['店舗ID', '商品カテゴリ']
+    - value (str): 予測する値の列、デフォルトは '売上'
+    - workers (int): ワーカープロセス数、None の場合は CPU 数、1 の場合はこのプロセスで実行する
+
+    Returns:
+    pd.DataFrame: 'モデル', '分割', 'オリジン' + by + ['日付', '実績', '予測'] の列を持つ縦持ちのデータ
+    """
+    models = DEFAULT_MODELS if models is None else list(models)
+    for model in models:
+        if model not in MODELS:
+            raise ValueError(f"Invalid model: {model}. Use one of {list(MODELS)}.")
+    by = list(by)
+
+    matrix, labels, dates = period_matrix(df, by=by, freq="D", value=value, complete_only=False)
+    origins = rolling_origins(len(dates), n_folds=n_folds, horizon=horizon, step=step)
+
+    # 行列と全期間の特徴量を1回だけ計算して保存する（各分割・各モデルで使い回す）
+    directory = tempfile.mkdtemp(prefix="backtest_")
+    try:
+        np.save(os.path.join(directory, "matrix.npy"), matrix)
+        features = GlobalForecaster(by=by, value=value).build_features(matrix, labels, dates)
+        np.save(os.path.join(directory, "features.npy"), features)
+        del features
+
+        tasks = [
+            (directory, labels, dates, by, value, model, fold, cutoff, horizon)
+            for fold, cutoff in enumerate(origins)
+            for model in models
+        ]
+        if workers == 1:
+            results = [_run_task(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(_run_task, *task) for task in tasks]
+                results = [future.result() for future in futures]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    n_series = len(labels)
+    frames = []
+    for fold, model, predicted in results:
+        cutoff = origins[fold]
+        frame = labels.iloc[np.repeat(np.arange(n_series), horizon)].reset_index(drop=True)
+        frame.insert(0, "オリジン", dates[cutoff])
+        frame.insert(0, "分割", fold)
+        frame.insert(0, "モデル", model)
+        frame["日付"] = np.tile(dates[cutoff + 1 : cutoff + 1 + horizon].to_numpy(), n_series)
+        frame["実績"] = matrix[:, cutoff + 1 : cutoff + 1 + horizon].ravel()
+        frame["予測"] = np.asarray(predicted, dtype=np.float64).ravel()
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def error_metrics(predictions, by=("モデル", "店舗ID", "商品カテゴリ")):
+    """
+    予測と実績から MAE・RMSE・MAPE を集計します。
+    MAPE（%）は実績が 0 の日を除いて計算します（全ての日が 0 の場合は NaN）。
+
+    Parameters:
+    - predictions (pd.DataFrame): backtest_predictions の戻り値
+    - by (list): 集計キー、デフォルトは ['モデル', '店舗ID', '商品カテゴリ']
+
+    Returns:
+    pd.DataFrame: by + ['MAE', 'RMSE', 'MAPE', '件数'] の列を持つ縦持ちのデータ
+    """
+    by = list(by)
+    error = predictions["予測"] - predictions["実績"]
+    actual = predictions["実績"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentage = np.where(actual > 0, np.abs(error) / actual * 100, np.nan)
+    errors = predictions[by].assign(
+        絶対誤差=np.abs(error), 二乗誤差=error**2, 絶対パーセント誤差=percentage
+    )
+    grouped = errors.groupby(by, observed=True, sort=True)
+    metrics = grouped[["絶対誤差", "二乗誤差", "絶対パーセント誤差"]].mean()
+    metrics = pd.DataFrame(
+        {
+            "MAE": metrics["絶対誤差"],
+            "RMSE": np.sqrt(metrics["二乗誤差"]),
+            "MAPE": metrics["絶対パーセント誤差"],
+            "件数": grouped.size(),
+        }
+    )
+    return metrics.reset_index()
+
+
+def run_backtest(
+    df,
+    models=None,
+    n_folds=DEFAULT_FOLDS,
+    horizon=DEFAULT_HORIZON,
+    step=None,
+    by=DEFAULT_KEYS,
+    value="売上",
+    workers=None,
+):
+    """
+    バックテストを実行し、モデル・店舗・商品カテゴリごとの MAE・RMSE・MAPE の表を返します（集計キャッシュを使う）。
+    引数は backtest_predictions と同じです。
+
+    Returns:
+    pd.DataFrame: error_metrics の戻り値
+    """
+    models = DEFAULT_MODELS if models is None else list(models)
+    params = {"models": models, "n_folds": n_folds, "horizon": horizon, "step": step, "by": list(by), "value": value}
+    return cache.cached(
+        "run_backtest",
+        params,
+        df,
+        lambda: error_metrics(
+            backtest_predictions(
+                df, models=models, n_folds=n_folds, horizon=horizon, step=step, by=by, value=value, workers=workers
+            ),
+            by=["モデル"] + list(by),
+        ),
+    )
+
+
+def draw_backtest_by_store(store_id, metrics_by_store, metric="MAE"):
+    # グラフのプロット（商品カテゴリごとに、モデルの誤差を並べる）
+    fig = plt.figure(figsize=(12, 8))
+    sns.barplot(x="商品カテゴリ", y=metric, hue="モデル", data=metrics_by_store)
+
+    # グラフの設定
+    title = f"店舗ID {store_id} - 商品カテゴリ別の予測誤差 ({metric})"
+    plt.title(title)
+    plt.xlabel("商品カテゴリ")
+    plt.ylabel(f"{metric} (%)" if metric == "MAPE" else metric)
+    plt.legend(title="モデル", loc="upper left", bbox_to_anchor=(1, 1))
+    plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
+    plt.ticklabel_format(style="plain", axis="y")
+    plt.grid(axis="y")
+    return fig
+
+
+def plot_backtest_by_store(df, models=None, metric="MAE", n_folds=DEFAULT_FOLDS, horizon=DEFAULT_HORIZON, workers=None):
+    """
+    概要:
+        ローリングオリジンのバックテストを実行し、店舗ごとに商品カテゴリ別・モデル別の予測誤差をプロットします。
+
+    パラメータ:
+        - df (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス。
+        - models (list, optional): 比較するモデル（MODELS のキー）。デフォルトは ['seasonal_naive', 'moving_average', 'lightgbm'] です。
+        - metric (str, optional): 'MAE', 'RMSE', 'MAPE' のいずれか。デフォルトは 'MAE' です。
+        - n_folds (int, optional): 分割数。デフォルトは 4 です。
+        - horizon (int, optional): 予測する日数。デフォルトは 28 です。
+        - workers (int, optional): ワーカープロセス数。None の場合は CPU 数です。
+
+    戻り値:
+        pd.DataFrame: run_backtest の戻り値（モデル・店舗・商品カテゴリごとの MAE・RMSE・MAPE）
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Invalid metric. Use one of {METRICS}.")
+    metrics = run_backtest(df, models=models, n_folds=n_folds, horizon=horizon, workers=workers)
+
+    # 店舗IDごとにプロット
+    for store_id, metrics_by_store in split_by(metrics, ["店舗ID"]):
+        cache.show_figure(
+            "draw_backtest_by_store",
+            {"store_id": store_id, "metric": metric},
+            metrics_by_store,
+            lambda: draw_backtest_by_store(store_id, metrics_by_store, metric=metric),
+        )
+    return metrics
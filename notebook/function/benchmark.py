@@ -0,0 +1,593 @@
+"""
+集計処理のベンチマーク。
+
+notebook ディレクトリで実行する:
+    python -m function.benchmark --rows 10000000
+
+データ作成からEDAの集計・クラスタリングまでの段階ごとの時間を計測し、JSON に保存する（run_suite）:
+    python -m function.benchmark --suite --scale 10M --output ../benchmark/after.json
+    python -m function.benchmark --compare ../benchmark/before.json ../benchmark/after.json
+
+各モジュールを新しいプロセスで import する時間を計測し、描画・統計のライブラリを読み込んでいないこと、
+numpy・pandas を除いた時間が予算内であることを確認する（check_imports、超えた場合は終了コード 1）:
+    python -m function.benchmark --imports
+
+合成データは実データと同じ形式のCSV（売上履歴・商品マスタ・商品カテゴリ名、Shift_JIS）として書き出し、
+同じ規模・シードなら同じ内容になります（--workdir を指定すると次回はCSVを作り直さない）。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import aggregation, schema
+
+# 合成データの商品カテゴリ（category_names.csv の大分類）
+CATEGORIES = ["映画", "PCゲーム", "PCソフト", "ギフト", "ゲーム", "ゲーム周辺機器", "本", "音楽"]
+
+
+def make_merged_frame(n_rows, n_stores=18, n_items=9400, n_days=730, seed=0):
+    """
+    結合済みデータと同じ列・型の合成データを作成します（集計のベンチマーク用）。
+
+    Parameters:
+    - n_rows (int): 行数
+    - n_stores (int): 店舗数
+    - n_items (int): 商品数
+    - n_days (int): 日数（2018-01-01 から）
+    - seed (int): 乱数のシード
+
+    Returns:
+    pd.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    item_ids = rng.integers(0, n_items, n_rows)
+    quantity = rng.integers(1, 5, n_rows)
+    price = rng.integers(100, 10000, n_items)[item_ids]
+    df = pd.DataFrame(
+        {
+            "日付": pd.Timestamp("2018-01-01")
+            + pd.to_timedelta(np.sort(rng.integers(0, n_days, n_rows)), unit="D"),
+            "店舗ID": rng.integers(0, n_stores, n_rows),
+            "商品ID": 1000000 + item_ids,
+            "商品カテゴリ": pd.Categorical.from_codes(item_ids % len(CATEGORIES), CATEGORIES),
+            "商品価格": price,
+            "売上個数": quantity,
+            "売上": price * quantity,
+        }
+    )
+    return schema.apply_schema(df)
+
+
+def mask_loop(df, value="売上", freq="W"):
+    # 従来の実装: 店舗ごと・カテゴリごとにブールマスクで絞り込んでから pivot_table
+    result = []
+    for store_id in df["店舗ID"].unique():
+        store_data = df[df["店舗ID"] == store_id]
+        for category in store_data["商品カテゴリ"].unique():
+            category_data = store_data[store_data["商品カテゴリ"] == category]
+            pivot_table = pd.pivot_table(
+                category_data,
+                values=value,
+                index=pd.Grouper(key="日付", freq=freq),
+                aggfunc="sum",
+            )
+            result.append(((store_id, category), pivot_table[value]))
+    return result
+
+
+def single_pass(df, value="売上", freq="W"):
+    # aggregation.iter_series: 1回の groupby で全ての (店舗ID, 商品カテゴリ) の系列を計算
+    return list(aggregation.iter_series(df, ["店舗ID", "商品カテゴリ"], value, freq=freq))
+
+
+def _timeit(func, *args, repeat=1, **kwargs):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_aggregation(n_rows=10_000_000, freq="W", repeat=1, check=True):
+    """
+    店舗 × 商品カテゴリごとの時系列の集計について、従来のマスクのループと1回の groupby を比較します。
+
+    Parameters:
+    - n_rows (int): 合成データの行数
+    - freq (str): 集計期間
+    - repeat (int): 繰り返し回数（最速の値を採用）
+    - check (bool): 両者の結果が一致するか確認するかどうか
+
+    Returns:
+    dict: 計測結果（秒）
+    """
+    df = make_merged_frame(n_rows)
+
+    loop_seconds, loop_result = _timeit(mask_loop, df, freq=freq, repeat=repeat)
+    single_seconds, single_result = _timeit(single_pass, df, freq=freq, repeat=repeat)
+
+    if check:
+        expected = dict(loop_result)
+        for key, series in single_result:
+            pd.testing.assert_series_equal(
+                series, expected[key], check_names=False, check_freq=False, check_dtype=False
+            )
+        assert len(expected) == len(single_result)
+
+    result = {
+        "rows": n_rows,
+        "freq": freq,
+        "series": len(single_result),
+        "mask_loop_seconds": loop_seconds,
+        "single_pass_seconds": single_seconds,
+        "speedup": loop_seconds / single_seconds,
+    }
+    print(
+        f"{n_rows:,} 行 / {result['series']} 系列 ({freq}): "
+        f"マスクのループ {loop_seconds:.2f} 秒, 1回の groupby {single_seconds:.2f} 秒 "
+        f"({result['speedup']:.1f} 倍)"
+    )
+    return result
+
+
+# run_suite の規模（売上履歴の行数）
+SCALES = {"1M": 1_000_000, "10M": 10_000_000, "100M": 100_000_000}
+
+# 合成CSVを書き出す1回あたりの行数
+GENERATE_CHUNK_ROWS = 5_000_000
+
+# 合成データの商品カテゴリID（category_names.csv と同じく 100 から 10 刻み）と小分類の数
+N_SUBCATEGORIES = 10
+
+# 変更した場合は作成済みの合成CSVを作り直す
+SYNTHETIC_VERSION = 1
+
+# import の時間を確認するモジュール（function パッケージ内のモジュール名）
+IMPORT_MODULES = [
+    "aggregation",
+    "anomaly",
+    "backtest",
+    "cache",
+    "clustering",
+    "create_data",
+    "cube",
+    "detrend",
+    "eda",
+    "eda_by_store",
+    "eda_sales_quantity_abnormal_value",
+    "feature_store",
+    "forecast",
+    "growth",
+    "hierarchy",
+    "online_anomaly",
+    "parallel",
+    "query",
+    "report",
+    "similarity",
+]
+
+# import しただけでは読み込まないライブラリ（描画・統計・学習のバックエンド）
+LAZY_BACKENDS = ["matplotlib", "seaborn", "japanize_matplotlib", "statsmodels", "sklearn", "lightgbm", "scipy.signal"]
+
+# 1モジュールの import にかけてよい時間（秒、numpy・pandas の読み込みを除く）
+IMPORT_BUDGET_SECONDS = 0.25
+
+# 新しいプロセスで numpy・pandas を読み込んだ後にモジュールを import し、時間と読み込まれたバックエンドを出力する
+_IMPORT_PROBE = """
+import importlib, json, sys, time
+import numpy, pandas
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({"seconds": seconds, "loaded": [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+
+def make_item_master(n_items=9400, seed=0):
+    """
+    実データと同じ列の商品マスタ（item_categories.csv と category_names.csv の内容）を作成します。
+
+    Returns:
+    (pd.DataFrame, pd.DataFrame): 商品ID・商品カテゴリID の表と、商品カテゴリID・商品カテゴリ名 の表
+    """
+    rng = np.random.default_rng(seed)
+    category_names = pd.DataFrame(
+        {
+            "商品カテゴリID": 100 + 10 * np.arange(len(CATEGORIES) * N_SUBCATEGORIES),
+            "商品カテゴリ名": [
+                f"{category} - 小分類{i + 1}" for category in CATEGORIES for i in range(N_SUBCATEGORIES)
+            ],
+        }
+    )
+    item_categories = pd.DataFrame(
+        {
+            "商品ID": 1000001 + np.arange(n_items),
+            "商品カテゴリID": category_names["商品カテゴリID"].to_numpy()[
+                rng.integers(0, len(category_names), n_items)
+            ],
+        }
+    )
+    return item_categories, category_names
+
+
+def iter_sales_history_frames(n_rows, n_stores=18, n_items=9400, n_days=730, seed=0, chunk_rows=GENERATE_CHUNK_ROWS):
+    """
+    実データの売上履歴と同じ列（日付, 店舗ID, 商品ID, 商品価格, 売上個数）の合成データを、日付順に chunk_rows 行ずつ作成します。
+    チャンクごとに (seed, チャンク番号) から乱数を作るので、チャンクの大きさを除いて同じ引数なら同じ内容になります。
+
+    Yields:
+    pd.DataFrame
+    """
+    prices = np.random.default_rng(seed).integers(100, 10000, n_items)
+    start_date = np.datetime64("2018-01-01")
+    for i, start in enumerate(range(0, n_rows, chunk_rows)):
+        rows = np.arange(start, min(start + chunk_rows, n_rows))
+        rng = np.random.default_rng([seed, i])
+        item_ids = rng.integers(0, n_items, len(rows))
+        # 偏りのある売上個数（ほとんどが1個）
+        quantity = np.maximum(rng.geometric(0.6, len(rows)), 1)
+        yield pd.DataFrame(
+            {
+                "日付": (start_date + rows * n_days // n_rows).astype("datetime64[D]").astype(str),
+                "店舗ID": rng.integers(0, n_stores, len(rows)),
+                "商品ID": 1000001 + item_ids,
+                "商品価格": prices[item_ids],
+                "売上個数": quantity,
+            }
+        )
+
+
+def write_synthetic_csvs(directory, n_rows, n_stores=18, n_items=9400, n_days=730, seed=0, n_files=2):
+    """
+    合成データを実データと同じ形式のCSV（Shift_JIS）として directory に書き出します。
+    同じ引数で作成済みの場合は作り直しません。
+
+    Returns:
+    dict: 'sales_history'（売上履歴のCSVのリスト）, 'item_categories', 'category_names' のパス
+    """
+    os.makedirs(directory, exist_ok=True)
+    params = {
+        "version": SYNTHETIC_VERSION,
+        "rows": n_rows,
+        "stores": n_stores,
+        "items": n_items,
+        "days": n_days,
+        "seed": seed,
+        "files": n_files,
+    }
+    paths = {
+        "sales_history": [os.path.join(directory, f"sales_history{i + 1}.csv") for i in range(n_files)],
+        "item_categories": os.path.join(directory, "item_categories.csv"),
+        "category_names": os.path.join(directory, "category_names.csv"),
+    }
+    params_path = os.path.join(directory, "synthetic.json")
+    if os.path.exists(params_path):
+        with open(params_path, encoding="utf-8") as f:
+            if json.load(f) == params:
+                return paths
+
+    item_categories, category_names = make_item_master(n_items=n_items, seed=seed)
+    item_categories.to_csv(paths["item_categories"], encoding="shift_jis", index=False)
+    category_names.to_csv(paths["category_names"], encoding="shift_jis", index=False)
+
+    # 売上履歴は sales_history1.csv, sales_history2.csv, ... に期間で分けて書き出す
+    rows_per_file = -(-n_rows // n_files)
+    written = 0
+    for chunk in iter_sales_history_frames(n_rows, n_stores=n_stores, n_items=n_items, n_days=n_days, seed=seed):
+        while len(chunk):
+            file_index = written // rows_per_file
+            part = chunk.iloc[: rows_per_file * (file_index + 1) - written]
+            first = written == rows_per_file * file_index
+            part.to_csv(
+                paths["sales_history"][file_index],
+                encoding="shift_jis",
+                index=False,
+                mode="w" if first else "a",
+                header=first,
+            )
+            written += len(part)
+            chunk = chunk.iloc[len(part):]
+
+    with open(params_path, "w", encoding="utf-8") as f:
+        json.dump(params, f)
+    return paths
+
+
+class StageTimer:
+    """
+    段階ごとの経過時間（秒）を足し合わせて記録します。
+
+        timer = StageTimer()
+        with timer('merge'):
+            ...
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    def __call__(self, name):
+        return _Stage(self, name)
+
+
+class _Stage:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.timer.seconds[self.name] = self.timer.seconds.get(self.name, 0.0) + elapsed
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux では KiB 単位
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _bench_build(paths, dataset_dir, timer, chunksize):
+    # create_data.build_merged_dataset と同じ処理を、段階ごとに計測しながら実行する
+    from . import create_data
+
+    with timer("load_item_master"):
+        item_master = create_data.load_item_master(paths["item_categories"], paths["category_names"])
+
+    n_rows = 0
+    chunks = create_data.iter_sales_history(paths["sales_history"], chunksize=chunksize)
+    i = 0
+    while True:
+        with timer("csv_load"):
+            sales_chunk = next(chunks, None)
+        if sales_chunk is None:
+            break
+        with timer("merge"):
+            merged_chunk = create_data.merge_item_master(sales_chunk, item_master)
+        with timer("calendar_features"):
+            merged_chunk = create_data.add_calendar_columns(merged_chunk)
+        with timer("write_dataset"):
+            create_data._write_partitions(
+                merged_chunk,
+                dataset_dir,
+                existing_data_behavior="overwrite_or_ignore",
+                basename_template=f"chunk-{i:05d}-{{i}}.parquet",
+            )
+        n_rows += len(merged_chunk)
+        i += 1
+    return n_rows
+
+
+def _bench_aggregations(dataset_dir, timer):
+    # 各グラフの集計段階（描画はしない）。集計結果を使い回さないように、段階ごとに新しいキューブを使う
+    from . import detrend, eda, eda_by_store
+    from .cube import SalesCube
+
+    with timer("cube_from_dataset"):
+        frame = SalesCube.from_dataset(dataset_dir).frame
+    store_id = frame["店舗ID"].iloc[0]
+
+    stages = {
+        "eda.aggregate_sales_by_category": lambda cube: eda.aggregate_sales_by_category(cube, store_id),
+        "eda_by_store.aggregate_total_sales_by_store[day]": lambda cube: eda_by_store.aggregate_total_sales_by_store(cube, unit="day"),
+        "eda_by_store.aggregate_total_sales_by_store[month]": lambda cube: eda_by_store.aggregate_total_sales_by_store(cube, unit="month"),
+        "eda_by_store.aggregate_sales_by_store_category[day]": lambda cube: eda_by_store.aggregate_sales_by_store_category(cube, unit="day"),
+        "eda_by_store.aggregate_category_series": lambda cube: eda_by_store.aggregate_category_series(cube, store_id),
+        "eda_by_store.aggregate_category_weekday": lambda cube: eda_by_store.aggregate_category_weekday(cube, store_id),
+        "eda_by_store.aggregate_sales_by_store_yearly": lambda cube: eda_by_store.aggregate_sales_by_store_yearly(cube),
+        "detrend.detrend_sales[simple]": lambda cube: detrend.detrend_sales(cube, moving_average_type="simple"),
+        "eda_by_store.aggregate_growth_clusters": lambda cube: eda_by_store.aggregate_growth_clusters(cube),
+    }
+    for name, aggregate in stages.items():
+        cube = SalesCube(frame)
+        with timer(name):
+            aggregate(cube)
+    return frame
+
+
+def _bench_clustering(dataset_dir, frame, timer):
+    from . import clustering
+    from .cube import SalesCube
+
+    with timer("clustering.product_moments"):
+        moments = clustering.moments_from_dataset(dataset_dir)
+    with timer("clustering.fit_products"):
+        clustering.ClusterModel(n_clusters=7).fit(clustering.product_features(moments))
+    with timer("clustering.fit_stores"):
+        features = clustering.store_features(SalesCube(frame))
+        clustering.ClusterModel(n_clusters=3).fit(features)
+
+
+def run_suite(scale="1M", output_path=None, workdir=None, seed=0, chunksize=None, verbose=True):
+    """
+    合成データで データ作成（CSV読み込み・結合・日付の列・書き出し）、各グラフの集計、クラスタリング の
+    段階ごとの時間を計測します。描画は含みません（集計キャッシュは計測中は無効にする）。
+
+    Parameters:
+    - scale (str or int): '1M', '10M', '100M'（SCALES のキー）、または行数
+    - output_path (str): 結果を保存するJSONのパス、None の場合は保存しない
+    - workdir (str): 合成CSVとデータセットを置くディレクトリ、None の場合は一時ディレクトリ（終了後に削除）
+    - seed (int): 乱数のシード
+    - chunksize (int): 売上履歴を読み込む行数、None の場合は create_data.DEFAULT_CHUNKSIZE
+    - verbose (bool): 段階ごとの時間を表示するかどうか
+
+    Returns:
+    dict: 計測結果（'stages' に 段階名 → 秒）
+    """
+    from . import cache, create_data
+
+    n_rows = SCALES[scale] if scale in SCALES else int(scale)
+    chunksize = chunksize or create_data.DEFAULT_CHUNKSIZE
+    temporary = workdir is None
+    workdir = tempfile.mkdtemp(prefix="benchmark_") if temporary else workdir
+    dataset_dir = os.path.join(workdir, "merged")
+    previous_cache = cache.get_cache()
+    cache.disable()
+
+    timer = StageTimer()
+    try:
+        # 合成CSVの作成は計測対象ではない（作成済みなら使い回す）ので、段階には含めない
+        start = time.perf_counter()
+        paths = write_synthetic_csvs(os.path.join(workdir, "csv"), n_rows, seed=seed)
+        generate_seconds = time.perf_counter() - start
+        if os.path.isdir(dataset_dir):
+            shutil.rmtree(dataset_dir)
+        merged_rows = _bench_build(paths, dataset_dir, timer, chunksize)
+        frame = _bench_aggregations(dataset_dir, timer)
+        _bench_clustering(dataset_dir, frame, timer)
+    finally:
+        if previous_cache is not None:
+            cache.enable(previous_cache.directory, max_bytes=previous_cache.max_bytes)
+        if temporary:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        "scale": scale if scale in SCALES else str(n_rows),
+        "rows": n_rows,
+        "merged_rows": merged_rows,
+        "cube_rows": len(frame),
+        "seed": seed,
+        "chunksize": chunksize,
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "generate_seconds": generate_seconds,
+        "max_rss_mb": _max_rss_mb(),
+        "stages": timer.seconds,
+    }
+    if output_path is not None:
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if verbose:
+        print(f"{n_rows:,} 行 (結合後 {merged_rows:,} 行, キューブ {len(frame):,} 行)")
+        for name, seconds in timer.seconds.items():
+            print(f"  {name}: {seconds:.3f} 秒")
+    return result
+
+
+def compare_results(before, after, verbose=True):
+    """
+    run_suite の2つの結果（または保存したJSONのパス）を段階ごとに比較します。
+
+    Returns:
+    pd.DataFrame: 段階名をインデックスとし、'before', 'after', 'ratio'（after / before）の列を持つ表
+    """
+    results = []
+    for result in (before, after):
+        if isinstance(result, str):
+            with open(result, encoding="utf-8") as f:
+                result = json.load(f)
+        results.append(result)
+    if results[0]["rows"] != results[1]["rows"]:
+        print(f"行数が異なります: {results[0]['rows']:,} と {results[1]['rows']:,}")
+
+    table = pd.DataFrame({"before": results[0]["stages"], "after": results[1]["stages"]})
+    table["ratio"] = table["after"] / table["before"]
+    if verbose:
+        print(table.to_string(float_format=lambda x: f"{x:.3f}"))
+    return table
+
+
+def measure_import(module, repeat=3):
+    """
+    function パッケージのモジュールを新しいプロセスで import する時間（最小値）と、読み込まれたバックエンドを計測します。
+
+    Parameters:
+    - module (str): モジュール名（例: 'eda_by_store'）
+    - repeat (int): 繰り返し回数
+
+    Returns:
+    dict: 'seconds'（numpy・pandas を除いた秒数）と 'loaded'（読み込まれた LAZY_BACKENDS）
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "-W", "ignore", "-c", _IMPORT_PROBE, f"{__package__}.{module}"] + LAZY_BACKENDS
+    results = []
+    for _ in range(repeat):
+        completed = subprocess.run(command, cwd=package_dir, capture_output=True, text=True, check=True)
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {"seconds": min(result["seconds"] for result in results), "loaded": results[-1]["loaded"]}
+
+
+def check_imports(modules=None, budget=IMPORT_BUDGET_SECONDS, repeat=3, verbose=True):
+    """
+    各モジュールの import が描画・統計のライブラリを読み込まず、予算の時間内に終わることを確認します
+    （import の時間が増える変更を見つけるための確認）。
+
+    Parameters:
+    - modules (list): モジュール名のリスト、None の場合は IMPORT_MODULES
+    - budget (float): 1モジュールの import にかけてよい秒数（numpy・pandas の読み込みを除く）
+    - repeat (int): モジュールごとの繰り返し回数（最小値を使う）
+    - verbose (bool): 結果を表示するかどうか
+
+    Returns:
+    pd.DataFrame: モジュール名をインデックスとし、'seconds', 'loaded', 'ok' の列を持つ表
+    """
+    modules = IMPORT_MODULES if modules is None else list(modules)
+    rows = {}
+    for module in modules:
+        measured = measure_import(module, repeat=repeat)
+        rows[module] = {
+            "seconds": measured["seconds"],
+            "loaded": ", ".join(measured["loaded"]),
+            "ok": measured["seconds"] <= budget and not measured["loaded"],
+        }
+    table = pd.DataFrame.from_dict(rows, orient="index")
+    if verbose:
+        print(table.to_string(float_format=lambda x: f"{x:.3f}"))
+        failed = table.index[~table["ok"]].tolist()
+        print(f"予算 {budget:.3f} 秒: " + (f"超過・読み込みあり {failed}" if failed else "すべて OK"))
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="集計処理のベンチマーク")
+    parser.add_argument("--rows", type=int, default=10_000_000, help="合成データの行数")
+    parser.add_argument("--freq", default="W", help="集計期間 (D, W, M)")
+    parser.add_argument("--repeat", type=int, default=1, help="繰り返し回数")
+    parser.add_argument("--suite", action="store_true", help="データ作成からクラスタリングまでの段階ごとの時間を計測する")
+    parser.add_argument("--scale", default="1M", help="--suite の規模（1M, 10M, 100M、または行数）")
+    parser.add_argument("--output", help="--suite の結果を保存するJSONのパス")
+    parser.add_argument("--workdir", help="--suite の合成CSVとデータセットを置くディレクトリ（指定すると残す）")
+    parser.add_argument("--seed", type=int, default=0, help="--suite の乱数のシード")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="保存した2つの結果を比較する")
+    parser.add_argument("--imports", action="store_true", help="各モジュールの import の時間と読み込むライブラリを確認する")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="--imports の1モジュールあたりの秒数の上限")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        if not check_imports(budget=args.budget)["ok"].all():
+            sys.exit(1)
+    elif args.compare:
+        compare_results(*args.compare)
+    elif args.suite:
+        run_suite(scale=args.scale, output_path=args.output, workdir=args.workdir, seed=args.seed)
+    else:
+        bench_aggregation(n_rows=args.rows, freq=args.freq, repeat=args.repeat)
+
+
+if __name__ == "__main__":
+    main()
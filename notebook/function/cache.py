@@ -0,0 +1,309 @@
+"""
+集計結果と描画した画像のディスクキャッシュ。
+
+(関数名, パラメータ, 入力データの指紋) のハッシュをキーに結果をファイルへ保存し、
+同じ入力で同じグラフを描き直すときは保存した結果を使います。
+合計サイズが上限を超えた場合は、最後に使ってから時間が経ったものから削除します（LRU）。
+
+キャッシュは既定では無効で、ノートブックの最初で有効にする:
+    from function import cache
+    cache.enable('../cache', max_bytes=2 * 1024**3)
+    ...
+    cache.stats()
+"""
+import hashlib
+import io
+import json
+import os
+import pickle
+import tempfile
+
+import pandas as pd
+
+# キャッシュの合計サイズの上限（既定）
+DEFAULT_MAX_BYTES = 1024**3
+
+# 変更した場合はキャッシュ全体が無効になる
+CACHE_VERSION = 2
+
+
+class DiskCache:
+    """
+    キー（文字列）→ 値 をディレクトリ内のファイルに保存する、サイズ上限付きの LRU キャッシュ。
+    最後に使った時刻はファイルの更新時刻で管理します。
+
+    Parameters:
+    - directory (str): 保存先のディレクトリ
+    - max_bytes (int): 合計サイズの上限（バイト）
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pkl")
+
+    def get(self, key):
+        """
+        キーに対応する値を返します。
+
+        Returns:
+        (bool, 値): 見つかったかどうかと値（見つからない場合は None）
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False, None
+        # 使った時刻を更新する（LRU の順序）
+        os.utime(path)
+        self.hits += 1
+        return True, value
+
+    def put(self, key, value):
+        """
+        値を保存し、上限を超えた場合は古いものから削除します。
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルを読まないように、一時ファイルに書いてから置き換える
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".pkl"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """
+        合計サイズが max_bytes 以下になるまで、最後に使った時刻が古いものから削除します。
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        """
+        保存したものをすべて削除します。
+        """
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    def stats(self):
+        """
+        ヒット・ミスの回数と、保存している件数・合計サイズを返します。
+        """
+        entries = self._entries()
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+# 描画関数が使うキャッシュ（None の場合は無効）
+_cache = None
+
+
+def enable(directory, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    描画関数の集計結果・画像のキャッシュを有効にします。
+
+    Parameters:
+    - directory (str): 保存先のディレクトリ
+    - max_bytes (int): 合計サイズの上限（バイト）
+
+    Returns:
+    DiskCache
+    """
+    global _cache
+    _cache = DiskCache(directory, max_bytes=max_bytes)
+    return _cache
+
+
+def disable():
+    """
+    キャッシュを無効にします（保存したファイルは残る）。
+    """
+    global _cache
+    _cache = None
+
+
+def get_cache():
+    return _cache
+
+
+def stats():
+    """
+    有効なキャッシュの統計を返します（無効な場合は None）。
+    """
+    return None if _cache is None else _cache.stats()
+
+
+def fingerprint(data):
+    """
+    入力データの指紋（内容のハッシュ）を返します。
+    SalesCube は内容を変更しないので、計算した指紋をキューブに保持して再利用します。
+
+    Parameters:
+    - data (pd.DataFrame, pd.Series, SalesCube, str, or list): 入力データ（str はParquetデータセットのパス、リストは [(キー, pd.DataFrame), ...] などの描画用データ）
+
+    Returns:
+    str
+    """
+    from .cube import SalesCube, is_dataset
+
+    if isinstance(data, SalesCube):
+        if getattr(data, "_fingerprint", None) is None:
+            data._fingerprint = fingerprint(data.frame)
+        return data._fingerprint
+    if is_dataset(data):
+        return dataset_fingerprint(data)
+
+    digest = hashlib.sha1()
+    if isinstance(data, (list, tuple)):
+        for item in data:
+            digest.update(fingerprint(item).encode("utf-8"))
+        return digest.hexdigest()
+    if isinstance(data, pd.Series):
+        data = data.to_frame()
+    if not isinstance(data, pd.DataFrame):
+        return hashlib.sha1(repr(data).encode("utf-8")).hexdigest()
+
+    digest.update(json.dumps([str(column) for column in data.columns]).encode("utf-8"))
+    digest.update(json.dumps([str(dtype) for dtype in data.dtypes]).encode("utf-8"))
+    # 描画用のデータは日付・曜日をインデックスに持つのでインデックスも含める
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(source):
+    """
+    Parquetデータセットの指紋を返します。
+    ファイルの中身は読まずに、各ファイルのパス・サイズ・更新時刻から計算します（取り込みでファイルが増えると変わる）。
+
+    Parameters:
+    - source (str or pyarrow.dataset.Dataset): データセットのディレクトリ、または開いたデータセット
+
+    Returns:
+    str
+    """
+    from . import create_data
+
+    dataset = create_data.open_merged_dataset(source)
+    digest = hashlib.sha1()
+    for path in sorted(dataset.files):
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def make_key(name, params, data):
+    """
+    (関数名, パラメータ, 入力データの指紋) からキャッシュのキーを作ります。
+    """
+    payload = json.dumps(
+        {"version": CACHE_VERSION, "name": name, "params": params, "data": fingerprint(data)},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cached(name, params, data, compute):
+    """
+    キャッシュが有効なら保存した結果を返し、なければ compute() を実行して保存します。
+
+    Parameters:
+    - name (str): 関数名
+    - params (dict): 結果に影響するパラメータ
+    - data (pd.DataFrame, SalesCube, or str): 入力データ（str はParquetデータセットのパス）
+    - compute (callable): 結果を計算する関数（引数なし）
+
+    Returns:
+    compute() の結果
+    """
+    if _cache is None:
+        return compute()
+    key = make_key(name, params, data)
+    found, value = _cache.get(key)
+    if found:
+        return value
+    value = compute()
+    _cache.put(key, value)
+    return value
+
+
+def _display_png(png):
+    # Jupyter 上ならPNGをそのまま表示する（それ以外では表示できないので False）
+    try:
+        from IPython import get_ipython
+        from IPython.display import Image, display
+    except ImportError:
+        return False
+    if get_ipython() is None:
+        return False
+    display(Image(data=png))
+    return True
+
+
+def show_figure(name, params, data, draw):
+    """
+    グラフを表示します。キャッシュが有効で同じグラフを描画済みの場合は、保存したPNGを表示して描画を省きます。
+
+    Parameters:
+    - name (str): 描画関数名
+    - params (dict): グラフに影響するパラメータ（店舗ID・集計単位など）
+    - data (pd.DataFrame): 描画するデータ（指紋の計算に使う）
+    - draw (callable): グラフを描画して Figure を返す関数（引数なし）
+
+    Returns:
+    None
+    """
+    import matplotlib.pyplot as plt
+
+    if _cache is None:
+        draw()
+        plt.show()
+        return
+
+    key = make_key(name, params, data)
+    found, png = _cache.get(key)
+    if found and _display_png(png):
+        return
+
+    fig = draw()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    _cache.put(key, buffer.getvalue())
+    plt.show()
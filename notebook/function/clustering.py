@@ -0,0 +1,301 @@
+"""
+店舗・商品のクラスタリング。
+
+特徴量は生データを毎回集計し直さずに、集計済みの値から作ります。
+- 商品ごとの 売上・売上個数・商品価格 の平均・標準偏差: 件数・平均・M2（偏差平方和）のモーメント表から計算する。
+  モーメント表は新しい行の分だけ集計して合算（merge_moments）できる
+- 店舗ごとの特徴量: 日次集計キューブ（SalesCube）の集約結果から計算する
+
+クラスタリングは MiniBatchKMeans で行い、新しいデータが届いたら前回の中心から再学習（refit）します。
+学習済みのモデルと割り当て（キー → クラスタ）は保存しておき、結合済みデータへのクラスタの付与は表を引くだけにします:
+    model = clustering.ClusterModel.load('../processing_data/clusters/goods')
+    df = clustering.assign_clusters(df, model.assignments)
+"""
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# 商品ごとのモーメントを集計する列
+MOMENT_VALUES = ["売上", "売上個数", "商品価格"]
+
+MODEL_FILE = "model.pkl"
+ASSIGNMENTS_FILE = "assignments.parquet"
+
+
+def product_moments(df, key="商品ID", values=None):
+    """
+    キーごとの 件数・平均・M2（偏差平方和）を集計します。
+
+    Parameters:
+    - df (pd.DataFrame): 結合済みデータ
+    - key (str): 集計キー、デフォルトは '商品ID'
+    - values (list): 集計する列、デフォルトは ['売上', '売上個数', '商品価格']
+
+    Returns:
+    pd.DataFrame: キーをインデックスとし、列ごとに f'{列}_件数', f'{列}_平均', f'{列}_M2' を持つモーメント表
+    """
+    values = MOMENT_VALUES if values is None else list(values)
+    values = [value for value in values if value in df.columns]
+    grouped = df.groupby(key, observed=True, sort=True)[values]
+    count = grouped.count()
+    mean = grouped.mean()
+    m2 = grouped.var(ddof=0) * count
+
+    moments = pd.DataFrame(index=count.index)
+    for value in values:
+        moments[f"{value}_件数"] = count[value]
+        moments[f"{value}_平均"] = mean[value]
+        moments[f"{value}_M2"] = m2[value]
+    return moments
+
+
+def merge_moments(left, right):
+    """
+    2つのモーメント表を合算します（Chan らの並列アルゴリズム）。
+    既存の集計結果に新しい行のモーメント表を合算すると、全行を集計し直した場合と同じ値になります。
+
+    Parameters:
+    - left (pd.DataFrame): product_moments の戻り値
+    - right (pd.DataFrame): product_moments の戻り値
+
+    Returns:
+    pd.DataFrame: 合算したモーメント表
+    """
+    index = left.index.union(right.index)
+    left = left.reindex(index)
+    right = right.reindex(index)
+    merged = pd.DataFrame(index=index)
+    for value in [column[: -len("_件数")] for column in left.columns if column.endswith("_件数")]:
+        n_left = left[f"{value}_件数"].fillna(0)
+        n_right = right[f"{value}_件数"].fillna(0)
+        n = n_left + n_right
+        mean_left = left[f"{value}_平均"].fillna(0)
+        mean_right = right[f"{value}_平均"].fillna(0)
+        delta = mean_right - mean_left
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = mean_left + delta * (n_right / n)
+            m2 = (
+                left[f"{value}_M2"].fillna(0)
+                + right[f"{value}_M2"].fillna(0)
+                + delta**2 * n_left * n_right / n
+            )
+        merged[f"{value}_件数"] = n
+        merged[f"{value}_平均"] = mean.where(n > 0)
+        merged[f"{value}_M2"] = m2.where(n > 0)
+    return merged
+
+
+def moments_from_dataset(dataset_dir, key="商品ID", values=None):
+    """
+    Parquetデータセットを 年/月 のパーティションごとに読み込んでモーメント表を作ります。
+    """
+    from . import create_data
+
+    values = MOMENT_VALUES if values is None else list(values)
+    moments = None
+    for df in create_data.iter_merged_dataset(dataset_dir, columns=[key] + values):
+        chunk = product_moments(df, key=key, values=values)
+        moments = chunk if moments is None else merge_moments(moments, chunk)
+    return moments
+
+
+def product_features(moments):
+    """
+    モーメント表から 平均・標準偏差 の特徴量を作ります（列名は f'{列}_mean', f'{列}_std'）。
+    標準偏差は不偏推定で、件数が1の場合は NaN です。
+    """
+    features = pd.DataFrame(index=moments.index)
+    for value in [column[: -len("_件数")] for column in moments.columns if column.endswith("_件数")]:
+        count = moments[f"{value}_件数"]
+        features[f"{value}_mean"] = moments[f"{value}_平均"]
+        features[f"{value}_std"] = np.sqrt(moments[f"{value}_M2"] / (count - 1)).where(count > 1)
+    return features
+
+
+def store_features(df, value="売上"):
+    """
+    店舗ごとの 商品カテゴリ別・曜日別 の売上の構成比を、日次集計キューブの集約結果から作ります。
+
+    Parameters:
+    - df (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+    - value (str): 集計値の列、デフォルトは '売上'
+
+    Returns:
+    pd.DataFrame: 店舗IDをインデックスとする特徴量
+    """
+    from .cube import as_cube
+
+    sales_cube = as_cube(df)
+    features = []
+    for key in ("商品カテゴリ", "曜日"):
+        rolled = sales_cube.rollup(["店舗ID", key], freq=None, values=[value])
+        table = rolled.pivot_table(index="店舗ID", columns=key, values=value, aggfunc="sum", fill_value=0, observed=True)
+        table = table.div(table.sum(axis=1).replace(0, np.nan), axis=0)
+        table.columns = [f"{key}_{column}" for column in table.columns]
+        features.append(table)
+    return pd.concat(features, axis=1).fillna(0)
+
+
+class ClusterModel:
+    """
+    特徴量の標準化と MiniBatchKMeans をまとめたモデル。学習した割り当て（キー → クラスタ）も保持します。
+
+    Parameters:
+    - n_clusters (int): クラスタ数
+    - column (str): 割り当ての列名（例: 'GoodsCluster'）
+    - batch_size (int): MiniBatchKMeans のバッチサイズ
+    - random_state (int): 乱数の種
+    """
+
+    def __init__(self, n_clusters=7, column="クラスタ", batch_size=1024, random_state=0):
+        self.n_clusters = n_clusters
+        self.column = column
+        self.batch_size = batch_size
+        self.random_state = random_state
+        self.feature_names = None
+        self.fill_values = None
+        self.mean = None
+        self.scale = None
+        self.kmeans = None
+        self.assignments = None
+
+    def _new_kmeans(self, init="k-means++"):
+        from sklearn.cluster import MiniBatchKMeans
+
+        return MiniBatchKMeans(
+            n_clusters=self.n_clusters,
+            init=init,
+            n_init=1 if isinstance(init, np.ndarray) else 3,
+            batch_size=self.batch_size,
+            random_state=self.random_state,
+        )
+
+    def _fit_scaler(self, features):
+        self.feature_names = list(features.columns)
+        # 欠損値（件数が1の商品の標準偏差など）は列の平均で埋める
+        self.fill_values = features.mean()
+        filled = features.fillna(self.fill_values).to_numpy(dtype=np.float64)
+        self.mean = filled.mean(axis=0)
+        scale = filled.std(axis=0)
+        self.scale = np.where(scale > 0, scale, 1.0)
+
+    def transform(self, features):
+        """
+        学習時と同じ列・欠損値の埋め方・標準化で特徴量を変換します。
+        """
+        filled = features[self.feature_names].fillna(self.fill_values).to_numpy(dtype=np.float64)
+        return (filled - self.mean) / self.scale
+
+    def fit(self, features):
+        """
+        特徴量（キーをインデックスとするデータフレーム）でモデルを学習し、割り当てを更新します。
+
+        Returns:
+        pd.DataFrame: 割り当て（キーと column の列）
+        """
+        self._fit_scaler(features)
+        self.kmeans = self._new_kmeans()
+        self.kmeans.fit(self.transform(features))
+        return self._assign(features)
+
+    def refit(self, features):
+        """
+        新しいデータで更新した特徴量を、前回の中心から学習し直します（ウォームスタート）。
+        中心を初期値にするので少ない反復で収束し、クラスタの番号も前回と対応します。
+        未学習の場合は fit と同じです。
+
+        Returns:
+        pd.DataFrame: 割り当て
+        """
+        if self.kmeans is None:
+            return self.fit(features)
+        # 前回の中心を元の単位に戻してから、新しい標準化で変換する
+        centers = self.kmeans.cluster_centers_ * self.scale + self.mean
+        self._fit_scaler(features)
+        self.kmeans = self._new_kmeans(init=(centers - self.mean) / self.scale)
+        self.kmeans.fit(self.transform(features))
+        return self._assign(features)
+
+    def partial_fit(self, features):
+        """
+        特徴量の一部（新しく届いたキーなど）で中心を少しだけ更新します（標準化は学習時のまま）。
+
+        Returns:
+        pd.DataFrame: 割り当て（features のキーの分を更新したもの）
+        """
+        if self.kmeans is None:
+            return self.fit(features)
+        self.kmeans.partial_fit(self.transform(features))
+        return self._assign(features)
+
+    def predict(self, features):
+        """
+        特徴量の各行に最も近いクラスタの番号を返します。
+        """
+        return self.kmeans.predict(self.transform(features))
+
+    def _assign(self, features):
+        assignments = pd.DataFrame(
+            {self.column: self.predict(features).astype("int16")}, index=features.index
+        )
+        if self.assignments is not None:
+            previous = self.assignments[~self.assignments.index.isin(assignments.index)]
+            assignments = pd.concat([previous, assignments]).sort_index()
+        self.assignments = assignments
+        return assignments.reset_index()
+
+    def save(self, directory):
+        """
+        モデルと割り当てをディレクトリに保存します（model.pkl と assignments.parquet）。
+        """
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, os.path.join(directory, MODEL_FILE))
+        if self.assignments is not None:
+            self.assignments.reset_index().to_parquet(os.path.join(directory, ASSIGNMENTS_FILE), index=False)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        save で保存したモデルを読み込みます。
+        """
+        with open(os.path.join(directory, MODEL_FILE), "rb") as f:
+            return pickle.load(f)
+
+
+def load_assignments(directory):
+    """
+    保存した割り当てだけを読み込みます（モデルを読み込まずにクラスタを付与する場合）。
+
+    Returns:
+    pd.DataFrame: キーと クラスタ の列
+    """
+    return pd.read_parquet(os.path.join(directory, ASSIGNMENTS_FILE))
+
+
+def assign_clusters(df, assignments, column=None):
+    """
+    結合済みデータにクラスタの列を付与します（pd.merge の代わりに、キーの位置を引いて配列で展開する）。
+    割り当てのないキーの行は -1 になります。
+
+    Parameters:
+    - df (pd.DataFrame): 結合済みデータ
+    - assignments (pd.DataFrame): ClusterModel.assignments（キーをインデックスとする）、または load_assignments の戻り値
+    - column (str): 付与する列名、None の場合は assignments のクラスタの列名
+
+    Returns:
+    pd.DataFrame: クラスタの列を加えたデータフレーム（入力は変更しない）
+    """
+    if not isinstance(assignments.index, pd.RangeIndex) or assignments.index.name is not None:
+        assignments = assignments.reset_index()
+    key, source = assignments.columns[0], assignments.columns[1]
+    position = pd.Index(assignments[key]).get_indexer(df[key].to_numpy())
+    clusters = assignments[source].to_numpy()
+    result = df.copy(deep=False)
+    result[column or source] = np.where(position >= 0, clusters[position], -1).astype(clusters.dtype)
+    return result
@@ -1,7 +1,28 @@
+import os
+import shutil
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.dates as mdates
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from . import jp_holidays, schema
+
+# Parquetデータセットの分割キー（年/月 → 店舗ID の順にディレクトリを切る）
+PARTITION_COLS = ["年", "月", "店舗ID"]
+
+# 分割キーの型（ディレクトリ名から復元する際に使用）
+PARTITION_SCHEMA = pa.schema(
+    [("年", pa.int16()), ("月", pa.int8()), ("店舗ID", pa.int16())]
+)
+
+# 売上履歴を読み込む際のチャンクサイズ（行数）
+DEFAULT_CHUNKSIZE = 500_000
+
+# 日付から作成する列（add_calendar_columns で結合済みデータに追加する列）
+CALENDAR_COLUMNS = ["曜日", "年", "月", "日", "四半期", "週", "平日/休日"]
+
+_NS_PER_DAY = 86_400 * 10**9
 
 # 商品カテゴリ名を『-』でsplit
 def split_column_by_delimiter(df, column, delimiter, new_columns):
@@ -18,4 +39,575 @@ def split_column_by_delimiter(df, column, delimiter, new_columns):
 
 def check_unique_values(df, same_name_column, unique_column):
     result = df.groupby(same_name_column)[unique_column].unique()
-    return result
\ No newline at end of file
+    return result
+
+
+def _partitioning():
+    return ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+
+def _write_partitions(df, dataset_dir, existing_data_behavior, basename_template=None):
+    df = schema.apply_schema(df)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    ds.write_dataset(
+        table,
+        dataset_dir,
+        format="parquet",
+        partitioning=_partitioning(),
+        basename_template=basename_template,
+        existing_data_behavior=existing_data_behavior,
+    )
+    return df
+
+
+def save_merged_dataset(df, dataset_dir, csv_path=None, existing_data_behavior="delete_matching"):
+    """
+    結合済みデータを 年/月/店舗ID で分割したParquetデータセットとして保存します。
+
+    Parameters:
+    - df (pd.DataFrame): 結合済みデータ（年・月・店舗ID列が必要）
+    - dataset_dir (str): 出力先ディレクトリ（例: '../processing_data/merged'）
+    - csv_path (str): 指定した場合は従来のShift_JISのCSVも出力する、デフォルトは None
+    - existing_data_behavior (str): 既存パーティションの扱い、デフォルトは 'delete_matching'（同じパーティションを置き換える）
+
+    Returns:
+    None
+    """
+    missing = [column for column in PARTITION_COLS if column not in df.columns]
+    if missing:
+        raise ValueError(f"{missing} not found in columns")
+
+    df = _write_partitions(df, dataset_dir, existing_data_behavior)
+
+    # 従来のCSV出力（必要な場合のみ）
+    if csv_path is not None:
+        df.to_csv(csv_path, encoding="shift_jis", index=False)
+
+
+def open_merged_dataset(dataset_dir):
+    """
+    Parquetデータセットを読み込まずに開きます（スキーマ確認やパーティション指定の読み込み用）。
+
+    Parameters:
+    - dataset_dir (str or pyarrow.dataset.Dataset): save_merged_dataset の出力先ディレクトリ（開いたデータセットはそのまま返す）
+
+    Returns:
+    pyarrow.dataset.Dataset
+    """
+    if isinstance(dataset_dir, ds.Dataset):
+        return dataset_dir
+    if not os.path.isdir(dataset_dir):
+        raise FileNotFoundError(f"{dataset_dir} not found")
+    return ds.dataset(dataset_dir, format="parquet", partitioning=_partitioning())
+
+
+def build_filter(years=None, months=None, store_ids=None):
+    """
+    年/月/店舗IDの指定からパーティションを絞り込むフィルタ式を作成します。
+
+    Parameters:
+    - years (list): 対象の年、None の場合は全て
+    - months (list): 対象の月、None の場合は全て
+    - store_ids (list): 対象の店舗ID、None の場合は全て
+
+    Returns:
+    pyarrow.dataset.Expression or None
+    """
+    expression = None
+    for column, values in (("年", years), ("月", months), ("店舗ID", store_ids)):
+        if values is None:
+            continue
+        if not isinstance(values, (list, tuple, set)):
+            values = [values]
+        condition = ds.field(column).isin(list(values))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def load_merged_dataset(dataset_dir, columns=None, years=None, months=None, store_ids=None, sort=True):
+    """
+    Parquetデータセットから結合済みデータを読み込みます。
+    年/月/店舗IDの指定は該当しないパーティションのファイルを開かずに読み飛ばし、
+    columns の指定は必要な列だけをディスクから読み込みます。
+
+    Parameters:
+    - dataset_dir (str): save_merged_dataset の出力先ディレクトリ
+    - columns (list): 読み込む列、None の場合は全列
+    - years (list): 対象の年、None の場合は全て
+    - months (list): 対象の月、None の場合は全て
+    - store_ids (list): 対象の店舗ID、None の場合は全て
+    - sort (bool): 日付順に並べ替えるかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame
+    """
+    dataset = open_merged_dataset(dataset_dir)
+    table = dataset.to_table(
+        columns=columns,
+        filter=build_filter(years=years, months=months, store_ids=store_ids),
+    )
+    df = table.to_pandas()
+
+    # 分割キーの列は末尾に付くので、保存時の列順に戻す
+    pandas_metadata = dataset.schema.pandas_metadata or {}
+    column_order = [column["name"] for column in pandas_metadata.get("columns", [])]
+    column_order = [column for column in column_order if column in df.columns]
+    if columns is None and len(column_order) == len(df.columns):
+        df = df[column_order]
+
+    # パーティションの順に並んでいるので、従来のmerged.csvと同じく日付順に戻す
+    if sort and "日付" in df.columns:
+        df = df.sort_values(by="日付", kind="mergesort", ignore_index=True)
+    return schema.apply_schema(df)
+
+
+def load_item_master(item_categories_csv, category_names_csv):
+    """
+    商品ID → 商品カテゴリID・商品カテゴリ名・商品カテゴリ・商品名 の対応表を作成します。
+
+    Parameters:
+    - item_categories_csv (str): item_categories.csv のパス
+    - category_names_csv (str): category_names.csv のパス
+
+    Returns:
+    pd.DataFrame
+    """
+    df_category_name = pd.read_csv(category_names_csv, encoding="shift_jis")
+    df_category_name = split_column_by_delimiter(
+        df_category_name, "商品カテゴリ名", "-", ["商品カテゴリ", "商品名"]
+    )
+    item_categories = pd.read_csv(item_categories_csv, encoding="shift_jis")
+
+    # '商品カテゴリID'でマージする
+    return pd.merge(item_categories, df_category_name, on="商品カテゴリID", how="inner")
+
+
+def date_key(dates):
+    """
+    日付を整数の日付キー（YYYYMMDD）に変換します。
+
+    Parameters:
+    - dates (pd.DatetimeIndex or pd.Series): 日付
+
+    Returns:
+    np.ndarray: int32 の日付キー
+    """
+    dates = pd.DatetimeIndex(dates)
+    return (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy().astype("int32")
+
+
+def build_date_dimension(dates):
+    """
+    ユニークな日付ごとに 日付キー・曜日・年・月・日・四半期・週・平日/休日・祝日 を計算した日付ディメンションを作成します。
+    日付の種類は数百程度なので、行ごとに計算する代わりにこの表を作成して結合します。
+    祝日は jp_holidays の規則表から計算します（ネットワークは使わない）。
+
+    Parameters:
+    - dates (array-like): 日付（重複していてもよい）
+
+    Returns:
+    pd.DataFrame: 日付の昇順で1日1行
+    """
+    dates = pd.DatetimeIndex(pd.unique(pd.DatetimeIndex(dates).normalize())).sort_values()
+    dimension = pd.DataFrame(
+        {
+            "日付キー": date_key(dates),
+            "日付": dates,
+            "曜日": dates.day_name(),
+            "年": dates.year,
+            "月": dates.month,
+            "日": dates.day,
+            "四半期": dates.quarter,
+            "週": dates.isocalendar().week.to_numpy(),
+            "平日/休日": dates.dayofweek // 5,  # 0が平日、1が休日
+            "祝日": jp_holidays.is_holiday(dates).astype("int8"),  # 1が祝日（振替休日・国民の休日を含む）
+        }
+    )
+    return schema.apply_schema(dimension)
+
+
+def _date_codes(dates):
+    # 日付を日付ディメンションの行番号に変換する（時刻のない日付は日数の差をそのまま行番号にする）
+    nanoseconds = dates.to_numpy().astype("datetime64[ns]").view(np.int64)
+    days = nanoseconds // _NS_PER_DAY
+    if len(days) and (days * _NS_PER_DAY == nanoseconds).all():
+        first_day = int(days.min())
+        unique_dates = pd.to_datetime(np.arange(first_day, int(days.max()) + 1) * _NS_PER_DAY)
+        return days - first_day, unique_dates
+    codes, unique_dates = pd.factorize(dates.dt.normalize(), sort=True)
+    return codes, unique_dates
+
+
+def add_calendar_columns(df, holiday=False):
+    """
+    日付列から 曜日・年・月・日・四半期・週・平日/休日 の列を作成します。
+    行ごとに計算せず、ユニークな日付の日付ディメンション（build_date_dimension）を作成して行へ展開します。
+
+    Parameters:
+    - df (pd.DataFrame): 日付列を含むデータフレーム
+    - holiday (bool): 祝日の列（1が祝日）も作成するかどうか、デフォルトは False
+
+    Returns:
+    pd.DataFrame
+    """
+    # 日付列をdatetime型に変換
+    df["日付"] = pd.to_datetime(df["日付"])
+
+    codes, unique_dates = _date_codes(df["日付"])
+    dimension = build_date_dimension(unique_dates)
+    columns = CALENDAR_COLUMNS + (["祝日"] if holiday else [])
+    for column in columns:
+        df[column] = dimension[column].array.take(codes)
+    return df
+
+
+def merge_item_master(sales_chunk, item_master):
+    """
+    売上履歴の1チャンクに売上列を追加し、商品マスタと結合して日付順に並べます（日付の列は作成しない）。
+
+    Parameters:
+    - sales_chunk (pd.DataFrame): 売上履歴（日付, 店舗ID, 商品ID, 商品価格, 売上個数）
+    - item_master (pd.DataFrame): load_item_master の戻り値
+
+    Returns:
+    pd.DataFrame
+    """
+    sales_chunk = sales_chunk.copy()
+    sales_chunk["売上"] = sales_chunk["商品価格"] * sales_chunk["売上個数"]
+    merged_df = pd.merge(sales_chunk, item_master, on="商品ID", how="inner")
+    return merged_df.sort_values(by="日付", kind="mergesort", ignore_index=True)
+
+
+def merge_sales_chunk(sales_chunk, item_master):
+    """
+    売上履歴の1チャンクに売上列を追加し、商品マスタと結合して日付の列を作成します。
+
+    Parameters:
+    - sales_chunk (pd.DataFrame): 売上履歴（日付, 店舗ID, 商品ID, 商品価格, 売上個数）
+    - item_master (pd.DataFrame): load_item_master の戻り値
+
+    Returns:
+    pd.DataFrame
+    """
+    return add_calendar_columns(merge_item_master(sales_chunk, item_master))
+
+
+def iter_sales_history(sales_history_csvs, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    売上履歴のCSVを先頭から順に chunksize 行ずつ読み込みます。
+
+    Parameters:
+    - sales_history_csvs (list): 売上履歴のCSVのパス（sales_history1.csv, sales_history2.csv など）
+    - chunksize (int): 1回に読み込む行数
+
+    Yields:
+    pd.DataFrame
+    """
+    if isinstance(sales_history_csvs, str):
+        sales_history_csvs = [sales_history_csvs]
+    for path in sales_history_csvs:
+        with pd.read_csv(path, encoding="shift_jis", chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+
+
+def build_merged_dataset(
+    sales_history_csvs,
+    item_categories_csv,
+    category_names_csv,
+    dataset_dir,
+    csv_path=None,
+    chunksize=DEFAULT_CHUNKSIZE,
+    verbose=True,
+):
+    """
+    売上履歴をチャンク単位で読み込み、商品マスタとの結合・日付の列の作成を行って
+    Parquetデータセット（とオプションでCSV）へ逐次書き出します。
+    一度に保持するのは1チャンク分だけなので、履歴が増えてもメモリ使用量は一定です。
+
+    出力は 年/月/店舗ID で分割されるため、読み込み時（load_merged_dataset）に日付順へ並べ替えられます。
+    CSVは売上履歴のファイル順・行順で追記されるので、日付順のCSVが必要な場合は入力を日付順にしておいてください。
+
+    Parameters:
+    - sales_history_csvs (list): 売上履歴のCSVのパス
+    - item_categories_csv (str): item_categories.csv のパス
+    - category_names_csv (str): category_names.csv のパス
+    - dataset_dir (str): 出力先ディレクトリ（既存の内容は削除して作り直す）
+    - csv_path (str): 指定した場合は従来のShift_JISのCSVも出力する、デフォルトは None
+    - chunksize (int): 1回に読み込む行数、デフォルトは DEFAULT_CHUNKSIZE
+    - verbose (bool): 型変換前後のメモリ使用量を表示するかどうか、デフォルトは True
+
+    Returns:
+    int: 書き出した行数
+    """
+    item_master = load_item_master(item_categories_csv, category_names_csv)
+
+    # 前回の出力が残っていると行が重複するので作り直す
+    if os.path.isdir(dataset_dir):
+        shutil.rmtree(dataset_dir)
+
+    n_rows = 0
+    memory_before = 0
+    memory_after = 0
+    for i, sales_chunk in enumerate(iter_sales_history(sales_history_csvs, chunksize=chunksize)):
+        merged_chunk = merge_sales_chunk(sales_chunk, item_master)
+        if merged_chunk.empty:
+            continue
+        memory_before += schema.memory_usage(merged_chunk)
+
+        # チャンクごとに別名のファイルとして各パーティションへ追加する
+        merged_chunk = _write_partitions(
+            merged_chunk,
+            dataset_dir,
+            existing_data_behavior="overwrite_or_ignore",
+            basename_template=f"chunk-{i:05d}-{{i}}.parquet",
+        )
+
+        if csv_path is not None:
+            merged_chunk.to_csv(
+                csv_path,
+                encoding="shift_jis",
+                index=False,
+                mode="w" if n_rows == 0 else "a",
+                header=n_rows == 0,
+            )
+        n_rows += len(merged_chunk)
+        memory_after += schema.memory_usage(merged_chunk)
+
+    if verbose:
+        print(schema.memory_report(memory_before, memory_after))
+    return n_rows
+
+
+def list_partitions(dataset_dir):
+    """
+    Parquetデータセットの 年/月 のパーティションを古い順に返します（ファイルは読み込まない）。
+
+    Parameters:
+    - dataset_dir (str): save_merged_dataset の出力先ディレクトリ
+
+    Returns:
+    list: (年, 月) のリスト
+    """
+    dataset = open_merged_dataset(dataset_dir)
+    months = set()
+    for fragment in dataset.get_fragments():
+        keys = ds.get_partition_keys(fragment.partition_expression)
+        if "年" in keys and "月" in keys:
+            months.add((keys["年"], keys["月"]))
+    return sorted(months)
+
+
+def iter_merged_dataset(dataset_dir, columns=None, store_ids=None):
+    """
+    Parquetデータセットを 年/月 のパーティションごとに古い順に読み込みます。
+    一度に保持するのは1か月分だけなので、全履歴を対象にする処理でもメモリ使用量は一定です。
+
+    Parameters:
+    - dataset_dir (str): save_merged_dataset の出力先ディレクトリ
+    - columns (list): 読み込む列、None の場合は全列
+    - store_ids (list): 対象の店舗ID、None の場合は全て
+
+    Yields:
+    pd.DataFrame: 1か月分の結合済みデータ（日付順）
+    """
+    for year, month in list_partitions(dataset_dir):
+        yield load_merged_dataset(
+            dataset_dir, columns=columns, years=[year], months=[month], store_ids=store_ids
+        )
+
+
+def latest_date(dataset_dir):
+    """
+    Parquetデータセットに含まれる最後の日付を返します。
+    最後の 年/月 のパーティションの日付列だけを読み込むので、データセット全体は走査しません。
+
+    Parameters:
+    - dataset_dir (str): save_merged_dataset の出力先ディレクトリ
+
+    Returns:
+    pd.Timestamp or None: データセットが空の場合は None
+    """
+    partitions = list_partitions(dataset_dir)
+    if not partitions:
+        return None
+
+    year, month = partitions[-1]
+    dates = load_merged_dataset(dataset_dir, columns=["日付"], years=[year], months=[month], sort=False)
+    if dates.empty:
+        return None
+    return dates["日付"].max()
+
+
+def ingest_sales_history(
+    sales_history_csvs,
+    item_categories_csv,
+    category_names_csv,
+    dataset_dir,
+    cube_path=None,
+    csv_path=None,
+    scorer_path=None,
+    anomalies_path=None,
+    chunksize=DEFAULT_CHUNKSIZE,
+    verbose=True,
+):
+    """
+    新しく届いた売上履歴のうち、データセットの最後の日付より後の行だけを既存のParquetデータセットへ追加します。
+    売上列と日付の列（曜日・年・月・日・四半期・週・平日/休日）は追加する行についてのみ作成し、
+    既存のパーティションのファイルは書き換えずに、新しい日付の行を別名のファイルとして追加します。
+    処理にかかる時間は追加する行数に比例します（既存の履歴の再読み込み・再結合はしない）。
+
+    同じファイルを2回取り込んでも、2回目は全ての行が既存の日付以前になるので追加されません。
+
+    Parameters:
+    - sales_history_csvs (list): 新しい売上履歴のCSVのパス（sales_history1.csv と同じ列）
+    - item_categories_csv (str): item_categories.csv のパス
+    - category_names_csv (str): category_names.csv のパス
+    - dataset_dir (str): build_merged_dataset / save_merged_dataset の出力先ディレクトリ（存在しない場合は新規作成）
+    - cube_path (str): 日次集計キューブ（SalesCube.save の出力）のパス。指定した場合は追加した行を反映して保存し直す
+    - csv_path (str): 指定した場合は従来のShift_JISのCSVへ追加した行を追記する、デフォルトは None
+    - scorer_path (str): 逐次異常スコアリング（online_anomaly.OnlineScorer）の状態ファイルのパス。
+      指定した場合は追加する行をスコアリングして状態を更新する（ファイルがない場合は既存の履歴から作る）
+    - anomalies_path (str): 異常と判定した行（スコアの列付き）を追記するParquetファイルのパス、デフォルトは None
+    - chunksize (int): 1回に読み込む行数、デフォルトは DEFAULT_CHUNKSIZE
+    - verbose (bool): 追加・スキップした行数を表示するかどうか、デフォルトは True
+
+    Returns:
+    int: 追加した行数
+    """
+    from .cube import SalesCube
+
+    item_master = load_item_master(item_categories_csv, category_names_csv)
+    last_date = latest_date(dataset_dir) if os.path.isdir(dataset_dir) else None
+
+    # 状態ファイルがない場合は、行を追加する前の履歴から作る
+    scorer = None
+    if scorer_path is not None:
+        from . import online_anomaly
+
+        scorer = online_anomaly.load_or_fit(scorer_path, dataset_dir)
+
+    # 既存のファイルと名前が重ならないように、取り込みごとに別のファイル名にする
+    tag = pd.Timestamp.now().strftime("%Y%m%d%H%M%S%f")
+
+    n_rows = 0
+    n_skipped = 0
+    daily_totals = []
+    anomalies = []
+    csv_exists = csv_path is not None and os.path.exists(csv_path)
+    for i, sales_chunk in enumerate(iter_sales_history(sales_history_csvs, chunksize=chunksize)):
+        # 既存の最後の日付より後の行だけを対象にする
+        if last_date is not None:
+            is_new = (pd.to_datetime(sales_chunk["日付"]) > last_date).to_numpy()
+            n_skipped += int((~is_new).sum())
+            sales_chunk = sales_chunk[is_new]
+        if sales_chunk.empty:
+            continue
+
+        merged_chunk = merge_sales_chunk(sales_chunk, item_master)
+        if merged_chunk.empty:
+            continue
+        merged_chunk = _write_partitions(
+            merged_chunk,
+            dataset_dir,
+            existing_data_behavior="overwrite_or_ignore",
+            basename_template=f"ingest-{tag}-{i:05d}-{{i}}.parquet",
+        )
+
+        if csv_path is not None:
+            merged_chunk.to_csv(
+                csv_path,
+                encoding="shift_jis",
+                index=False,
+                mode="a" if csv_exists else "w",
+                header=not csv_exists,
+            )
+            csv_exists = True
+
+        if cube_path is not None:
+            daily_totals.append(SalesCube.from_frame(merged_chunk).frame)
+        if scorer is not None:
+            scores = scorer.score(merged_chunk)
+            flagged = scores["異常"].to_numpy()
+            anomalies.append(pd.concat([merged_chunk[flagged], scores[flagged]], axis=1))
+        n_rows += len(merged_chunk)
+
+    # 保存済みの日次集計キューブに追加した日の合計を反映する
+    if cube_path is not None and n_rows:
+        if os.path.exists(cube_path):
+            sales_cube = SalesCube.load(cube_path)
+            sales_cube.update(pd.concat(daily_totals, ignore_index=True))
+        else:
+            sales_cube = SalesCube.from_dataset(dataset_dir)
+        sales_cube.save(cube_path)
+
+    n_anomalies = sum(len(frame) for frame in anomalies)
+    if scorer is not None:
+        scorer.save(scorer_path)
+        if anomalies_path is not None and n_anomalies:
+            table = pd.concat(anomalies, ignore_index=True)
+            if os.path.exists(anomalies_path):
+                table = pd.concat([pd.read_parquet(anomalies_path), table], ignore_index=True)
+            directory = os.path.dirname(anomalies_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            schema.apply_schema(table).to_parquet(anomalies_path, index=False)
+
+    if verbose:
+        print(f"追加: {n_rows:,} 行, スキップ（既存の日付以前）: {n_skipped:,} 行")
+        if scorer is not None:
+            print(f"異常の疑い: {n_anomalies:,} 行")
+    return n_rows
+
+
+def main(argv=None):
+    """
+    notebook ディレクトリで実行する:
+        python -m function.create_data build ../original_data/sales_history1.csv ../original_data/sales_history2.csv
+        python -m function.create_data ingest ../original_data/sales_history3.csv --cube ../processing_data/cube.parquet
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="結合済みデータ（Parquetデータセット）の作成・追加")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (
+        ("build", "売上履歴からデータセットを作り直す"),
+        ("ingest", "新しい日付の売上履歴だけをデータセットに追加する"),
+    ):
+        subparser = subparsers.add_parser(command, help=help_text)
+        subparser.add_argument("sales_history_csvs", nargs="+", help="売上履歴のCSV")
+        subparser.add_argument("--dataset", default="../processing_data/merged", help="データセットのディレクトリ")
+        subparser.add_argument("--item-categories", default="../original_data/item_categories.csv")
+        subparser.add_argument("--category-names", default="../original_data/category_names.csv")
+        subparser.add_argument("--csv", default=None, help="従来のCSVも出力する場合のパス")
+        subparser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    subparsers.choices["ingest"].add_argument("--cube", default=None, help="更新する日次集計キューブのパス")
+    subparsers.choices["ingest"].add_argument("--scorer", default=None, help="逐次異常スコアリングの状態ファイルのパス")
+    subparsers.choices["ingest"].add_argument("--anomalies", default=None, help="異常と判定した行を追記するParquetファイル")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_merged_dataset(
+            args.sales_history_csvs,
+            args.item_categories,
+            args.category_names,
+            args.dataset,
+            csv_path=args.csv,
+            chunksize=args.chunksize,
+        )
+    else:
+        ingest_sales_history(
+            args.sales_history_csvs,
+            args.item_categories,
+            args.category_names,
+            args.dataset,
+            cube_path=args.cube,
+            csv_path=args.csv,
+            scorer_path=args.scorer,
+            anomalies_path=args.anomalies,
+            chunksize=args.chunksize,
+        )
+
+
+if __name__ == "__main__":
+    main()
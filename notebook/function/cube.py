@@ -0,0 +1,295 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from . import aggregation, schema
+
+# 日次集計キューブのキーと集計値
+CUBE_KEYS = ["店舗ID", "商品カテゴリ", "商品ID", "日付"]
+CUBE_VALUES = ["売上", "売上個数"]
+
+# 日付から導出できる集計キー
+CALENDAR_KEYS = ["年", "月", "四半期", "曜日"]
+
+
+class SalesCube:
+    """
+    (店舗ID, 商品カテゴリ, 商品ID, 日付) ごとの 売上・売上個数 の日次合計を保持し、
+    店舗・カテゴリ・期間（W/M/Q/Y）・曜日への集約を必要になった時点で計算します。
+    一度計算した集約結果は保持しておくので、同じグラフの再描画は生データを走査しません。
+
+    Parameters:
+    - frame (pd.DataFrame): 日次合計（from_frame / load で作成する）
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self._rollups = {}
+        # cache.fingerprint が計算した内容の指紋（update で破棄する）
+        self._fingerprint = None
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        結合済みデータから日次集計キューブを作成します。
+
+        Parameters:
+        - df (pd.DataFrame): 結合済みデータ（CUBE_KEYS と CUBE_VALUES の列のうち存在するものを使用）
+
+        Returns:
+        SalesCube
+        """
+        keys = [key for key in CUBE_KEYS if key in df.columns]
+        values = [value for value in CUBE_VALUES if value in df.columns]
+        if "日付" not in keys or not values:
+            raise ValueError("'日付' and at least one of '売上', '売上個数' are required")
+
+        frame = df[keys + values]
+        if not pd.api.types.is_datetime64_any_dtype(frame["日付"]):
+            frame = frame.assign(日付=pd.to_datetime(frame["日付"]))
+        frame = frame.assign(日付=frame["日付"].dt.normalize())
+
+        frame = (
+            frame.groupby(keys, observed=True, sort=True)[values]
+            .sum()
+            .reset_index()
+        )
+        return cls(schema.apply_schema(frame))
+
+    @classmethod
+    def from_dataset(cls, dataset_dir, years=None, months=None, store_ids=None):
+        """
+        Parquetデータセット（create_data.save_merged_dataset の出力）から日次集計キューブを作成します。
+        年/月 のパーティションごとに必要な列だけを読み込んで日次合計を計算し、部分集計を連結するので、
+        生データ全体をメモリに載せません（日付がキーに含まれるので、異なる月の部分集計のキーは重ならない）。
+
+        Parameters:
+        - dataset_dir (str or pyarrow.dataset.Dataset): データセットのディレクトリ、または開いたデータセット
+        - years (list): 対象の年、None の場合は全て
+        - months (list): 対象の月、None の場合は全て
+        - store_ids (list): 対象の店舗ID、None の場合は全て
+
+        Returns:
+        SalesCube: from_frame で全行から作成した場合と同じキューブ
+        """
+        from . import create_data
+
+        dataset = create_data.open_merged_dataset(dataset_dir)
+        columns = [column for column in CUBE_KEYS + CUBE_VALUES if column in dataset.schema.names]
+        partitions = [
+            (year, month)
+            for year, month in create_data.list_partitions(dataset)
+            if (years is None or year in years) and (months is None or month in months)
+        ]
+
+        parts = []
+        for year, month in partitions:
+            df = create_data.load_merged_dataset(
+                dataset, columns=columns, years=[year], months=[month], store_ids=store_ids, sort=False
+            )
+            if not df.empty:
+                parts.append(cls.from_frame(df).frame)
+        if not parts:
+            # 年/月 で分割されていないデータセット、または該当する行がない場合
+            df = create_data.load_merged_dataset(
+                dataset, columns=columns, years=years, months=months, store_ids=store_ids, sort=False
+            )
+            return cls.from_frame(df)
+
+        frame = schema.apply_schema(pd.concat(parts, ignore_index=True))
+        keys = [key for key in CUBE_KEYS if key in frame.columns]
+        return cls(frame.sort_values(keys, kind="mergesort", ignore_index=True))
+
+    def save(self, path):
+        """
+        キューブをParquetファイルとして保存します。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.frame.to_parquet(path, index=False)
+
+    @classmethod
+    def load(cls, path):
+        """
+        save で保存したキューブを読み込みます。
+        """
+        return cls(schema.apply_schema(pd.read_parquet(path)))
+
+    def update(self, df):
+        """
+        新しく追加された行の日次合計をキューブに加えます（キューブを置き換え、保持している集約結果は破棄する）。
+        既存の日付より後の行だけの場合は連結してキーの順に並べ直すだけで、日付が重なる場合は同じキーの値を合計します。
+
+        Parameters:
+        - df (pd.DataFrame): 追加する行（結合済みデータ、または日次合計）
+
+        Returns:
+        SalesCube: self
+        """
+        added = SalesCube.from_frame(df).frame
+        if added.empty:
+            return self
+
+        frame = pd.concat([self.frame, added], ignore_index=True)
+        if self.frame.empty or added["日付"].min() > self.frame["日付"].max():
+            # from_frame・from_dataset と同じ キーの順 に並べる（順序が違うと指紋が変わり、キャッシュが使われない）
+            frame = schema.apply_schema(frame)
+            frame = frame.sort_values(self.keys, kind="mergesort", ignore_index=True)
+        else:
+            frame = SalesCube.from_frame(frame).frame
+
+        self.frame = frame
+        self._rollups = {}
+        self._fingerprint = None
+        return self
+
+    @property
+    def keys(self):
+        return [key for key in CUBE_KEYS if key in self.frame.columns]
+
+    @property
+    def values(self):
+        return [value for value in CUBE_VALUES if value in self.frame.columns]
+
+    def _key(self, name):
+        # キューブの列はそのまま、年/月/四半期/曜日 は日付から導出する
+        if name in self.frame.columns:
+            return self.frame[name]
+        if name not in CALENDAR_KEYS:
+            raise ValueError(f"{name} is not a cube key. Use one of {self.keys + CALENDAR_KEYS}.")
+
+        # 日付の種類は数百程度なので、ユニークな日付ごとに計算して行へ展開する
+        codes, dates = pd.factorize(self.frame["日付"])
+        dates = pd.DatetimeIndex(dates)
+        if name == "年":
+            attribute = dates.year.astype("int16")
+        elif name == "月":
+            attribute = dates.month.astype("int8")
+        elif name == "四半期":
+            attribute = dates.quarter.astype("int8")
+        else:
+            attribute = pd.Categorical(
+                dates.day_name(), categories=schema.WEEKDAY_ORDER, ordered=True
+            )
+        return pd.Series(attribute.take(codes), index=self.frame.index, name=name)
+
+    def rollup(self, by=(), freq="D", values=None):
+        """
+        キューブを指定したキーと期間で集約します（結果は保持して再利用する）。
+
+        Parameters:
+        - by (list): 集約キー（キューブの列、または '年', '月', '四半期', '曜日'）
+        - freq (str): 期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと, 'Q': 四半期ごと, 'Y': 年ごと)、
+          None の場合は日付で集約しない。デフォルトは 'D'
+        - values (list): 集計値の列、None の場合は '売上' と '売上個数'
+
+        Returns:
+        pd.DataFrame: by + ['日付'] + values の列を持つ縦持ちのデータフレーム（値のある組み合わせのみ）。
+        共有されるので変更しないこと。
+        """
+        by = list(by)
+        values = self.values if values is None else list(values)
+        cache_key = (tuple(by), freq, tuple(values))
+        if cache_key in self._rollups:
+            return self._rollups[cache_key]
+
+        keys = [self._key(name) for name in by]
+        if freq == "D":
+            keys.append(self.frame["日付"])
+        elif freq is not None:
+            keys.append(pd.Grouper(key="日付", freq=freq))
+
+        if keys:
+            result = (
+                self.frame.groupby(keys, observed=True, sort=True)[values]
+                .sum()
+                .reset_index()
+            )
+        else:
+            result = self.frame[values].sum().to_frame().T
+
+        self._rollups[cache_key] = result
+        return result
+
+    def weekday(self, by=(), values=None):
+        """
+        キューブを指定したキーと曜日（月曜日〜日曜日の順）で集約します。
+        """
+        return self.rollup(list(by) + ["曜日"], freq=None, values=values)
+
+    def series(self, conditions, freq="D", value="売上"):
+        """
+        条件に一致する行の value を期間ごとに集約した時系列を返します。
+        値のない期間は 0 で埋めます（pd.pivot_table と pd.Grouper で集約した場合と同じ結果）。
+
+        Parameters:
+        - conditions (dict): 列名 → 値 の絞り込み条件（例: {'店舗ID': 1, '商品カテゴリ': 'ゲーム'}）
+        - freq (str): 期間の指定 ('D', 'W', 'M', 'Q', 'Y')
+        - value (str): 集計値の列
+
+        Returns:
+        pd.Series: 日付をインデックスとする時系列
+        """
+        rolled = _where(self.rollup(list(conditions), freq=freq, values=[value]), conditions)
+        return rolled.set_index("日付")[value].resample(freq).sum()
+
+    def iter_series(self, by, freq="D", value="売上", where=None):
+        """
+        by の値ごとの時系列を、日次の集約結果に対する1回の groupby で計算して順に返します。
+
+        Parameters:
+        - by (list): 系列を分けるキー（例: ['商品カテゴリ']）
+        - freq (str): 期間の指定 ('D', 'W', 'M', 'Q', 'Y')
+        - value (str): 集計値の列
+        - where (dict): 列名 → 値 の絞り込み条件（例: {'店舗ID': 1}）、デフォルトは None
+
+        Yields:
+        (キー, pd.Series): 値のない期間を 0 で埋めた時系列
+        """
+        where = where or {}
+        rolled = self.rollup(list(where) + list(by), freq="D", values=[value])
+        return aggregation.iter_series(_where(rolled, where), by, value, freq=freq)
+
+
+def _where(df, conditions):
+    mask = np.ones(len(df), dtype=bool)
+    for column, condition in conditions.items():
+        mask &= (df[column] == condition).to_numpy()
+    return df[mask]
+
+
+def is_dataset(source):
+    """
+    source がParquetデータセット（ディレクトリのパス、または pyarrow.dataset.Dataset）かどうかを返します。
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.isdir(source)
+    import pyarrow.dataset as ds
+
+    return isinstance(source, ds.Dataset)
+
+
+# データセットから作成したキューブ（データセットの指紋 → SalesCube）。直近の1つだけ保持する
+_dataset_cubes = {}
+
+
+def as_cube(df):
+    """
+    SalesCube はそのまま、データフレームは日次集計キューブに変換して返します。
+    （描画関数が生データとキューブのどちらでも受け取れるようにする）
+    Parquetデータセットのパスまたは開いたデータセットの場合は、パーティションごとに集計して作成します（from_dataset）。
+    同じデータセット（ファイルが変わっていないもの）のキューブは作り直さずに再利用します。
+    """
+    if isinstance(df, SalesCube):
+        return df
+    if is_dataset(df):
+        from . import cache
+
+        key = cache.fingerprint(df)
+        if key not in _dataset_cubes:
+            _dataset_cubes.clear()
+            _dataset_cubes[key] = SalesCube.from_dataset(df)
+        return _dataset_cubes[key]
+    return SalesCube.from_frame(df)
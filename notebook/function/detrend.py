@@ -0,0 +1,165 @@
+"""
+移動平均・季節分解によるトレンド除去。
+
+店舗などの系列ごとに rolling().apply() で窓ごとに Python を呼ぶ代わりに、
+系列 × 観測位置 の行列を作って全系列の移動平均を1回の行列演算でまとめて計算します。
+"""
+import numpy as np
+import pandas as pd
+
+from .aggregation import _segment_starts
+from .cube import as_cube
+
+MOVING_AVERAGE_TYPES = ["simple", "exponential", "weighted", "stl"]
+
+
+def to_matrix(df, keys, value, date_column="日付"):
+    """
+    縦持ちのデータを 系列 × 観測位置 の行列にします。
+    各系列の値を日付順に左詰めで並べ、系列の長さが足りない部分は NaN で埋めます
+    （値のない日は詰めるので、移動平均の窓は従来の rolling と同じく行数で数える）。
+
+    Parameters:
+    - df (pd.DataFrame): keys + [date_column, value] の列を持つデータ
+    - keys (list): 系列を分けるキーの列
+    - value (str): 値の列
+    - date_column (str): 日付の列
+
+    Returns:
+    (np.ndarray, np.ndarray, np.ndarray): 行列（float64）, 各行の行番号（df を keys・日付順に並べ替えた順）, 各行の位置
+    """
+    order = np.lexsort(
+        [df[date_column].to_numpy()] + [pd.factorize(df[key], sort=True)[0] for key in keys[::-1]]
+    )
+    codes = [pd.factorize(df[key], sort=True)[0][order] for key in keys]
+    starts = _segment_starts(codes)
+    lengths = np.diff(np.append(starts, len(df)))
+
+    rows = np.repeat(np.arange(len(starts)), lengths)
+    positions = np.arange(len(df)) - np.repeat(starts, lengths)
+
+    matrix = np.full((len(starts), lengths.max() if len(lengths) else 0), np.nan)
+    matrix[rows, positions] = df[value].to_numpy()[order]
+    return matrix, order, (rows, positions)
+
+
+def simple_moving_average(matrix, window_size):
+    # 累積和の差で窓の合計を求める（窓が揃わない先頭は NaN）
+    cumulative = np.cumsum(np.nan_to_num(matrix), axis=1)
+    cumulative = np.concatenate([np.zeros((len(matrix), 1)), cumulative], axis=1)
+    result = np.full(matrix.shape, np.nan)
+    if window_size <= matrix.shape[1]:
+        result[:, window_size - 1 :] = (
+            cumulative[:, window_size:] - cumulative[:, : -window_size]
+        ) / window_size
+    return np.where(np.isnan(matrix), np.nan, result)
+
+
+def weighted_moving_average(matrix, window_size):
+    # 重み 1, 2, ..., window_size（新しい値ほど重い）の窓を全系列でまとめて掛け合わせる
+    weights = np.arange(1, window_size + 1, dtype=np.float64)
+    result = np.full(matrix.shape, np.nan)
+    if window_size <= matrix.shape[1]:
+        windows = np.lib.stride_tricks.sliding_window_view(matrix, window_size, axis=1)
+        result[:, window_size - 1 :] = windows @ (weights / weights.sum())
+    return result
+
+
+def exponential_moving_average(matrix, window_size):
+    # ewm(span=window_size, adjust=False) と同じ漸化式 y[t] = (1 - a) * y[t-1] + a * x[t]（y[0] = x[0]）を全系列で計算する
+    from scipy.signal import lfilter
+
+    alpha = 2 / (window_size + 1)
+    if matrix.shape[1] == 0:
+        return matrix.copy()
+    initial = (1 - alpha) * matrix[:, :1]
+    result, _ = lfilter([alpha], [1, -(1 - alpha)], matrix, axis=1, zi=initial)
+    return result
+
+
+def stl_trend(matrix, period, lengths):
+    # STL分解は系列ごとに計算する（トレンド, 季節成分 を返す）
+    from statsmodels.tsa.seasonal import STL
+
+    trend = np.full(matrix.shape, np.nan)
+    seasonal = np.full(matrix.shape, np.nan)
+    for row, length in enumerate(lengths):
+        if length < 2 * period:
+            continue
+        result = STL(matrix[row, :length], period=period, robust=True).fit()
+        trend[row, :length] = result.trend
+        seasonal[row, :length] = result.seasonal
+    return trend, seasonal
+
+
+def detrend_panel(df, keys=("店舗ID",), value="売上", window_size=7, moving_average_type="simple"):
+    """
+    系列（keys の値）ごとに value の移動平均を計算し、移動平均を除去した値を加えたデータ（パネル）を返します。
+
+    Parameters:
+    - df (pd.DataFrame): keys + ['日付', value] の列を持つ縦持ちのデータ（SalesCube.rollup の結果など）
+    - keys (list): 系列を分けるキー、デフォルトは ['店舗ID']
+    - value (str): 値の列、デフォルトは '売上'
+    - window_size (int): 移動平均の窓サイズ（'stl' の場合は季節の周期）、デフォルトは 7
+    - moving_average_type (str): 'simple'（単純移動平均）、'exponential'（指数移動平均）、
+      'weighted'（加重移動平均）、'stl'（STL分解のトレンド）のいずれか、デフォルトは 'simple'
+
+    Returns:
+    pd.DataFrame: keys・日付順に並べた df に '移動平均' と f'{value}除去移動平均' の列を加えたもの
+    （'stl' の場合は '季節成分' の列も加える）
+    """
+    keys = list(keys)
+    if moving_average_type not in MOVING_AVERAGE_TYPES:
+        raise ValueError("Invalid moving_average_type. Use 'simple', 'exponential', 'weighted', or 'stl'.")
+
+    panel = df.reset_index(drop=True)
+    if panel.empty:
+        panel = panel.copy()
+        panel["移動平均"] = pd.Series(dtype="float64")
+        panel[f"{value}除去移動平均"] = pd.Series(dtype="float64")
+        return panel
+
+    matrix, order, (rows, positions) = to_matrix(panel, keys, value)
+    panel = panel.iloc[order].reset_index(drop=True)
+
+    seasonal = None
+    if moving_average_type == "simple":
+        moving_average = simple_moving_average(matrix, window_size)
+    elif moving_average_type == "exponential":
+        moving_average = exponential_moving_average(matrix, window_size)
+    elif moving_average_type == "weighted":
+        moving_average = weighted_moving_average(matrix, window_size)
+    else:
+        lengths = np.bincount(rows, minlength=len(matrix))
+        moving_average, seasonal = stl_trend(matrix, window_size, lengths)
+
+    panel["移動平均"] = moving_average[rows, positions]
+    if seasonal is not None:
+        panel["季節成分"] = seasonal[rows, positions]
+
+    # 移動平均を除去
+    panel[f"{value}除去移動平均"] = panel[value] - panel["移動平均"]
+    return panel
+
+
+def detrend_sales(df, by=("店舗ID",), unit="day", value="売上", window_size=7, moving_average_type="simple"):
+    """
+    結合済みデータ（または日次集計キューブ）を by と集計単位で集計し、系列ごとのトレンドを除去したパネルを返します。
+
+    Parameters:
+    - df (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+    - by (list): 系列を分けるキー、デフォルトは ['店舗ID']
+    - unit (str): 'day', 'month', 'year' のいずれか、デフォルトは 'day'
+    - value (str): 値の列（'売上' または '売上個数'）、デフォルトは '売上'
+    - window_size (int): 移動平均の窓サイズ（'stl' の場合は季節の周期）、デフォルトは 7
+    - moving_average_type (str): 'simple', 'exponential', 'weighted', 'stl' のいずれか、デフォルトは 'simple'
+
+    Returns:
+    pd.DataFrame: detrend_panel の戻り値
+    """
+    from .eda_by_store import unit_to_freq
+
+    rolled = as_cube(df).rollup(list(by), freq=unit_to_freq(unit), values=[value])
+    return detrend_panel(
+        rolled, keys=by, value=value, window_size=window_size, moving_average_type=moving_average_type
+    )
@@ -1,7 +1,8 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.dates as mdates
+
+from . import cache, schema
+from .backends import mdates, plt, sns
+from .cube import as_cube, is_dataset
 
 # 商品カテゴリ名を『-』でsplit
 def split_column_by_delimiter(df, column, delimiter, new_columns):
@@ -17,22 +18,38 @@ def split_column_by_delimiter(df, column, delimiter, new_columns):
 
 
 def check_unique_values(df, same_name_column, unique_column):
-    result = df.groupby(same_name_column)[unique_column].unique()
+    # Parquetデータセットの場合は、パーティションごとに2列の重複のない組み合わせだけを残して合わせる
+    if is_dataset(df):
+        from . import create_data
+
+        columns = [same_name_column, unique_column]
+        parts = [chunk.drop_duplicates() for chunk in create_data.iter_merged_dataset(df, columns=columns)]
+        if parts:
+            df = schema.apply_schema(pd.concat(parts, ignore_index=True).drop_duplicates())
+        else:
+            df = create_data.load_merged_dataset(df, columns=columns)
+    result = df.groupby(same_name_column, observed=True)[unique_column].unique()
     return result
 
 
-def plot_sales_by_category(df, store_id):
-    # 日付列をdatetime型に変換
-    df['日付'] = pd.to_datetime(df['日付'])
-    
-    # 指定した店舗IDのデータを抽出
-    store_data = df[df['店舗ID'] == store_id]
+def aggregate_sales_by_category(df, store_id):
+    def compute():
+        # 生データの場合は日次集計キューブを作成（SalesCube はそのまま使う）
+        cube = as_cube(df)
+
+        # 指定した店舗IDのデータを抽出
+        sales_by_category = cube.rollup(['店舗ID', '商品カテゴリ'], freq='D', values=['売上'])
+        store_data = sales_by_category[sales_by_category['店舗ID'] == store_id]
 
-    # 商品カテゴリごとに時系列データを作成
-    pivot_table = pd.pivot_table(store_data, values='売上', index='日付', columns='商品カテゴリ', aggfunc='sum')
+        # 商品カテゴリごとに時系列データを作成
+        return pd.pivot_table(store_data, values='売上', index='日付', columns='商品カテゴリ', aggfunc='sum', observed=True)
 
+    return cache.cached('aggregate_sales_by_category', {'store_id': store_id}, df, compute)
+
+
+def draw_sales_by_category(store_id, pivot_table):
     # グラフのプロット
-    plt.figure(figsize=(12, 8))
+    fig = plt.figure(figsize=(12, 8))
     ax = sns.lineplot(data=pivot_table, dashes=False)
 
     # グラフの設定
@@ -45,15 +62,26 @@ def plot_sales_by_category(df, store_id):
     ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y/%m/%d'))
     plt.xticks(rotation=45, ha='right')  # 45度傾けて表示
+    return fig
 
-    plt.show()
+
+def plot_sales_by_category(df, store_id):
+    pivot_table = aggregate_sales_by_category(df, store_id)
+
+    # キャッシュが有効で描画済みの場合は保存した画像を表示
+    cache.show_figure(
+        'draw_sales_by_category',
+        {'store_id': store_id},
+        pivot_table,
+        lambda: draw_sales_by_category(store_id, pivot_table),
+    )
 
 def plot_sales_by_category_foreach_and_store(df, store_id, agg_period='D'):
     """
     指定した店舗IDの各商品カテゴリごとに、売り上げの時系列データをグラフに描画します。
 
     Parameters:
-    - df (pd.DataFrame): 入力データフレーム
+    - df (pd.DataFrame, SalesCube, or str): 入力データフレーム、日次集計キューブ、またはParquetデータセットのパス
     - store_id (int): 対象の店舗ID
     - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
 
@@ -61,23 +89,20 @@ def plot_sales_by_category_foreach_and_store(df, store_id, agg_period='D'):
     None
     """
 
-    # 日付列をdatetime型に変換
-    df['日付'] = pd.to_datetime(df['日付'])
     
-    # 指定した店舗IDのデータを抽出
-    store_data = df[df['店舗ID'] == store_id]
-
-    # 商品カテゴリごとにグラフを描画
-    unique_categories = store_data['商品カテゴリ'].unique()
-
     # y軸の範囲を保存するリスト
     y_limits = []
 
-    for category in unique_categories:
-        category_data = store_data[store_data['商品カテゴリ'] == category]
-
-        # 期間ごとにデータを集計
-        pivot_table = pd.pivot_table(category_data, values='売上', index=pd.Grouper(key='日付', freq=agg_period), aggfunc='sum')
+    # 指定した店舗IDの商品カテゴリごとに、期間ごとのデータを1回の集計でまとめて取り出す
+    series_by_category = cache.cached(
+        'iter_series',
+        {'by': ['商品カテゴリ'], 'freq': agg_period, 'value': '売上', 'where': {'店舗ID': store_id}},
+        df,
+        # 生データの場合は日次集計キューブを作成（SalesCube はそのまま使う）
+        lambda: list(as_cube(df).iter_series(['商品カテゴリ'], freq=agg_period, value='売上', where={'店舗ID': store_id})),
+    )
+    for category, series in series_by_category:
+        pivot_table = series.to_frame()
 
         # グラフのプロット
         plt.figure(figsize=(12, 8))
@@ -116,7 +141,7 @@ def plot_sales_by_category_foreach(df, agg_period='D'):
     指定した店舗IDの各商品カテゴリごとに、売り上げの時系列データをグラフに描画します。
 
     Parameters:
-    - df (pd.DataFrame): 入力データフレーム
+    - df (pd.DataFrame, SalesCube, or str): 入力データフレーム、日次集計キューブ、またはParquetデータセットのパス
     - store_id (int): 対象の店舗ID（今回は使用しない）
     - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
 
@@ -124,20 +149,20 @@ def plot_sales_by_category_foreach(df, agg_period='D'):
     None
     """
 
-    # 日付列をdatetime型に変換
-    df['日付'] = pd.to_datetime(df['日付'])
-
-    # 商品カテゴリごとにグラフを描画
-    unique_categories = df['商品カテゴリ'].unique()
 
     # y軸の範囲を保存するリスト
     y_limits = []
 
-    for category in unique_categories:
-        category_data = df[df['商品カテゴリ'] == category]
-
-        # 期間ごとにデータを集計
-        pivot_table = pd.pivot_table(category_data, values='売上', index=pd.Grouper(key='日付', freq=agg_period), aggfunc='sum')
+    # 商品カテゴリごとに、期間ごとのデータを1回の集計でまとめて取り出す
+    series_by_category = cache.cached(
+        'iter_series',
+        {'by': ['商品カテゴリ'], 'freq': agg_period, 'value': '売上'},
+        df,
+        # 生データの場合は日次集計キューブを作成（SalesCube はそのまま使う）
+        lambda: list(as_cube(df).iter_series(['商品カテゴリ'], freq=agg_period, value='売上')),
+    )
+    for category, series in series_by_category:
+        pivot_table = series.to_frame()
 
         # グラフのプロット
         plt.figure(figsize=(12, 8))
@@ -170,55 +195,56 @@ def plot_sales_by_category_foreach(df, agg_period='D'):
 
     
 
+def draw_sales_by_store_foreach(store_id, pivot_table, agg_period='D'):
+    # グラフのプロット
+    fig = plt.figure(figsize=(12, 8))
+    sns.lineplot(data=pivot_table, dashes=False)
+
+    # y軸の範囲を設定（指定の値を採用）
+    plt.ylim(0, 1500000)
+
+    # グラフの設定
+    plt.title(f'店舗ID {store_id} 別売り上げ ({agg_period})')
+    plt.xlabel('日付')
+    plt.ylabel('売り上げ')
+
+    # y軸の表記を通常の表記に戻す
+    plt.ticklabel_format(style='plain', axis='y')
+
+    # x軸の日付を設定
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y/%m/%d'))
+    plt.xticks(rotation=45, ha='right')  # 45度傾けて表示
+    plt.grid()
+    return fig
+
+
 def plot_sales_by_store_foreach(df, agg_period='D'):
     """
     各店舗ごとに、売り上げの時系列データをグラフに描画します。
 
     Parameters:
-    - df (pd.DataFrame): 入力データフレーム
+    - df (pd.DataFrame, SalesCube, or str): 入力データフレーム、日次集計キューブ、またはParquetデータセットのパス
     - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
 
     Returns:
     None
     """
 
-    # 日付列をdatetime型に変換
-    df['日付'] = pd.to_datetime(df['日付'])
-
-    # 各店舗の日付別の売り上げの最大値を取得
-    max_sales_by_store = df.groupby(['店舗ID', '日付'])['売上'].sum().groupby('店舗ID').max()
-
-    # 店舗ごとにグラフを描画
-    unique_stores = df['店舗ID'].unique()
-
-    for store_id in unique_stores:
-        store_data = df[df['店舗ID'] == store_id]
-
-        # 期間ごとにデータを集計
-        pivot_table = pd.pivot_table(store_data, values='売上', index=pd.Grouper(key='日付', freq=agg_period), aggfunc='sum')
-
-        # 各店舗での最大の売り上げ値を取得
-        max_sales = max_sales_by_store[store_id]
-
-        # グラフのプロット
-        plt.figure(figsize=(12, 8))
-        sns.lineplot(data=pivot_table, dashes=False)
-
-        # y軸の範囲を設定（指定の値を採用）
-        plt.ylim(0, 1500000)
-
-        # グラフの設定
-        plt.title(f'店舗ID {store_id} 別売り上げ ({agg_period})')
-        plt.xlabel('日付')
-        plt.ylabel('売り上げ')
-
-        # y軸の表記を通常の表記に戻す
-        plt.ticklabel_format(style='plain', axis='y')
-
-        # x軸の日付を設定
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y/%m/%d'))
-        plt.xticks(rotation=45, ha='right')  # 45度傾けて表示
-
-        # グラフを表示
-        plt.grid()
-        plt.show()
\ No newline at end of file
+    # 店舗ごとの期間ごとのデータを1回の集計でまとめて取り出す
+    series_by_store = cache.cached(
+        'iter_series',
+        {'by': ['店舗ID'], 'freq': agg_period, 'value': '売上'},
+        df,
+        # 生データの場合は日次集計キューブを作成（SalesCube はそのまま使う）
+        lambda: list(as_cube(df).iter_series(['店舗ID'], freq=agg_period, value='売上')),
+    )
+
+    # 店舗ごとにグラフを描画（キャッシュが有効で描画済みの場合は保存した画像を表示）
+    for store_id, series in series_by_store:
+        pivot_table = series.to_frame()
+        cache.show_figure(
+            'draw_sales_by_store_foreach',
+            {'store_id': store_id, 'agg_period': agg_period},
+            pivot_table,
+            lambda: draw_sales_by_store_foreach(store_id, pivot_table, agg_period=agg_period),
+        )
@@ -1,154 +1,274 @@
-import japanize_matplotlib
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
-import statsmodels.api as sm
-import numpy as np
 
-japanize_matplotlib.japanize()
+from . import cache, detrend, parallel, schema
+from .aggregation import split_by
+from .backends import mdates, plt, sns
+from .cube import as_cube
 
+# 集計単位と集計期間の対応
+UNIT_FREQ = {"day": "D", "month": "M", "year": "Y"}
 
-def plot_total_sales_by_store(df, unit="day"):
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
 
-    # 単位ごとにデータを集計
-    if unit == "day":
-        grouper = pd.Grouper(key="日付", freq="D")
-        y_limit = 2000000  # 日ごとのy軸範囲
-    elif unit == "month":
-        grouper = pd.Grouper(key="日付", freq="M")
-        y_limit = 10000000  # 月ごとのy軸範囲
-    elif unit == "year":
-        grouper = pd.Grouper(key="日付", freq="Y")
-        y_limit = 100000000  # 年ごとのy軸範囲
-    else:
+def unit_to_freq(unit):
+    if unit not in UNIT_FREQ:
         raise ValueError("Invalid unit. Use 'day', 'month', or 'year'.")
+    return UNIT_FREQ[unit]
 
-    # 店舗IDごとにプロット
-    unique_stores = df["店舗ID"].unique()
-    for store_id in unique_stores:
-        store_data = df[df["店舗ID"] == store_id]
-        total_sales_by_store = (
-            store_data.groupby(["店舗ID", grouper])["売上"].sum().reset_index()
-        )
 
-        # グラフのプロット
-        plt.figure(figsize=(12, 8))
-        ax = sns.lineplot(
-            x="日付",
-            y="売上",
-            data=total_sales_by_store,
-            label=f"店舗ID {store_id}",
-            dashes=False,
-        )
+def aggregate_total_sales_by_store(df, unit="day", workers=None):
+    freq = unit_to_freq(unit)
 
-        # グラフの設定
-        title = f"店舗ID {store_id} - 売り上げ合計推移 ({unit}単位)"
-        plt.title(title)
-        plt.xlabel(unit.capitalize())
-        plt.ylabel("売り上げ")
-        plt.legend(title="店舗ID", loc="upper left", bbox_to_anchor=(1, 1))
+    def compute():
+        # workers を指定した場合は店舗で分割してプロセスプールで集計する（結果は同じ）
+        if workers is not None:
+            return parallel.total_sales(df, unit=unit, workers=workers)
+        # 単位ごとにデータを集計（生データの場合は日次集計キューブを作成、SalesCube はそのまま使う）
+        return as_cube(df).rollup(["店舗ID"], freq=freq, values=["売上"])
 
-        if unit == "day":
-            ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y/%m/%d"))
-            plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
-        plt.ylim(0, y_limit)  # y軸範囲の設定
-        plt.ticklabel_format(style="plain", axis="y")
-        plt.grid()
-        plt.show()
+    return cache.cached("aggregate_total_sales_by_store", {"unit": unit}, df, compute)
 
 
-def plot_sales_by_store_category(df, unit="day"):
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+def draw_total_sales_by_store(store_id, total_sales_by_store, unit="day"):
+    # 単位ごとのy軸範囲
+    y_limit = {
+        "day": 2000000,  # 日ごとのy軸範囲
+        "month": 10000000,  # 月ごとのy軸範囲
+        "year": 100000000,  # 年ごとのy軸範囲
+    }[unit]
+
+    # グラフのプロット
+    fig = plt.figure(figsize=(12, 8))
+    ax = sns.lineplot(
+        x="日付",
+        y="売上",
+        data=total_sales_by_store,
+        label=f"店舗ID {store_id}",
+        dashes=False,
+    )
+
+    # グラフの設定
+    title = f"店舗ID {store_id} - 売り上げ合計推移 ({unit}単位)"
+    plt.title(title)
+    plt.xlabel(unit.capitalize())
+    plt.ylabel("売り上げ")
+    plt.legend(title="店舗ID", loc="upper left", bbox_to_anchor=(1, 1))
 
-    # 単位ごとにデータを集計
     if unit == "day":
-        grouper = pd.Grouper(key="日付", freq="D")
-        y_limit = 1000000
-    elif unit == "month":
-        grouper = pd.Grouper(key="日付", freq="M")
-        y_limit = 5000000
-    elif unit == "year":
-        grouper = pd.Grouper(key="日付", freq="Y")
-        y_limit = 20000000
-    else:
-        raise ValueError("Invalid unit. Use 'day', 'month', or 'year'.")
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y/%m/%d"))
+        plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
+    plt.ylim(0, y_limit)  # y軸範囲の設定
+    plt.ticklabel_format(style="plain", axis="y")
+    plt.grid()
+    return fig
+
+
+def plot_total_sales_by_store(df, unit="day", workers=None):
+    sales_by_store = aggregate_total_sales_by_store(df, unit=unit, workers=workers)
 
     # 店舗IDごとにプロット
-    unique_stores = df["店舗ID"].unique()
-    for store_id in unique_stores:
-        store_data = df[df["店舗ID"] == store_id]
-        sales_by_store_category = (
-            store_data.groupby(["店舗ID", "商品カテゴリ", grouper])["売上"]
-            .sum()
-            .reset_index()
+    for store_id, total_sales_by_store in split_by(sales_by_store, ["店舗ID"]):
+        cache.show_figure(
+            "draw_total_sales_by_store",
+            {"store_id": store_id, "unit": unit},
+            total_sales_by_store,
+            lambda: draw_total_sales_by_store(store_id, total_sales_by_store, unit=unit),
         )
 
-        # グラフのプロット
-        plt.figure(figsize=(12, 8))
-        ax = sns.lineplot(
-            x="日付",
-            y="売上",
-            hue="商品カテゴリ",
-            data=sales_by_store_category,
-            dashes=False,
+
+def aggregate_forecast_by_store(df, horizon=28, history_days=90, backend="lightgbm", n_jobs=-1):
+    def compute():
+        from . import forecast
+
+        # 全ての (店舗ID, 商品カテゴリ) の系列を1つのモデルで学習・予測し、店舗ごとに合計する
+        model = forecast.GlobalForecaster(backend=backend, n_jobs=n_jobs).fit(df)
+        predicted = model.predict(horizon=horizon)
+        predicted = predicted.groupby(["店舗ID", "日付"], observed=True, sort=True)["予測"].sum().reset_index()
+
+        # 実績は予測の直前の history_days 日分
+        actual = as_cube(df).rollup(["店舗ID"], freq="D", values=["売上"])
+        actual = actual[actual["日付"] > model.dates[-1] - pd.Timedelta(days=history_days)]
+        return pd.concat(
+            [
+                actual.assign(種類="実績"),
+                predicted.rename(columns={"予測": "売上"}).assign(種類="予測"),
+            ],
+            ignore_index=True,
         )
 
-        # グラフの設定
-        title = f"店舗ID {store_id} - カテゴリ別売り上げ ({unit}単位)"
-        plt.title(title)
-        plt.xlabel(unit.capitalize())
-        plt.ylabel("売り上げ")
-        plt.legend(title="商品カテゴリ", loc="upper left", bbox_to_anchor=(1, 1))
+    return cache.cached(
+        "aggregate_forecast_by_store",
+        {"horizon": horizon, "history_days": history_days, "backend": backend},
+        df,
+        compute,
+    )
+
+
+def draw_forecast_by_store(store_id, forecast_by_store):
+    # グラフのプロット（実績と予測を線の種類で分ける）
+    fig = plt.figure(figsize=(12, 8))
+    ax = sns.lineplot(
+        x="日付",
+        y="売上",
+        hue="種類",
+        style="種類",
+        data=forecast_by_store,
+    )
 
-        if unit == "day":
-            ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y/%m/%d"))
-            plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
-        plt.ylim(0, y_limit)
-        plt.ticklabel_format(style="plain", axis="y")
-        plt.grid()
-        plt.show()
+    # グラフの設定
+    title = f"店舗ID {store_id} - 売り上げ合計の実績と予測 (day単位)"
+    plt.title(title)
+    plt.xlabel("Day")
+    plt.ylabel("売り上げ")
+    plt.legend(title=f"店舗ID {store_id}", loc="upper left", bbox_to_anchor=(1, 1))
+
+    ax.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=mdates.MO, interval=2))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y/%m/%d"))
+    plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
+    plt.ylim(bottom=0)
+    plt.ticklabel_format(style="plain", axis="y")
+    plt.grid()
+    return fig
 
 
-def plot_sales_by_category_foreach_and_store(df, store_id, agg_period="D"):
+def plot_forecast_by_store(df, horizon=28, history_days=90, backend="lightgbm", n_jobs=-1):
     """
-    指定した店舗IDの各商品カテゴリごとに、売り上げの時系列データをグラフに描画します。
+    概要:
+        全ての (店舗ID, 商品カテゴリ) の日次売上を1つの勾配ブースティングモデルで予測し、
+        店舗ごとに売上合計の実績（直近 history_days 日）と予測（horizon 日）をプロットします。
+        plot_total_sales_by_store の予測版です。
 
-    Parameters:
-    - df (pd.DataFrame): 入力データフレーム
-    - store_id (int): 対象の店舗ID
-    - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
+    パラメータ:
+        - df (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス。
+        - horizon (int, optional): 予測する日数。デフォルトは 28 です。
+        - history_days (int, optional): 予測の前に表示する実績の日数。デフォルトは 90 です。
+        - backend (str, optional): 'lightgbm' または 'sklearn'（HistGradientBoostingRegressor）。デフォルトは 'lightgbm' です。
+        - n_jobs (int, optional): 学習・予測のスレッド数。-1 の場合は全てのコアを使います。
 
-    Returns:
-    None
+    戻り値:
+        なし。プロットが表示されます。
     """
+    forecast_by_store = aggregate_forecast_by_store(
+        df, horizon=horizon, history_days=history_days, backend=backend, n_jobs=n_jobs
+    )
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 店舗IDごとにプロット
+    for store_id, store_forecast in split_by(forecast_by_store, ["店舗ID"]):
+        cache.show_figure(
+            "draw_forecast_by_store",
+            {"store_id": store_id},
+            store_forecast,
+            lambda: draw_forecast_by_store(store_id, store_forecast),
+        )
 
-    # 指定した店舗IDのデータを抽出
-    store_data = df[df["店舗ID"] == store_id]
 
-    # 商品カテゴリごとにグラフを描画するためのデータをまとめる
-    plot_data = []
-
-    for category in store_data["商品カテゴリ"].unique():
-        category_data = store_data[store_data["商品カテゴリ"] == category]
-        pivot_table = pd.pivot_table(
-            category_data,
-            values="売上",
-            index=pd.Grouper(key="日付", freq=agg_period),
-            aggfunc="sum",
+def aggregate_sales_by_store_category(df, unit="day"):
+    freq = unit_to_freq(unit)
+
+    # 単位ごとにデータを集計（生データの場合は日次集計キューブを作成、SalesCube はそのまま使う）
+    return cache.cached(
+        "aggregate_sales_by_store_category",
+        {"unit": unit},
+        df,
+        lambda: as_cube(df).rollup(["店舗ID", "商品カテゴリ"], freq=freq, values=["売上"]),
+    )
+
+
+def draw_sales_by_store_category(store_id, sales_by_store_category, unit="day"):
+    # 単位ごとのy軸範囲
+    y_limit = {"day": 1000000, "month": 5000000, "year": 20000000}[unit]
+
+    # 店舗に存在しないカテゴリが凡例に出ないようにする
+    sales_by_store_category = schema.remove_unused_categories(sales_by_store_category)
+
+    # グラフのプロット
+    fig = plt.figure(figsize=(12, 8))
+    ax = sns.lineplot(
+        x="日付",
+        y="売上",
+        hue="商品カテゴリ",
+        data=sales_by_store_category,
+        dashes=False,
+    )
+
+    # グラフの設定
+    title = f"店舗ID {store_id} - カテゴリ別売り上げ ({unit}単位)"
+    plt.title(title)
+    plt.xlabel(unit.capitalize())
+    plt.ylabel("売り上げ")
+    plt.legend(title="商品カテゴリ", loc="upper left", bbox_to_anchor=(1, 1))
+
+    if unit == "day":
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y/%m/%d"))
+        plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
+    plt.ylim(0, y_limit)
+    plt.ticklabel_format(style="plain", axis="y")
+    plt.grid()
+    return fig
+
+
+def plot_sales_by_store_category(df, unit="day"):
+    sales_by_category = aggregate_sales_by_store_category(df, unit=unit)
+
+    # 店舗IDごとにプロット
+    for store_id, sales_by_store_category in split_by(sales_by_category, ["店舗ID"]):
+        cache.show_figure(
+            "draw_sales_by_store_category",
+            {"store_id": store_id, "unit": unit},
+            sales_by_store_category,
+            lambda: draw_sales_by_store_category(store_id, sales_by_store_category, unit=unit),
         )
-        plot_data.append((category, pivot_table))
 
+
+def aggregate_category_series(df, store_id, agg_period="D", value="売上"):
+    # 指定した店舗IDの商品カテゴリごとの時系列を [(商品カテゴリ, pd.DataFrame), ...] で返す
+    def compute():
+        # 生データの場合は日次集計キューブを作成（SalesCube はそのまま使う）
+        cube = as_cube(df)
+        return [
+            (category, series.to_frame())
+            for category, series in cube.iter_series(
+                ["商品カテゴリ"], freq=agg_period, value=value, where={"店舗ID": store_id}
+            )
+        ]
+
+    return cache.cached(
+        "aggregate_category_series",
+        {"store_id": store_id, "agg_period": agg_period, "value": value},
+        df,
+        compute,
+    )
+
+
+def aggregate_category_weekday(df, store_id, value="売上"):
+    # 指定した店舗IDの商品カテゴリごとの曜日別合計を [(商品カテゴリ, pd.DataFrame), ...] で返す（月曜日〜日曜日の順）
+    def compute():
+        # 生データの場合は日次集計キューブを作成（SalesCube はそのまま使う）
+        cube = as_cube(df)
+        sales_by_weekday = cube.weekday(["店舗ID", "商品カテゴリ"], values=[value])
+        store_data = sales_by_weekday[sales_by_weekday["店舗ID"] == store_id]
+
+        plot_data = []
+        for category, category_data in split_by(store_data, ["商品カテゴリ"]):
+            pivot_table = (
+                category_data.set_index(category_data["曜日"].astype(str))[[value]]
+                .reindex(schema.WEEKDAY_ORDER)
+            )
+            plot_data.append((category, pivot_table))
+        return plot_data
+
+    return cache.cached(
+        "aggregate_category_weekday",
+        {"store_id": store_id, "value": value},
+        df,
+        compute,
+    )
+
+
+def draw_sales_by_category_foreach_and_store(store_id, plot_data, agg_period="D"):
     # グラフのプロット
-    plt.figure(figsize=(12, 8))
+    fig = plt.figure(figsize=(12, 8))
 
     for category, data in plot_data:
         sns.lineplot(data=data["売上"], label=f"商品カテゴリ: {category}", dashes=False)
@@ -168,99 +288,101 @@ def plot_sales_by_category_foreach_and_store(df, store_id, agg_period="D"):
     plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
     plt.grid()
 
-    plt.show()
+    return fig
 
 
-def plot_sales_by_store_yearly(df):
+def plot_sales_by_category_foreach_and_store(df, store_id, agg_period="D"):
     """
-    年ごとに店舗IDごとの曜日ごとの売り上げ合計を可視化する関数。
+    指定した店舗IDの各商品カテゴリごとに、売り上げの時系列データをグラフに描画します。
 
     Parameters:
-    - df (pd.DataFrame): 時系列データが格納されたDataFrame。
+    - df (pd.DataFrame, SalesCube, or str): 入力データフレーム、日次集計キューブ、またはParquetデータセットのパス
+    - store_id (int): 対象の店舗ID
+    - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
 
     Returns:
-    None (グラフが表示されるのみ)
+    None
     """
+    # 指定した店舗IDの商品カテゴリごとの時系列を1回の集計でまとめる
+    plot_data = aggregate_category_series(df, store_id, agg_period=agg_period, value="売上")
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # グラフのプロット（キャッシュが有効で描画済みの場合は保存した画像を表示）
+    cache.show_figure(
+        "draw_sales_by_category_foreach_and_store",
+        {"store_id": store_id, "agg_period": agg_period},
+        plot_data,
+        lambda: draw_sales_by_category_foreach_and_store(store_id, plot_data, agg_period=agg_period),
+    )
 
-    # 年ごとにプロット
-    unique_stores = df["店舗ID"].unique()
-    for store_id in unique_stores:
-        # 対象店舗のデータを抽出
-        store_data = df[df["店舗ID"] == store_id]
-
-        # 年ごとに曜日ごとの売上を合計
-        total_sales_by_store = (
-            store_data.groupby(["店舗ID", store_data["日付"].dt.year, "曜日"])["売上"].sum().reset_index()
-        )
 
-        # グラフのプロット
-        plt.figure(figsize=(12, 8))
-        ax = sns.lineplot(
-            x="曜日",
-            y="売上",
-            hue="日付",
-            data=total_sales_by_store,
-            label=f"店舗ID {store_id}",
-            dashes=False,
-        )
+def aggregate_sales_by_store_yearly(df, workers=None):
+    def compute():
+        # workers を指定した場合は店舗で分割してプロセスプールで集計する（結果は同じ）
+        if workers is not None:
+            return parallel.sales_by_weekday(df, workers=workers)
+        # 年ごとに曜日ごとの売上を合計（生データの場合は日次集計キューブを作成、SalesCube はそのまま使う）
+        return as_cube(df).weekday(["店舗ID", "年"], values=["売上"])
 
-        # グラフの設定
-        title = f"店舗ID {store_id} - 年ごとの曜日ごとの売り上げ合計推移"
-        plt.title(title)
-        plt.xlabel("曜日")
-        plt.ylabel("売り上げ")
-        plt.legend(title="年", loc="upper left", bbox_to_anchor=(1, 1))
+    return cache.cached("aggregate_sales_by_store_yearly", {}, df, compute)
 
-        # y軸範囲の設定（適宜調整する）
-        plt.ylim(0, 20000000)
 
-        # y軸の表示フォーマット指定
-        plt.ticklabel_format(style="plain", axis="y")
+def draw_sales_by_store_yearly(store_id, total_sales_by_store):
+    # グラフのプロット
+    fig = plt.figure(figsize=(12, 8))
+    ax = sns.lineplot(
+        x="曜日",
+        y="売上",
+        hue="年",
+        data=total_sales_by_store,
+        label=f"店舗ID {store_id}",
+        dashes=False,
+    )
 
-        # グリッド表示
-        plt.grid()
+    # グラフの設定
+    title = f"店舗ID {store_id} - 年ごとの曜日ごとの売り上げ合計推移"
+    plt.title(title)
+    plt.xlabel("曜日")
+    plt.ylabel("売り上げ")
+    plt.legend(title="年", loc="upper left", bbox_to_anchor=(1, 1))
 
-        # グラフの表示
-        plt.show()
+    # y軸範囲の設定（適宜調整する）
+    plt.ylim(0, 20000000)
+
+    # y軸の表示フォーマット指定
+    plt.ticklabel_format(style="plain", axis="y")
 
+    # グリッド表示
+    plt.grid()
+    return fig
 
-def plot_quantity_by_category_foreach_and_store(df, store_id, agg_period="D"):
+
+def plot_sales_by_store_yearly(df, workers=None):
     """
-    指定した店舗IDの各商品カテゴリごとに、売上個数の時系列データをグラフに描画します。
+    年ごとに店舗IDごとの曜日ごとの売り上げ合計を可視化する関数。
 
     Parameters:
-    - df (pd.DataFrame): 入力データフレーム
-    - store_id (int): 対象の店舗ID
-    - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
+    - df (pd.DataFrame, SalesCube, or str): 時系列データが格納されたDataFrame、日次集計キューブ、またはParquetデータセットのパス。
+    - workers (int): 店舗で分割して集計するワーカープロセス数、None の場合はこのプロセスで集計する
 
     Returns:
-    None
+    None (グラフが表示されるのみ)
     """
+    sales_by_weekday = aggregate_sales_by_store_yearly(df, workers=workers)
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
-
-    # 指定した店舗IDのデータを抽出
-    store_data = df[df["店舗ID"] == store_id]
-
-    # 商品カテゴリごとにグラフを描画するためのデータをまとめる
-    plot_data = []
-
-    for category in store_data["商品カテゴリ"].unique():
-        category_data = store_data[store_data["商品カテゴリ"] == category]
-        pivot_table = pd.pivot_table(
-            category_data,
-            values="売上個数",
-            index=pd.Grouper(key="日付", freq=agg_period),
-            aggfunc="sum",
+    # 年ごとにプロット
+    for store_id, total_sales_by_store in split_by(sales_by_weekday, ["店舗ID"]):
+        # グラフの表示
+        cache.show_figure(
+            "draw_sales_by_store_yearly",
+            {"store_id": store_id},
+            total_sales_by_store,
+            lambda: draw_sales_by_store_yearly(store_id, total_sales_by_store),
         )
-        plot_data.append((category, pivot_table))
 
+
+def draw_quantity_by_category_foreach_and_store(store_id, plot_data, agg_period="D"):
     # グラフのプロット
-    plt.figure(figsize=(12, 8))
+    fig = plt.figure(figsize=(12, 8))
 
     # y軸の範囲を設定
     if agg_period == "D":
@@ -277,7 +399,6 @@ def plot_quantity_by_category_foreach_and_store(df, store_id, agg_period="D"):
             data=data["売上個数"], label=f"商品カテゴリ: {category}", dashes=False
         )
 
-<<<<<<< HEAD
     # グラフの設定
     plt.title(f"店舗ID {store_id} - 商品カテゴリ別売上個数 ({agg_period})")
     plt.xlabel("日付")
@@ -292,58 +413,36 @@ def plot_quantity_by_category_foreach_and_store(df, store_id, agg_period="D"):
     plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
     plt.grid()
 
-    plt.show()
-=======
-        # y軸の範囲を設定（指定の値を採用）
-        plt.ylim(0, 15000)
-        plt.ticklabel_format(style="plain", axis="y")
->>>>>>> c0ea71ed6f6de5ef33586cca41a96e2aa0a38670
+    return fig
 
 
-def plot_sales_by_category_and_store_by_weekday(df, store_id, agg_period="D"):
+def plot_quantity_by_category_foreach_and_store(df, store_id, agg_period="D"):
     """
-    指定した店舗IDの各商品カテゴリごとに、曜日ごとの売上の時系列データをグラフに描画します。
+    指定した店舗IDの各商品カテゴリごとに、売上個数の時系列データをグラフに描画します。
 
     Parameters:
-    - df (pd.DataFrame): 入力データフレーム
+    - df (pd.DataFrame, SalesCube, or str): 入力データフレーム、日次集計キューブ、またはParquetデータセットのパス
     - store_id (int): 対象の店舗ID
     - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
 
     Returns:
     None
     """
+    # 指定した店舗IDの商品カテゴリごとの時系列を1回の集計でまとめる
+    plot_data = aggregate_category_series(df, store_id, agg_period=agg_period, value="売上個数")
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # グラフのプロット（キャッシュが有効で描画済みの場合は保存した画像を表示）
+    cache.show_figure(
+        "draw_quantity_by_category_foreach_and_store",
+        {"store_id": store_id, "agg_period": agg_period},
+        plot_data,
+        lambda: draw_quantity_by_category_foreach_and_store(store_id, plot_data, agg_period=agg_period),
+    )
 
-    # 指定した店舗IDのデータを抽出
-    store_data = df[df["店舗ID"] == store_id]
-
-    # 商品カテゴリごとにグラフを描画するためのデータをまとめる
-    plot_data = []
-
-    for category in store_data["商品カテゴリ"].unique():
-        category_data = store_data[store_data["商品カテゴリ"] == category]
-        pivot_table = pd.pivot_table(
-            category_data,
-            values="売上",
-            index=category_data["日付"].dt.day_name(),
-            aggfunc="sum",
-        ).reindex(
-            [
-                "Monday",
-                "Tuesday",
-                "Wednesday",
-                "Thursday",
-                "Friday",
-                "Saturday",
-                "Sunday",
-            ]
-        )
-        plot_data.append((category, pivot_table))
 
+def draw_sales_by_category_and_store_by_weekday(store_id, plot_data, agg_period="D"):
     # グラフのプロット
-    plt.figure(figsize=(12, 8))
+    fig = plt.figure(figsize=(12, 8))
 
     # 曜日ごとに適した y_limit を設定
     if agg_period == "D":
@@ -378,7 +477,6 @@ def plot_sales_by_category_and_store_by_weekday(df, store_id, agg_period="D"):
     plt.ylabel("売上")
     plt.legend(title="商品カテゴリ", loc="upper left", bbox_to_anchor=(1, 1))
 
-<<<<<<< HEAD
     # y軸の範囲を揃える
     min_y = min(y_limits)
     max_y = max(y_limits)
@@ -389,58 +487,36 @@ def plot_sales_by_category_and_store_by_weekday(df, store_id, agg_period="D"):
     plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
     plt.grid()
 
-    plt.show()
-=======
-        # y軸の範囲を設定（指定の値を採用）
-        plt.ylim(0, 30000000)
-        plt.ticklabel_format(style="plain", axis="y")
->>>>>>> c0ea71ed6f6de5ef33586cca41a96e2aa0a38670
+    return fig
 
 
-def plot_quantity_by_category_and_store_by_weekday(df, store_id, agg_period="D"):
+def plot_sales_by_category_and_store_by_weekday(df, store_id, agg_period="D"):
     """
-    指定した店舗IDの各商品カテゴリごとに、曜日ごとの売上個数の時系列データをグラフに描画します。
+    指定した店舗IDの各商品カテゴリごとに、曜日ごとの売上の時系列データをグラフに描画します。
 
     Parameters:
-    - df (pd.DataFrame): 入力データフレーム
+    - df (pd.DataFrame, SalesCube, or str): 入力データフレーム、日次集計キューブ、またはParquetデータセットのパス
     - store_id (int): 対象の店舗ID
     - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
 
     Returns:
     None
     """
+    # 商品カテゴリごとにグラフを描画するためのデータをまとめる
+    plot_data = aggregate_category_weekday(df, store_id, value="売上")
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # グラフのプロット（キャッシュが有効で描画済みの場合は保存した画像を表示）
+    cache.show_figure(
+        "draw_sales_by_category_and_store_by_weekday",
+        {"store_id": store_id, "agg_period": agg_period},
+        plot_data,
+        lambda: draw_sales_by_category_and_store_by_weekday(store_id, plot_data, agg_period=agg_period),
+    )
 
-    # 指定した店舗IDのデータを抽出
-    store_data = df[df["店舗ID"] == store_id]
-
-    # 商品カテゴリごとにグラフを描画するためのデータをまとめる
-    plot_data = []
-
-    for category in store_data["商品カテゴリ"].unique():
-        category_data = store_data[store_data["商品カテゴリ"] == category]
-        pivot_table = pd.pivot_table(
-            category_data,
-            values="売上個数",
-            index=category_data["日付"].dt.day_name(),
-            aggfunc="sum",
-        ).reindex(
-            [
-                "Monday",
-                "Tuesday",
-                "Wednesday",
-                "Thursday",
-                "Friday",
-                "Saturday",
-                "Sunday",
-            ]
-        )
-        plot_data.append((category, pivot_table))
 
+def draw_quantity_by_category_and_store_by_weekday(store_id, plot_data, agg_period="D"):
     # グラフのプロット
-    plt.figure(figsize=(12, 8))
+    fig = plt.figure(figsize=(12, 8))
 
     # 曜日ごとに適した y_limit を設定
     if agg_period == "D":
@@ -487,88 +563,177 @@ def plot_quantity_by_category_and_store_by_weekday(df, store_id, agg_period="D")
     plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
     plt.grid()
 
-    plt.show()
+    return fig
 
 
-def plot_detrended_sales_by_store(df, unit="day", window_size=7, moving_average_type="simple"):
+def plot_quantity_by_category_and_store_by_weekday(df, store_id, agg_period="D"):
+    """
+    指定した店舗IDの各商品カテゴリごとに、曜日ごとの売上個数の時系列データをグラフに描画します。
+
+    Parameters:
+    - df (pd.DataFrame, SalesCube, or str): 入力データフレーム、日次集計キューブ、またはParquetデータセットのパス
+    - store_id (int): 対象の店舗ID
+    - agg_period (str): 集計期間の指定 ('D': 日ごと, 'W': 週ごと, 'M': 月ごと)、デフォルトは 'D'
+
+    Returns:
+    None
+    """
+    # 商品カテゴリごとにグラフを描画するためのデータをまとめる
+    plot_data = aggregate_category_weekday(df, store_id, value="売上個数")
+
+    # グラフのプロット（キャッシュが有効で描画済みの場合は保存した画像を表示）
+    cache.show_figure(
+        "draw_quantity_by_category_and_store_by_weekday",
+        {"store_id": store_id, "agg_period": agg_period},
+        plot_data,
+        lambda: draw_quantity_by_category_and_store_by_weekday(store_id, plot_data, agg_period=agg_period),
+    )
+
+
+def detrend_store_sales(total_sales_by_store, window_size=7, moving_average_type="simple"):
+    # 移動平均を計算して '移動平均' と '売上除去移動平均' の列を追加する（1店舗分のデータ）
+    return detrend.detrend_panel(
+        total_sales_by_store,
+        keys=["店舗ID"],
+        value="売上",
+        window_size=window_size,
+        moving_average_type=moving_average_type,
+    )
+
+
+def draw_detrended_sales_by_store(store_id, total_sales_by_store, unit="day"):
+    # 単位ごとのy軸範囲
+    y_limit = {
+        "day": 1000000,  # 日ごとのy軸範囲
+        "month": 10000000,  # 月ごとのy軸範囲
+        "year": 50000000,  # 年ごとのy軸範囲
+    }[unit]
+
+    # グラフのプロット
+    fig = plt.figure(figsize=(12, 8))
+    ax = sns.lineplot(
+        x="日付",
+        y="売上除去移動平均",
+        data=total_sales_by_store,
+        label=f"店舗ID {store_id}",
+        dashes=False,
+    )
+
+    # グラフの設定
+    title = f"店舗ID {store_id} - 移動平均を除去した売り上げ合計推移 ({unit}単位)"
+    plt.title(title)
+    plt.xlabel(unit.capitalize())
+    plt.ylabel("売り上げ")
+    plt.legend(title="店舗ID", loc="upper left", bbox_to_anchor=(1, 1))
+
+    if unit == "day":
+        ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y/%m/%d"))
+        plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
+    plt.ylim(-y_limit, y_limit)  # y軸範囲の設定
+    plt.ticklabel_format(style="plain", axis="y")
+    plt.grid()
+    return fig
+
+
+def plot_detrended_sales_by_store(df, unit="day", window_size=7, moving_average_type="simple", workers=None):
     """
     概要:
         指定された店舗ごとに、移動平均を除去した売上データの推移をプロットします。
 
     パラメータ:
-        - df (pd.DataFrame): 時系列データが格納されたDataFrame。列には '日付', '店舗ID', '売上' が含まれている必要があります。
+        - df (pd.DataFrame, SalesCube, or str): 時系列データが格納されたDataFrame、日次集計キューブ、またはParquetデータセットのパス。列には '日付', '店舗ID', '売上' が含まれている必要があります。
         - unit (str, optional): 'day', 'month', 'year' のいずれか。データを集計する単位を指定します。デフォルトは 'day' です。
-        - window_size (int, optional): 移動平均の窓サイズ。デフォルトは 7 です。
-        - moving_average_type (str, optional): 使用する移動平均の種類。'simple'（単純移動平均）、'exponential'（指数移動平均）、'weighted'（加重移動平均）のいずれかを指定します。デフォルトは 'simple' です。
+        - window_size (int, optional): 移動平均の窓サイズ（'stl' の場合は季節の周期）。デフォルトは 7 です。
+        - moving_average_type (str, optional): 使用する移動平均の種類。'simple'（単純移動平均）、'exponential'（指数移動平均）、'weighted'（加重移動平均）、'stl'（STL分解のトレンド）のいずれかを指定します。デフォルトは 'simple' です。
+        - workers (int, optional): 店舗で分割して集計・移動平均の除去を行うワーカープロセス数。None の場合はこのプロセスで計算します。
 
     戻り値:
         なし。プロットが表示されます。
     """
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
-
-    # 単位ごとにデータを集計
-    if unit == "day":
-        grouper = pd.Grouper(key="日付", freq="D")
-        y_limit = 1000000  # 日ごとのy軸範囲
-    elif unit == "month":
-        grouper = pd.Grouper(key="日付", freq="M")
-        y_limit = 10000000  # 月ごとのy軸範囲
-    elif unit == "year":
-        grouper = pd.Grouper(key="日付", freq="Y")
-        y_limit = 50000000  # 年ごとのy軸範囲
+    if workers is not None:
+        # 店舗で分割して、集計と移動平均の除去をプロセスプールで並列に計算
+        detrended = parallel.detrended_sales(
+            df, unit=unit, window_size=window_size, moving_average_type=moving_average_type, workers=workers
+        )
     else:
-        raise ValueError("Invalid unit. Use 'day', 'month', or 'year'.")
+        # 単位ごとにデータを集計
+        sales_by_store = aggregate_total_sales_by_store(df, unit=unit)
+
+        # 全店舗の移動平均を店舗 × 日付の行列でまとめて計算
+        detrended = detrend.detrend_panel(
+            sales_by_store,
+            keys=["店舗ID"],
+            value="売上",
+            window_size=window_size,
+            moving_average_type=moving_average_type,
+        )
 
     # 店舗IDごとにプロット
-    unique_stores = df["店舗ID"].unique()
-    for store_id in unique_stores:
-        store_data = df[df["店舗ID"] == store_id]
-        total_sales_by_store = (
-            store_data.groupby(["店舗ID", grouper])["売上"].sum().reset_index()
+    for store_id, total_sales_by_store in split_by(detrended, ["店舗ID"]):
+        cache.show_figure(
+            "draw_detrended_sales_by_store",
+            {"store_id": store_id, "unit": unit},
+            total_sales_by_store,
+            lambda: draw_detrended_sales_by_store(store_id, total_sales_by_store, unit=unit),
         )
 
-        # 移動平均の計算
-        if moving_average_type == "simple":
-            total_sales_by_store["移動平均"] = total_sales_by_store["売上"].rolling(window=window_size).mean()
-        elif moving_average_type == "exponential":
-            total_sales_by_store["移動平均"] = total_sales_by_store["売上"].ewm(span=window_size, adjust=False).mean()
-        elif moving_average_type == "weighted":
-            weights = np.arange(1, window_size + 1)
-            total_sales_by_store["移動平均"] = total_sales_by_store["売上"].rolling(window=window_size).apply(lambda x: np.average(x, weights=weights))
-        else:
-            raise ValueError("Invalid moving_average_type. Use 'simple', 'exponential', or 'weighted'.")
-
-        # 移動平均を除去
-        total_sales_by_store["売上除去移動平均"] = total_sales_by_store["売上"] - total_sales_by_store["移動平均"]
-
-        # グラフのプロット
-        plt.figure(figsize=(12, 8))
-        ax = sns.lineplot(
-            x="日付",
-            y="売上除去移動平均",
-            data=total_sales_by_store,
-            label=f"店舗ID {store_id}",
-            dashes=False,
-        )
 
-        # グラフの設定
-        title = f"店舗ID {store_id} - 移動平均を除去した売り上げ合計推移 ({unit}単位)"
-        plt.title(title)
-        plt.xlabel(unit.capitalize())
-        plt.ylabel("売り上げ")
-        plt.legend(title="店舗ID", loc="upper left", bbox_to_anchor=(1, 1))
-
-<<<<<<< HEAD
-        if unit == "day":
-            ax.xaxis.set_major_locator(mdates.MonthLocator(interval=1))
-            ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y/%m/%d"))
-            plt.xticks(rotation=45, ha="right")  # 45度傾けて表示
-        plt.ylim(-y_limit, y_limit)  # y軸範囲の設定
-=======
-        # y軸の範囲を設定（指定の値を採用）
-        plt.ylim(0, 15000)
->>>>>>> c0ea71ed6f6de5ef33586cca41a96e2aa0a38670
-        plt.ticklabel_format(style="plain", axis="y")
-        plt.grid()
-        plt.show()
\ No newline at end of file
+def aggregate_growth_clusters(df, by="店舗ID", frequency="week", n_clusters=3, features=("平均増加率",)):
+    from . import clustering, growth
+
+    def compute():
+        # 週・月ごとに集計した売上の前期比増加率を要約し、その特徴量でクラスタリングする
+        growth_features = growth.growth_features(df, by=[by], frequency=frequency)[list(features)]
+        model = clustering.ClusterModel(n_clusters=n_clusters, column="クラスタ")
+        model.fit(growth_features)
+        return growth_features.join(model.assignments).reset_index()
+
+    return cache.cached(
+        "aggregate_growth_clusters",
+        {"by": by, "frequency": frequency, "n_clusters": n_clusters, "features": list(features)},
+        df,
+        compute,
+    )
+
+
+def draw_growth_clusters(cluster_df, by="店舗ID", frequency="week"):
+    # 散布図を描画（sns.set や sns.axes_style はフォントを上書きして日本語が表示されなくなるので、グリッドだけを付ける）
+    fig = plt.figure(figsize=(10, 6))
+    ax = sns.scatterplot(data=cluster_df, x=by, y="平均増加率", hue="クラスタ", palette="Set1", s=100)
+    ax.grid(True)
+
+    plt.title(f"clusterling_by_({frequency})")
+    plt.xlabel(by)
+    plt.ylabel("売上増加率")
+    plt.legend(title="クラスタ", loc="upper right")
+
+    # 店舗IDの場合はx軸に全ての店舗IDを表示
+    if pd.api.types.is_numeric_dtype(cluster_df[by]):
+        plt.xticks(cluster_df[by].unique())
+    return fig
+
+
+def calculate_and_plot_clusters(df, by="店舗ID", frequency="week", n_clusters=3):
+    """
+    概要:
+        店舗（または商品カテゴリ）ごとに、週・月ごとに集計した売上の前期比増加率の平均でクラスタリングし、散布図を表示します。
+        増加率は growth.growth_rates と同じく本当の週・月の合計から計算します（前期の売上が 0 の期間は除く）。
+
+    パラメータ:
+        - df (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス。
+        - by (str, optional): クラスタリングする単位。'店舗ID' または '商品カテゴリ'。デフォルトは '店舗ID' です。
+        - frequency (str, optional): 'week', 'month', 'quarter' のいずれか。デフォルトは 'week' です。
+        - n_clusters (int, optional): クラスタ数。デフォルトは 3 です。
+
+    戻り値:
+        pd.DataFrame: by ごとの '平均増加率' と 'クラスタ'。プロットが表示されます。
+    """
+    cluster_df = aggregate_growth_clusters(df, by=by, frequency=frequency, n_clusters=n_clusters)
+    cache.show_figure(
+        "draw_growth_clusters",
+        {"by": by, "frequency": frequency},
+        cluster_df,
+        lambda: draw_growth_clusters(cluster_df, by=by, frequency=frequency),
+    )
+    return cluster_df
@@ -1,17 +1,14 @@
-import japanize_matplotlib
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
 import pandas as pd
-import seaborn as sns
-import statsmodels.api as sm
 import numpy as np
 
-japanize_matplotlib.japanize()
+from . import schema
+from .backends import mdates, plt, sns
+from .prepared import prepare
 
 
 def plot_total_sales_by_store(df, unit="day", separate_plots=True):
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 単位ごとにデータを集計
     if unit == "day":
@@ -74,8 +71,8 @@ def plot_total_sales_by_store(df, unit="day", separate_plots=True):
 
 
 def plot_sales_by_store_category(df, unit="day", separate_plots=True):
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 単位ごとにデータを集計
     if unit == "day":
@@ -99,10 +96,12 @@ def plot_sales_by_store_category(df, unit="day", separate_plots=True):
     for store_id in unique_stores:
         store_data = df[df["店舗ID"] == store_id]
         sales_by_store_category = (
-            store_data.groupby(["店舗ID", "商品カテゴリ名", grouper])["売上"]
+            store_data.groupby(["店舗ID", "商品カテゴリ名", grouper], observed=True)["売上"]
             .sum()
             .reset_index()
         )
+        # 店舗に存在しないカテゴリが凡例に出ないようにする
+        sales_by_store_category = schema.remove_unused_categories(sales_by_store_category)
 
         # グラフのプロット
         if separate_plots:
@@ -152,8 +151,8 @@ def plot_sales_by_category_foreach_and_store(df, store_id, agg_period="D"):
     None
     """
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 指定した店舗IDのデータを抽出
     store_data = df[df["店舗ID"] == store_id]
@@ -206,8 +205,8 @@ def plot_sales_by_store_yearly(df):
     None (グラフが表示されるのみ)
     """
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 年ごとにプロット
     unique_stores = df["店舗ID"].unique()
@@ -217,7 +216,7 @@ def plot_sales_by_store_yearly(df):
 
         # 年ごとに曜日ごとの売上を合計
         total_sales_by_store = (
-            store_data.groupby(["店舗ID", store_data["日付"].dt.year, "曜日"])["売上"].sum().reset_index()
+            store_data.groupby(["店舗ID", store_data["日付"].dt.year, "曜日"], observed=True)["売上"].sum().reset_index()
         )
 
         # グラフのプロット
@@ -264,8 +263,8 @@ def plot_quantity_by_category_foreach_and_store(df, store_id, agg_period="D"):
     None
     """
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 指定した店舗IDのデータを抽出
     store_data = df[df["店舗ID"] == store_id]
@@ -331,8 +330,8 @@ def plot_sales_by_category_and_store_by_weekday(df, store_id, agg_period="D"):
     None
     """
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 指定した店舗IDのデータを抽出
     store_data = df[df["店舗ID"] == store_id]
@@ -422,8 +421,8 @@ def plot_quantity_by_category_and_store_by_weekday(df, store_id, agg_period="D")
     None
     """
 
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 指定した店舗IDのデータを抽出
     store_data = df[df["店舗ID"] == store_id]
@@ -516,8 +515,8 @@ def plot_detrended_sales_by_store(df, unit="day", window_size=7, moving_average_
     戻り値:
         なし。プロットが表示されます。
     """
-    # 日付列をdatetime型に変換
-    df["日付"] = pd.to_datetime(df["日付"])
+    # 日付列をdatetime型に変換（準備済みデータはそのまま使い、入力は変更しない）
+    df = prepare(df)
 
     # 単位ごとにデータを集計
     if unit == "day":
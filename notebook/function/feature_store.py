@@ -0,0 +1,339 @@
+"""
+(店舗ID, 商品ID, 日付) ごとのラグ・移動平均・移動標準偏差・前回販売からの日数・日付の特徴量。
+
+groupby().shift() / rolling() をキーごとに実行する代わりに、(店舗ID, 商品ID, 日数) を1つの int64 のキーにまとめて並べ替え、
+全ての行の特徴量を searchsorted と累積和で1回の走査でまとめて計算します。
+キーの上位のビットが (店舗ID, 商品ID) なので、窓が別の (店舗ID, 商品ID) の行にまたがることはありません。
+
+行は売上のある日（日次集計キューブの行）だけですが、ラグと窓は日数で数え、売上のない日は 0 として扱います。
+どの特徴量もその日より前の値だけを使うので、新しい日付の行を追加しても過去の行の特徴量は変わりません。
+特徴量は 年/月/店舗ID で分割したParquetデータセットに保存し、新しい日付の分だけ追記します:
+    store = feature_store.FeatureStore('../processing_data/features')
+    store.build('../processing_data/merged')
+    store.update(new_rows)
+    features = store.load(years=[2019])
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from . import jp_holidays, schema
+from .cube import as_cube
+
+DEFAULT_VALUE = "売上個数"
+DEFAULT_LAGS = [1, 7, 14, 28]
+DEFAULT_WINDOWS = [7, 28]
+
+# キーのビット数: 日数（1970-01-01 からの日数）と商品ID
+DAY_BITS = 20
+ITEM_BITS = 22
+
+CONFIG_FILE = "feature_store.json"
+LAST_SALE_FILE = "last_sale.parquet"
+DATASET_DIR = "data"
+
+STORE_VERSION = 1
+
+
+def row_keys(store_ids, item_ids, dates):
+    """
+    (店舗ID, 商品ID, 日付) を並べ替え可能な1つの int64 のキーにします。
+
+    Returns:
+    (np.ndarray, np.ndarray): キーと日数（1970-01-01 からの日数）
+    """
+    items = np.asarray(item_ids).astype(np.int64)
+    if len(items) and (items.min() < 0 or items.max() >= 1 << ITEM_BITS):
+        raise ValueError(f"商品ID must be in [0, {1 << ITEM_BITS})")
+    days = pd.DatetimeIndex(dates).to_numpy().astype("datetime64[D]").astype(np.int64)
+    segments = (np.asarray(store_ids).astype(np.int64) << ITEM_BITS) | items
+    return (segments << DAY_BITS) | days, days
+
+
+def lag_values(keys, values, query_keys, lag):
+    """
+    各クエリの lag 日前の値（行がない日は 0）を返します。keys は昇順であること。
+    """
+    target = query_keys - lag
+    position = np.minimum(np.searchsorted(keys, target), len(keys) - 1)
+    found = keys[position] == target
+    return np.where(found, values[position], 0.0)
+
+
+def window_sums(keys, cumulative, query_keys, window):
+    """
+    各クエリの [日 - window, 日) の合計と行数を、累積和の差で返します。
+    cumulative は values の累積和の先頭に 0 を加えたもの（長さ len(keys) + 1）。
+    """
+    low = np.searchsorted(keys, query_keys - window)
+    high = np.searchsorted(keys, query_keys)
+    return cumulative[high] - cumulative[low], high - low
+
+
+def days_since_previous(keys, query_keys):
+    """
+    同じ (店舗ID, 商品ID) の、クエリの日より前で最後に行がある日からの日数を返します（ない場合は NaN）。
+    """
+    position = np.searchsorted(keys, query_keys) - 1
+    previous = keys[np.maximum(position, 0)]
+    same = (position >= 0) & ((previous >> DAY_BITS) == (query_keys >> DAY_BITS))
+    return np.where(same, (query_keys - previous).astype(np.float64), np.nan)
+
+
+def compute_features(keys, values, query_keys, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+    """
+    並べ替え済みの履歴（keys, values）から、クエリのキーごとの特徴量を計算します。
+    クエリは履歴の行そのものでも、履歴にない日（予測する日など）でもかまいません。
+
+    Parameters:
+    - keys (np.ndarray): row_keys のキー（昇順）
+    - values (np.ndarray): 各キーの値
+    - query_keys (np.ndarray): 特徴量を計算するキー
+    - lags (list): ラグの日数
+    - windows (list): 移動平均・移動標準偏差の窓の日数
+
+    Returns:
+    pd.DataFrame: クエリと同じ順の特徴量
+    """
+    values = np.asarray(values, dtype=np.float64)
+    features = {}
+    if len(keys) == 0:
+        keys = np.zeros(1, dtype=np.int64) - 1
+        values = np.zeros(1)
+    for lag in lags:
+        features[f"ラグ{lag}"] = lag_values(keys, values, query_keys, lag)
+
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    cumulative_squares = np.concatenate([[0.0], np.cumsum(values**2)])
+    for window in windows:
+        total, count = window_sums(keys, cumulative, query_keys, window)
+        squares, _ = window_sums(keys, cumulative_squares, query_keys, window)
+        mean = total / window
+        features[f"移動平均{window}"] = mean
+        # 売上のない日（0）も含めた window 日の標準偏差（累積和の差の誤差で負にならないようにする）
+        features[f"移動標準偏差{window}"] = np.sqrt(np.maximum(squares / window - mean**2, 0.0))
+        features[f"販売日数{window}"] = count.astype(np.int16)
+    features["前回販売からの日数"] = days_since_previous(keys, query_keys)
+    return pd.DataFrame(features)
+
+
+def calendar_features(dates):
+    """
+    日付ごとの 曜日番号（0 が月曜日）・日・祝日 の列を、ユニークな日付ごとに計算して行へ展開します。
+    """
+    codes, unique_dates = pd.factorize(pd.DatetimeIndex(dates))
+    unique_dates = pd.DatetimeIndex(unique_dates)
+    return pd.DataFrame(
+        {
+            "曜日番号": unique_dates.dayofweek.to_numpy().astype(np.int8)[codes],
+            "日": unique_dates.day.to_numpy().astype(np.int8)[codes],
+            "祝日": jp_holidays.is_holiday(unique_dates).astype(np.int8)[codes],
+        }
+    )
+
+
+class FeatureStore:
+    """
+    (店舗ID, 商品ID, 日付) ごとの特徴量を保存するParquetデータセット。
+
+    Parameters:
+    - directory (str): 保存先のディレクトリ
+    - value (str): 特徴量を作る値の列（'売上個数' または '売上'）、既存のストアでは保存した設定を使う
+    - lags (list): ラグの日数
+    - windows (list): 移動平均・移動標準偏差の窓の日数
+    """
+
+    def __init__(self, directory, value=DEFAULT_VALUE, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+        self.directory = directory
+        config_path = os.path.join(directory, CONFIG_FILE)
+        if os.path.exists(config_path):
+            with open(config_path, encoding="utf-8") as f:
+                config = json.load(f)
+            if config.get("version") != STORE_VERSION:
+                raise ValueError(f"unsupported feature store version: {config.get('version')}")
+            value, lags, windows = config["value"], config["lags"], config["windows"]
+        self.value = value
+        self.lags = list(lags)
+        self.windows = list(windows)
+
+    @property
+    def dataset_dir(self):
+        return os.path.join(self.directory, DATASET_DIR)
+
+    @property
+    def lookback(self):
+        # 新しい日付の特徴量に必要な過去の日数
+        return max(self.lags + self.windows)
+
+    def exists(self):
+        return os.path.isdir(self.dataset_dir)
+
+    def _daily(self, source):
+        # 日次集計キューブの行（売上のある (店舗ID, 商品ID, 日付)）
+        frame = as_cube(source).frame
+        columns = ["店舗ID", "商品ID", "日付", "商品カテゴリ", "売上", "売上個数"]
+        columns = [column for column in columns if column in frame.columns]
+        if self.value not in columns:
+            raise ValueError(f"{self.value} is not in the data")
+        return frame[columns]
+
+    def _features(self, history, rows):
+        # history（既存の行と新しい行）の並べ替え済みの配列から、rows の特徴量を計算する
+        keys, _ = row_keys(history["店舗ID"], history["商品ID"], history["日付"])
+        order = np.argsort(keys, kind="stable")
+        query_keys, _ = row_keys(rows["店舗ID"], rows["商品ID"], rows["日付"])
+        features = compute_features(
+            keys[order],
+            history[self.value].to_numpy()[order],
+            query_keys,
+            lags=self.lags,
+            windows=self.windows,
+        )
+        rows = rows.reset_index(drop=True)
+        dates = pd.DatetimeIndex(rows["日付"])
+        result = pd.concat([rows, features, calendar_features(dates)], axis=1)
+        result["年"] = dates.year
+        result["月"] = dates.month
+        return result
+
+    def _write(self, features, basename_template):
+        from . import create_data
+
+        create_data._write_partitions(
+            features,
+            self.dataset_dir,
+            existing_data_behavior="overwrite_or_ignore",
+            basename_template=basename_template,
+        )
+
+    def _save_last_sale(self, rows):
+        # (店舗ID, 商品ID) ごとの最後に売上のあった日（窓より前の販売からの日数の計算に使う）
+        path = os.path.join(self.directory, LAST_SALE_FILE)
+        last = rows[["店舗ID", "商品ID", "日付"]]
+        if os.path.exists(path):
+            last = pd.concat([pd.read_parquet(path), last], ignore_index=True)
+        last = last.groupby(["店舗ID", "商品ID"], sort=True)["日付"].max().reset_index()
+        last.to_parquet(path, index=False)
+
+    def build(self, source):
+        """
+        全履歴から特徴量を作り直して保存します（既存の内容は削除する）。
+
+        Parameters:
+        - source (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+
+        Returns:
+        int: 保存した行数
+        """
+        rows = self._daily(source)
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        os.makedirs(self.directory)
+        with open(os.path.join(self.directory, CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": STORE_VERSION, "value": self.value, "lags": self.lags, "windows": self.windows},
+                f,
+                ensure_ascii=False,
+            )
+
+        features = self._features(rows, rows)
+        self._write(features, "build-{i}.parquet")
+        self._save_last_sale(rows)
+        return len(features)
+
+    def latest_date(self):
+        """
+        保存されている最後の日付を返します（空の場合は None）。
+        """
+        path = os.path.join(self.directory, LAST_SALE_FILE)
+        if not os.path.exists(path):
+            return None
+        last = pd.read_parquet(path, columns=["日付"])
+        return last["日付"].max() if len(last) else None
+
+    def update(self, source):
+        """
+        保存されている最後の日付より後の行の特徴量を計算して追記します。
+        窓に必要な直近 lookback 日分だけを保存済みのデータから読み込むので、全履歴は読み直しません。
+        最後の日付以前の行は（既に保存されているものとして）無視します。ストアがない場合は build と同じです。
+
+        Parameters:
+        - source (pd.DataFrame, SalesCube, or str): 新しい行（結合済みデータ、日次集計キューブ、またはデータセットのパス）
+
+        Returns:
+        int: 追記した行数
+        """
+        if not self.exists():
+            return self.build(source)
+
+        latest = self.latest_date()
+        rows = self._daily(source)
+        if latest is not None:
+            rows = rows[rows["日付"] > latest]
+        if rows.empty:
+            return 0
+
+        start = rows["日付"].min() - pd.Timedelta(days=self.lookback)
+        recent = self.load(columns=list(rows.columns), start=start)
+        history = pd.concat([recent, rows], ignore_index=True)
+        features = self._features(history, rows)
+
+        # 窓より前に最後の販売がある (店舗ID, 商品ID) の日数は、保存した最後の販売日から求める
+        last = pd.read_parquet(os.path.join(self.directory, LAST_SALE_FILE))
+        missing = features["前回販売からの日数"].isna().to_numpy()
+        if missing.any():
+            last_keys, _ = row_keys(last["店舗ID"], last["商品ID"], last["日付"])
+            query_keys, _ = row_keys(
+                features.loc[missing, "店舗ID"], features.loc[missing, "商品ID"], features.loc[missing, "日付"]
+            )
+            order = np.argsort(last_keys)
+            features.loc[missing, "前回販売からの日数"] = days_since_previous(last_keys[order], query_keys)
+
+        first_date = int(rows["日付"].min().strftime("%Y%m%d"))
+        self._write(features, f"update-{first_date}-{{i}}.parquet")
+        self._save_last_sale(rows)
+        return len(features)
+
+    def load(self, columns=None, years=None, months=None, store_ids=None, start=None, end=None):
+        """
+        保存した特徴量を読み込みます（年/月/店舗ID の指定は該当しないパーティションを読み飛ばす）。
+
+        Parameters:
+        - columns (list): 読み込む列、None の場合は全列
+        - years (list): 対象の年、None の場合は全て
+        - months (list): 対象の月、None の場合は全て
+        - store_ids (list): 対象の店舗ID、None の場合は全て
+        - start (pd.Timestamp): この日付以降の行だけを読み込む
+        - end (pd.Timestamp): この日付以前の行だけを読み込む
+
+        Returns:
+        pd.DataFrame: (店舗ID, 商品ID, 日付) の順に並べたデータフレーム
+        """
+        import pyarrow.dataset as ds
+
+        from . import create_data
+
+        dataset = create_data.open_merged_dataset(self.dataset_dir)
+        expression = create_data.build_filter(years=years, months=months, store_ids=store_ids)
+        # 日付の範囲は 年 のパーティションでも絞り込む
+        for condition in (
+            None if start is None else (ds.field("年") >= pd.Timestamp(start).year) & (ds.field("日付") >= pd.Timestamp(start)),
+            None if end is None else (ds.field("年") <= pd.Timestamp(end).year) & (ds.field("日付") <= pd.Timestamp(end)),
+        ):
+            if condition is not None:
+                expression = condition if expression is None else expression & condition
+        df = dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+        # 分割キーの列は末尾に付くので、保存時の列順に戻す
+        pandas_metadata = dataset.schema.pandas_metadata or {}
+        column_order = [column["name"] for column in pandas_metadata.get("columns", [])]
+        column_order = [column for column in column_order if column in df.columns]
+        if len(column_order) == len(df.columns):
+            df = df[column_order]
+        sort_columns = [column for column in ["店舗ID", "商品ID", "日付"] if column in df.columns]
+        if sort_columns:
+            df = df.sort_values(sort_columns, kind="mergesort", ignore_index=True)
+        return schema.apply_schema(df)
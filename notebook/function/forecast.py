@@ -0,0 +1,358 @@
+"""
+全ての (店舗ID, 商品カテゴリ) の日次売上をまとめて学習する、1つの勾配ブースティングモデルによる予測。
+
+系列ごとにモデルを作る代わりに、系列 × 日付 の行列からラグ・移動平均・曜日などの特徴量を
+全系列まとめて（ベクトル演算で）作り、全系列の行を1つのモデルで学習します。
+予測は1日ずつ進め、各日は全系列の特徴量を1回の predict でまとめて計算します（再帰的予測）。
+学習と予測は LightGBM のスレッドで並列に実行されます:
+    model = forecast.GlobalForecaster().fit(df)
+    predictions = model.predict(horizon=28)
+"""
+import os
+import pickle
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from . import jp_holidays
+from .growth import period_matrix
+
+# 系列を分けるキー
+DEFAULT_KEYS = ["店舗ID", "商品カテゴリ"]
+
+# ラグ（何日前の値）と移動平均の窓（日数）
+DEFAULT_LAGS = [1, 2, 3, 7, 14, 28]
+DEFAULT_WINDOWS = [7, 28]
+
+# 同じ曜日の平均に使う週数
+SAME_WEEKDAY_WEEKS = 4
+
+DEFAULT_HORIZON = 28
+
+BACKENDS = ["lightgbm", "sklearn"]
+
+# calendar_features の特徴量
+CALENDAR_FEATURES = ["曜日", "日", "月", "年内の日", "祝日"]
+
+# HistGradientBoostingRegressor がカテゴリとして扱える値の数の上限
+MAX_SKLEARN_CATEGORIES = 255
+
+
+def make_regressor(backend="lightgbm", n_jobs=-1, random_state=0, params=None, categorical=None):
+    """
+    勾配ブースティングの回帰モデルを作ります。
+
+    Parameters:
+    - backend (str): 'lightgbm'（既定）または 'sklearn'（HistGradientBoostingRegressor）
+    - n_jobs (int): LightGBM のスレッド数、-1 の場合は全てのコア（sklearn は OpenMP のスレッドを使う）
+    - random_state (int): 乱数の種
+    - params (dict): モデルの設定の上書き
+    - categorical (np.ndarray): sklearn の場合にカテゴリとして扱う特徴量（bool の配列）
+
+    Returns:
+    回帰モデル（fit / predict を持つ）
+    """
+    params = dict(params or {})
+    if backend == "lightgbm":
+        import lightgbm
+
+        settings = {
+            "n_estimators": 400,
+            "learning_rate": 0.05,
+            "num_leaves": 63,
+            "subsample": 0.8,
+            "subsample_freq": 1,
+            "colsample_bytree": 0.8,
+            "n_jobs": n_jobs,
+            "random_state": random_state,
+            "verbose": -1,
+        }
+        settings.update(params)
+        return lightgbm.LGBMRegressor(**settings)
+    if backend == "sklearn":
+        from sklearn.ensemble import HistGradientBoostingRegressor
+
+        settings = {
+            "max_iter": 400,
+            "learning_rate": 0.05,
+            "max_leaf_nodes": 63,
+            "categorical_features": categorical,
+            "random_state": random_state,
+        }
+        settings.update(params)
+        return HistGradientBoostingRegressor(**settings)
+    raise ValueError(f"Invalid backend: {backend}. Use one of {BACKENDS}.")
+
+
+def lag_features(values, positions, lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+    """
+    系列 × 日付 の行列から、指定した位置（列）のラグ・移動平均・同じ曜日の平均を全系列まとめて計算します。
+    どの特徴量も位置より前の値だけを使います。
+
+    Parameters:
+    - values (np.ndarray): 系列 × 日付 の行列
+    - positions (array-like): 特徴量を計算する列の位置（max(lags), max(windows), 7 * SAME_WEEKDAY_WEEKS 以上）
+    - lags (list): ラグの日数
+    - windows (list): 移動平均の窓の日数
+
+    Returns:
+    (np.ndarray, list): (位置, 系列, 特徴量) の配列と特徴量の名前
+    """
+    positions = np.asarray(positions)
+    cumulative = np.concatenate([np.zeros((len(values), 1)), np.cumsum(values, axis=1)], axis=1)
+
+    columns = []
+    for lag in lags:
+        columns.append(values[:, positions - lag])
+    for window in windows:
+        # 累積和の差で [t - window, t) の平均を求める
+        columns.append((cumulative[:, positions] - cumulative[:, positions - window]) / window)
+    columns.append(np.mean([values[:, positions - 7 * k] for k in range(1, SAME_WEEKDAY_WEEKS + 1)], axis=0))
+    # (特徴量, 系列, 位置) → (位置, 系列, 特徴量)
+    return np.stack(columns).transpose(2, 1, 0), lag_feature_names(lags, windows)
+
+
+def lag_feature_names(lags=DEFAULT_LAGS, windows=DEFAULT_WINDOWS):
+    """
+    lag_features の特徴量の名前を返します。
+    """
+    return (
+        [f"ラグ{lag}" for lag in lags]
+        + [f"移動平均{window}" for window in windows]
+        + [f"同曜日平均{SAME_WEEKDAY_WEEKS}週"]
+    )
+
+
+def calendar_features(dates):
+    """
+    日付ごとの 曜日・日・月・年内の日・祝日 の特徴量を計算します。
+
+    Returns:
+    (np.ndarray, list): (日付, 特徴量) の配列と特徴量の名前
+    """
+    dates = pd.DatetimeIndex(dates)
+    features = np.column_stack(
+        [
+            dates.dayofweek,
+            dates.day,
+            dates.month,
+            dates.dayofyear,
+            jp_holidays.is_holiday(dates).astype(np.int8),
+        ]
+    ).astype(np.float64)
+    return features, list(CALENDAR_FEATURES)
+
+
+class GlobalForecaster:
+    """
+    全系列を1つのモデルで学習する日次売上の予測モデル。
+    売上は log1p で変換してから学習し、予測は expm1 で元の単位に戻します（0 未満は 0）。
+
+    Parameters:
+    - by (list): 系列を分けるキー、デフォルトは ['店舗ID', '商品カテゴリ']
+    - value (str): 予測する値の列、デフォルトは '売上'
+    - lags (list): ラグの日数
+    - windows (list): 移動平均の窓の日数
+    - backend (str): 'lightgbm'（既定）または 'sklearn'
+    - n_jobs (int): 学習・予測のスレッド数、-1 の場合は全てのコア
+    - random_state (int): 乱数の種
+    - params (dict): モデルの設定の上書き（make_regressor に渡す）
+    """
+
+    def __init__(
+        self,
+        by=DEFAULT_KEYS,
+        value="売上",
+        lags=DEFAULT_LAGS,
+        windows=DEFAULT_WINDOWS,
+        backend="lightgbm",
+        n_jobs=-1,
+        random_state=0,
+        params=None,
+    ):
+        self.by = list(by)
+        self.value = value
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.backend = backend
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.params = params
+        self.model = None
+        self.labels = None
+        self.history = None
+        self.dates = None
+
+    @property
+    def feature_names(self):
+        return list(self.by) + lag_feature_names(self.lags, self.windows) + list(CALENDAR_FEATURES)
+
+    @property
+    def min_history(self):
+        # 特徴量を計算できる最初の位置
+        return max(self.lags + self.windows + [7 * SAME_WEEKDAY_WEEKS])
+
+    def _series_codes(self):
+        # キーごとの系列の番号（カテゴリの特徴量）
+        return np.column_stack(
+            [pd.factorize(self.labels[key], sort=True)[0] for key in self.by]
+        ).astype(np.float64)
+
+    def _features(self, values, dates, positions):
+        lagged, _ = lag_features(values, positions, self.lags, self.windows)
+        calendar, _ = calendar_features(dates[positions])
+        n_positions, n_series, _ = lagged.shape
+        codes = self._series_codes()
+        features = np.concatenate(
+            [
+                np.broadcast_to(codes, (n_positions, n_series, codes.shape[1])),
+                lagged,
+                np.broadcast_to(calendar[:, None, :], (n_positions, n_series, calendar.shape[1])),
+            ],
+            axis=2,
+        )
+        return features.reshape(n_positions * n_series, -1)
+
+    def build_features(self, matrix, labels, dates):
+        """
+        系列 × 日付 の行列の、特徴量を計算できる全ての日（min_history 日目以降）の学習用の特徴量を計算します。
+        どの日の特徴量もその日より前の値だけを使うので、バックテストでは1回計算したものを
+        fit_matrix(features=...) で各分割の学習期間の分だけ使い回せます。
+
+        Returns:
+        np.ndarray: (日付, 系列) の順に並べた行 × 特徴量 の配列
+        """
+        self.labels = labels
+        positions = np.arange(self.min_history, len(dates))
+        return self._features(np.log1p(np.maximum(matrix, 0)), dates, positions)
+
+    def fit(self, df, end=None):
+        """
+        全系列の日次の値からモデルを学習します。
+
+        Parameters:
+        - df (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+        - end (str or pd.Timestamp): この日付までのデータで学習する（バックテスト用）、None の場合は全て
+
+        Returns:
+        GlobalForecaster: self
+        """
+        matrix, labels, dates = period_matrix(df, by=self.by, freq="D", value=self.value, complete_only=False)
+        return self.fit_matrix(matrix, labels, dates, end=end)
+
+    def fit_matrix(self, matrix, labels, dates, end=None, features=None):
+        """
+        系列 × 日付 の行列からモデルを学習します。
+
+        Parameters:
+        - matrix (np.ndarray): 系列 × 日付 の値（growth.period_matrix の戻り値）
+        - labels (pd.DataFrame): 各行のキー
+        - dates (pd.DatetimeIndex): 各列の日付（1日ずつ連続していること）
+        - end (str or pd.Timestamp): この日付までのデータで学習する、None の場合は全て
+        - features (np.ndarray): build_features で全期間について計算した特徴量（学習期間の分だけを使う）、
+          None の場合はここで計算する
+
+        Returns:
+        GlobalForecaster: self
+        """
+        if end is not None:
+            keep = np.asarray(dates <= pd.Timestamp(end))
+            matrix, dates = matrix[:, keep], dates[keep]
+        if len(dates) <= self.min_history:
+            raise ValueError(f"at least {self.min_history + 1} days of history are required")
+
+        self.labels = labels
+        self.dates = dates
+        self.history = np.log1p(np.maximum(matrix, 0))
+
+        positions = np.arange(self.min_history, len(dates))
+        if features is None:
+            features = self._features(self.history, dates, positions)
+        else:
+            features = features[: len(positions) * len(labels)]
+        target = self.history[:, positions].T.reshape(-1)
+
+        n_keys = len(self.by)
+        if self.backend == "sklearn":
+            categorical = np.zeros(features.shape[1], dtype=bool)
+            categorical[:n_keys] = [
+                labels[key].nunique() <= MAX_SKLEARN_CATEGORIES for key in self.by
+            ]
+            self.model = make_regressor(
+                "sklearn", random_state=self.random_state, params=self.params, categorical=categorical
+            )
+            self.model.fit(features, target)
+        else:
+            self.model = make_regressor(
+                self.backend, n_jobs=self.n_jobs, random_state=self.random_state, params=self.params
+            )
+            self.model.fit(features, target, categorical_feature=list(range(n_keys)))
+        return self
+
+    def predict(self, horizon=DEFAULT_HORIZON):
+        """
+        学習したデータの最後の日の翌日から horizon 日分を、1日ずつ全系列まとめて予測します。
+
+        Returns:
+        pd.DataFrame: by + ['日付', '予測'] の列を持つ縦持ちのデータ
+        """
+        if self.model is None:
+            raise ValueError("the model is not fitted")
+
+        n_series, n_dates = self.history.shape
+        values = np.concatenate([self.history, np.zeros((n_series, horizon))], axis=1)
+        dates = self.dates.append(pd.date_range(self.dates[-1] + pd.Timedelta(days=1), periods=horizon))
+        for t in range(n_dates, n_dates + horizon):
+            values[:, t] = np.maximum(self.model.predict(self._features(values, dates, [t])), 0)
+
+        forecast = np.expm1(values[:, n_dates:])
+        result = self.labels.iloc[np.repeat(np.arange(n_series), horizon)].reset_index(drop=True)
+        result["日付"] = np.tile(dates[n_dates:].to_numpy(), n_series)
+        result["予測"] = forecast.ravel()
+        return result
+
+    def feature_importances(self):
+        """
+        特徴量の重要度を返します（LightGBM の場合のみ）。
+        """
+        return pd.Series(self.model.feature_importances_, index=self.feature_names).sort_values(ascending=False)
+
+    def save(self, path):
+        """
+        モデルを pickle で保存します（一時ファイルに書いてから置き換える）。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        save で保存したモデルを読み込みます。
+        """
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def forecast_series(df, horizon=DEFAULT_HORIZON, by=DEFAULT_KEYS, value="売上", backend="lightgbm", n_jobs=-1):
+    """
+    全系列を1つのモデルで学習し、horizon 日分を予測します。
+
+    Parameters:
+    - df (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+    - horizon (int): 予測する日数、デフォルトは 28
+    - by (list): 系列を分けるキー、デフォルトは ['店舗ID', '商品カテゴリ']
+    - value (str): 予測する値の列、デフォルトは '売上'
+    - backend (str): 'lightgbm'（既定）または 'sklearn'
+    - n_jobs (int): スレッド数、-1 の場合は全てのコア
+
+    Returns:
+    pd.DataFrame: by + ['日付', '予測'] の列を持つ縦持ちのデータ
+    """
+    model = GlobalForecaster(by=by, value=value, backend=backend, n_jobs=n_jobs)
+    return model.fit(df).predict(horizon=horizon)
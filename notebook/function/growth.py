@@ -0,0 +1,144 @@
+"""
+売上増加率の特徴量。
+
+店舗・商品カテゴリなどの系列ごとに、日次の売上を本当の 週・月・四半期 の期間に集計してから、
+前期比と前年同期比を 系列 × 期間 の行列のずらし（シフト）でまとめて計算します。
+（日ごとの行に shift(1) をかけると、期間を指定しても前日比になってしまう）
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .cube import as_cube
+
+# 集計単位の名前 → 期間の指定
+FREQUENCIES = {"week": "W", "month": "M", "quarter": "Q"}
+
+# 前年同期の期間の数（週は 52週 = 364日前で、同じ曜日の並びになる）
+PERIODS_PER_YEAR = {"W": 52, "M": 12, "Q": 4}
+
+# 前期・前年同期の名前（列名に使う）
+PREVIOUS_NAMES = {"W": "前週", "M": "前月", "Q": "前四半期"}
+
+
+def to_freq(frequency):
+    """
+    'week' / 'month' / 'quarter'（または 'W' / 'M' / 'Q'）を期間の指定に変換します。
+    """
+    if frequency in PERIODS_PER_YEAR:
+        return frequency
+    if frequency not in FREQUENCIES:
+        raise ValueError("Invalid value for 'frequency'. Use 'week', 'month', or 'quarter'.")
+    return FREQUENCIES[frequency]
+
+
+def period_matrix(df, by=("店舗ID",), freq="W", value="売上", complete_only=True):
+    """
+    系列 × 期間 の合計の行列を作ります（売上のない期間は 0）。
+
+    Parameters:
+    - df (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+    - by (list): 系列を分けるキー、デフォルトは ['店舗ID']
+    - freq (str): 'W', 'M', 'Q' のいずれか
+    - value (str): 集計値の列、デフォルトは '売上'
+    - complete_only (bool): データの期間の途中で始まる・終わる最初と最後の期間を除くかどうか、デフォルトは True
+
+    Returns:
+    (np.ndarray, pd.DataFrame, pd.DatetimeIndex): 行列, 各行のキー, 各列の期間（期間の最後の日付）
+    """
+    by = list(by)
+    sales_cube = as_cube(df)
+    rolled = sales_cube.rollup(by, freq=freq, values=[value])
+
+    grouped = rolled.groupby(by, observed=True, sort=True)
+    row_codes = grouped.ngroup().to_numpy()
+    labels = grouped.size().index.to_frame(index=False)
+    periods = pd.date_range(rolled["日付"].min(), rolled["日付"].max(), freq=freq)
+    matrix = np.zeros((len(labels), len(periods)))
+    np.add.at(matrix, (row_codes, periods.get_indexer(rolled["日付"])), rolled[value].to_numpy().astype(np.float64))
+
+    if complete_only and len(periods):
+        dates = sales_cube.frame["日付"]
+        spans = periods.to_period(freq)
+        complete = (spans.start_time >= dates.min()) & (spans.end_time.normalize() <= dates.max())
+        matrix = matrix[:, complete]
+        periods = periods[complete]
+    return matrix, labels, periods
+
+
+def _growth(matrix, lag):
+    # (今期 - lag 期前) / lag 期前。lag 期前がない・0 の期間は NaN
+    previous = np.full(matrix.shape, np.nan)
+    if lag < matrix.shape[1]:
+        previous[:, lag:] = matrix[:, :-lag]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(previous > 0, (matrix - previous) / previous, np.nan)
+    return previous, rate
+
+
+def growth_rates(df, by=("店舗ID",), frequency="week", value="売上", complete_only=True):
+    """
+    系列ごと・期間ごとの前期比と前年同期比の増加率を計算します。
+    前期（前年同期）の値が 0 の期間と、前年同期のデータがない期間の増加率は NaN です。
+
+    Parameters:
+    - df (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+    - by (list): 系列を分けるキー、デフォルトは ['店舗ID']
+    - frequency (str): 'week', 'month', 'quarter' のいずれか、デフォルトは 'week'
+    - value (str): 集計値の列、デフォルトは '売上'
+    - complete_only (bool): 途中で始まる・終わる最初と最後の期間を除くかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame: by + ['日付', value, f'{前期}の{value}', '増加率', f'前年同期の{value}', '前年同期比増加率'] の列を持つ縦持ちのデータ
+    """
+    by = list(by)
+    freq = to_freq(frequency)
+    matrix, labels, periods = period_matrix(df, by=by, freq=freq, value=value, complete_only=complete_only)
+    previous, rate = _growth(matrix, 1)
+    last_year, yearly_rate = _growth(matrix, PERIODS_PER_YEAR[freq])
+
+    n_rows, n_periods = matrix.shape
+    panel = labels.iloc[np.repeat(np.arange(n_rows), n_periods)].reset_index(drop=True)
+    panel["日付"] = np.tile(periods.to_numpy(), n_rows)
+    panel[value] = matrix.ravel()
+    panel[f"{PREVIOUS_NAMES[freq]}の{value}"] = previous.ravel()
+    panel["増加率"] = rate.ravel()
+    panel[f"前年同期の{value}"] = last_year.ravel()
+    panel["前年同期比増加率"] = yearly_rate.ravel()
+    return panel
+
+
+def growth_features(df, by=("店舗ID",), frequency="week", value="売上", complete_only=True):
+    """
+    系列ごとの増加率の要約（クラスタリングの特徴量）を計算します。
+
+    Parameters:
+    - df (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+    - by (list): 系列を分けるキー、デフォルトは ['店舗ID']
+    - frequency (str): 'week', 'month', 'quarter' のいずれか、デフォルトは 'week'
+    - value (str): 集計値の列、デフォルトは '売上'
+    - complete_only (bool): 途中で始まる・終わる最初と最後の期間を除くかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame: by をインデックスとし、'平均増加率', '増加率中央値', '増加率標準偏差', '前年同期比平均増加率' の列を持つ特徴量
+    """
+    by = list(by)
+    freq = to_freq(frequency)
+    matrix, labels, _ = period_matrix(df, by=by, freq=freq, value=value, complete_only=complete_only)
+    _, rate = _growth(matrix, 1)
+    _, yearly_rate = _growth(matrix, PERIODS_PER_YEAR[freq])
+
+    with warnings.catch_warnings():
+        # 増加率が1つもない系列（すべての期間が NaN）の警告は出さない
+        warnings.simplefilter("ignore", RuntimeWarning)
+        features = pd.DataFrame(
+            {
+                "平均増加率": np.nanmean(rate, axis=1),
+                "増加率中央値": np.nanmedian(rate, axis=1),
+                "増加率標準偏差": np.nanstd(rate, axis=1),
+                "前年同期比平均増加率": np.nanmean(yearly_rate, axis=1),
+            },
+            index=pd.MultiIndex.from_frame(labels) if len(by) > 1 else pd.Index(labels[by[0]]),
+        )
+    return features
@@ -0,0 +1,341 @@
+"""
+全体 → 店舗 → 商品カテゴリ → 商品名 → 商品 の階層の集計と、予測の整合（リコンシリエーション）。
+
+最下層の系列（(店舗ID, 商品ID)）から各階層の系列への対応を疎な集計行列 S（全系列 × 最下層の系列）として1回だけ作り、
+全ての階層の集計を S @ Y の1回の疎行列の積で計算します（階層ごとに groupby しない）。
+商品カテゴリ・商品名 は item_categories.csv と category_names.csv（split_column_by_delimiter で分割したもの）から引きます。
+
+各階層で別々に作った予測は足し合わせても上の階層の予測と一致しないので、次のいずれかで整合させます:
+- bottom_up: 最下層の予測を S で足し上げる
+- ols: 全ての系列の予測を、整合する予測のうち最も近いもの（最小二乗）に射影する
+- mint_shrink: 予測の残差の共分散（対角への縮小推定）で重み付けした射影（MinT）
+射影は 集計系列 × 集計系列 の連立方程式だけを解き、共分散は 対角 + 残差の低ランク の形のまま使うので、
+全系列 × 全系列 の行列は作りません:
+    hierarchy = Hierarchy.from_source(df, '../original_data/item_categories.csv', '../original_data/category_names.csv')
+    totals = hierarchy.aggregate_frame(df, freq='M')
+    reconciled = hierarchy.reconcile(base_forecasts, method='mint_shrink', residuals=residuals)
+"""
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from .cube import as_cube
+
+# 階層の名前 → 系列を分けるキー（上から順、最後が最下層）
+DEFAULT_LEVELS = [
+    ("全体", []),
+    ("店舗", ["店舗ID"]),
+    ("店舗×商品カテゴリ", ["店舗ID", "商品カテゴリ"]),
+    ("店舗×商品名", ["店舗ID", "商品カテゴリ", "商品名"]),
+    ("店舗×商品", ["店舗ID", "商品ID"]),
+]
+
+RECONCILE_METHODS = ["bottom_up", "ols", "mint_shrink"]
+
+
+def shrinkage_intensity(residuals):
+    """
+    残差の相関行列を対角へ縮小する強さ（Schäfer-Strimmer の推定量）を計算します。
+    系列 × 系列 の相関行列を作らずに、時点 × 時点 のグラム行列から計算します。
+
+    Parameters:
+    - residuals (np.ndarray): 時点 × 系列 の残差
+
+    Returns:
+    float: 0〜1 の縮小の強さ
+    """
+    n, p = residuals.shape
+    if n < 2 or p < 2:
+        return 1.0
+    variance = (residuals**2).mean(axis=0)
+    scale = np.sqrt(np.where(variance > 0, variance, 1.0))
+    standardized = residuals / scale
+    p_effective = int((variance > 0).sum())
+
+    gram = standardized @ standardized.T
+    squares = (standardized**2).sum(axis=1)
+    # Σ_{i≠j} Var(r_ij) と Σ_{i≠j} r_ij^2（対角の分を引く）
+    fourth = (squares**2).sum() - (standardized**4).sum()
+    cross = (gram**2).sum() - ((standardized**2).sum(axis=0) ** 2).sum()
+    variance_sum = (fourth - cross / n) / (n * (n - 1))
+    correlation_sum = (gram**2).sum() / n**2 - p_effective
+    if correlation_sum <= 0:
+        return 1.0
+    return float(np.clip(variance_sum / correlation_sum, 0.0, 1.0))
+
+
+class Hierarchy:
+    """
+    最下層の系列と階層の集計行列。
+
+    Parameters:
+    - bottom (pd.DataFrame): 最下層の系列ごとに1行の、全ての階層のキーの列を持つ表（from_frames で作る）
+    - levels (list): (階層の名前, キーのリスト) のリスト（上から順、最後が最下層）
+    """
+
+    def __init__(self, bottom, levels=DEFAULT_LEVELS):
+        self.levels = [(name, list(keys)) for name, keys in levels]
+        self.bottom = bottom.reset_index(drop=True)
+        n_bottom = len(self.bottom)
+
+        rows = []
+        labels = []
+        self._indexes = {}
+        offset = 0
+        for name, keys in self.levels[:-1]:
+            if keys:
+                grouped = self.bottom.groupby(keys, observed=True, sort=True)
+                codes = grouped.ngroup().to_numpy()
+                level_labels = grouped.size().index.to_frame(index=False)
+            else:
+                codes = np.zeros(n_bottom, dtype=np.int64)
+                level_labels = pd.DataFrame(index=range(1 if n_bottom else 0))
+            rows.append(offset + codes)
+            labels.append(level_labels.assign(階層=name))
+            self._indexes[name] = (keys, self._key_index(level_labels, keys), offset)
+            offset += len(level_labels)
+        self.n_aggregate = offset
+
+        # 集計の行（疎）と最下層の単位行列を縦に並べたものが S
+        bottom_name, bottom_keys = self.levels[-1]
+        aggregate_rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        columns = np.tile(np.arange(n_bottom), len(rows))
+        self.summing_aggregate = sparse.csr_matrix(
+            (np.ones(len(aggregate_rows)), (aggregate_rows, columns)), shape=(self.n_aggregate, n_bottom)
+        )
+        self.summing = sparse.vstack([self.summing_aggregate, sparse.identity(n_bottom, format="csr")]).tocsr()
+
+        labels.append(self.bottom.assign(階層=bottom_name))
+        self._indexes[bottom_name] = (bottom_keys, self._key_index(self.bottom, bottom_keys), offset)
+        key_columns = list(dict.fromkeys(key for _, keys in self.levels for key in keys))
+        self.labels = pd.concat(labels, ignore_index=True)[["階層"] + key_columns]
+        # 上の階層にはないキーは欠損になるので、整数のIDは欠損を持てる型にする
+        for column in key_columns:
+            if pd.api.types.is_integer_dtype(self.bottom[column]):
+                self.labels[column] = self.labels[column].astype(f"Int{self.bottom[column].dtype.itemsize * 8}")
+
+    @staticmethod
+    def _key_index(frame, keys):
+        if not keys:
+            return pd.RangeIndex(len(frame))
+        if len(keys) == 1:
+            return pd.Index(frame[keys[0]])
+        return pd.MultiIndex.from_frame(frame[keys])
+
+    @classmethod
+    def from_frames(cls, pairs, item_master, levels=DEFAULT_LEVELS):
+        """
+        最下層の (店舗ID, 商品ID) の組と商品マスタから階層を作ります。
+        商品マスタにない商品の組は除きます（create_data の結合と同じ）。
+
+        Parameters:
+        - pairs (pd.DataFrame): 店舗ID・商品ID の列を持つ表（重複は除く）
+        - item_master (pd.DataFrame): create_data.load_item_master の戻り値（商品ID・商品カテゴリ・商品名 の列）
+        - levels (list): (階層の名前, キーのリスト) のリスト
+
+        Returns:
+        Hierarchy
+        """
+        pairs = pairs[["店舗ID", "商品ID"]].drop_duplicates().sort_values(["店舗ID", "商品ID"], ignore_index=True)
+        master = item_master.drop_duplicates("商品ID").set_index("商品ID")
+        position = master.index.get_indexer(pairs["商品ID"].to_numpy())
+        pairs = pairs[position >= 0].reset_index(drop=True)
+        position = position[position >= 0]
+
+        attributes = [
+            key
+            for _, keys in levels
+            for key in keys
+            if key not in pairs.columns and key in master.columns
+        ]
+        for column in dict.fromkeys(attributes):
+            pairs[column] = master[column].to_numpy()[position]
+        return cls(pairs, levels=levels)
+
+    @classmethod
+    def from_source(cls, source, item_categories_csv, category_names_csv, levels=DEFAULT_LEVELS):
+        """
+        データに現れる (店舗ID, 商品ID) の組と、item_categories.csv・category_names.csv から階層を作ります。
+
+        Parameters:
+        - source (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+        - item_categories_csv (str): item_categories.csv のパス
+        - category_names_csv (str): category_names.csv のパス
+
+        Returns:
+        Hierarchy
+        """
+        from . import create_data
+
+        item_master = create_data.load_item_master(item_categories_csv, category_names_csv)
+        pairs = as_cube(source).rollup(["店舗ID", "商品ID"], freq=None, values=["売上"])
+        return cls.from_frames(pairs, item_master, levels=levels)
+
+    @property
+    def n_bottom(self):
+        return len(self.bottom)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def positions(self, level, frame):
+        """
+        frame の各行のキーに対応する、階層 level の系列の位置（全系列の中の行番号）を返します（ない場合は -1）。
+        """
+        keys, index, offset = self._indexes[level]
+        if not keys:
+            return np.full(len(frame), offset)
+        if len(keys) == 1:
+            found = index.get_indexer(frame[keys[0]].to_numpy())
+        else:
+            found = index.get_indexer(pd.MultiIndex.from_frame(frame[keys]))
+        return np.where(found >= 0, offset + found, -1)
+
+    def bottom_matrix(self, source, value="売上", freq="D"):
+        """
+        最下層の系列 × 期間 の疎行列を作ります（日次集計キューブの集約結果から、値のある組み合わせだけ）。
+
+        Returns:
+        (scipy.sparse.csr_matrix, pd.DatetimeIndex): 行列と各列の期間
+        """
+        bottom_name, bottom_keys = self.levels[-1]
+        rolled = as_cube(source).rollup(bottom_keys, freq=freq, values=[value])
+        rows = self.positions(bottom_name, rolled) - self.n_aggregate
+        keep = rows >= 0
+        dates, columns = np.unique(rolled["日付"].to_numpy()[keep], return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (rolled[value].to_numpy()[keep].astype(np.float64), (rows[keep], columns)),
+            shape=(self.n_bottom, len(dates)),
+        )
+        return matrix, pd.DatetimeIndex(dates)
+
+    def aggregate(self, bottom_values):
+        """
+        最下層の値（最下層の系列 × 期間）を全ての階層へ S @ Y で集計します。
+
+        Returns:
+        np.ndarray or scipy.sparse.csr_matrix: 全系列 × 期間（labels の順）
+        """
+        return self.summing @ bottom_values
+
+    def aggregate_frame(self, source, value="売上", freq="D"):
+        """
+        全ての階層の系列を期間ごとに集計した縦持ちのデータを返します（値のある組み合わせのみ）。
+
+        Parameters:
+        - source (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+        - value (str): 集計値の列、デフォルトは '売上'
+        - freq (str): 期間の指定 ('D', 'W', 'M', 'Q', 'Y')
+
+        Returns:
+        pd.DataFrame: '階層' + 各階層のキー + ['日付', value] の列を持つデータ
+        """
+        matrix, dates = self.bottom_matrix(source, value=value, freq=freq)
+        totals = self.aggregate(matrix).tocoo()
+        order = np.lexsort((totals.col, totals.row))
+        frame = self.labels.iloc[totals.row[order]].reset_index(drop=True)
+        frame["日付"] = dates[totals.col[order]]
+        frame[value] = totals.data[order]
+        return frame
+
+    def matrix_from_frame(self, frame, value, dates=None):
+        """
+        '階層' と各階層のキー・日付・value の列を持つ縦持ちのデータ（各階層の予測など）を 全系列 × 日付 の行列にします。
+        値のない系列・日付は NaN です。
+
+        Returns:
+        (np.ndarray, pd.DatetimeIndex): 行列（labels の順）と各列の日付
+        """
+        dates = pd.DatetimeIndex(np.unique(frame["日付"])) if dates is None else pd.DatetimeIndex(dates)
+        matrix = np.full((len(self.labels), len(dates)), np.nan)
+        for level, rows in frame.groupby("階層", sort=False):
+            positions = self.positions(level, rows)
+            columns = dates.get_indexer(rows["日付"])
+            keep = (positions >= 0) & (columns >= 0)
+            matrix[positions[keep], columns[keep]] = rows[value].to_numpy()[keep]
+        return matrix, dates
+
+    def frame_from_matrix(self, matrix, dates, value="予測"):
+        """
+        全系列 × 日付 の行列を、'階層' と各階層のキー・日付・value の列を持つ縦持ちのデータにします。
+        """
+        n_series, n_dates = matrix.shape
+        frame = self.labels.iloc[np.repeat(np.arange(n_series), n_dates)].reset_index(drop=True)
+        frame["日付"] = np.tile(pd.DatetimeIndex(dates).to_numpy(), n_series)
+        frame[value] = np.asarray(matrix).ravel()
+        return frame
+
+    def reconcile(self, forecasts, method="mint_shrink", residuals=None):
+        """
+        各系列の予測（全系列 × 期間、labels の順）を、階層で整合する（上の階層が下の階層の合計になる）予測にします。
+
+        Parameters:
+        - forecasts (np.ndarray): 全系列 × 期間 の予測
+        - method (str): 'bottom_up', 'ols', 'mint_shrink' のいずれか、デフォルトは 'mint_shrink'
+        - residuals (np.ndarray): mint_shrink で使う、全系列 × 時点 の予測の残差（学習期間の1期先の誤差など）
+
+        Returns:
+        np.ndarray: 整合した 全系列 × 期間 の予測
+        """
+        if method not in RECONCILE_METHODS:
+            raise ValueError(f"Invalid method. Use one of {RECONCILE_METHODS}.")
+        forecasts = np.asarray(forecasts, dtype=np.float64)
+        squeeze = forecasts.ndim == 1
+        if squeeze:
+            forecasts = forecasts[:, None]
+        if forecasts.shape[0] != len(self.labels):
+            raise ValueError(f"forecasts must have {len(self.labels)} rows")
+
+        n_aggregate = self.n_aggregate
+        if method == "bottom_up":
+            bottom = forecasts[n_aggregate:]
+        else:
+            # 制約 C y = 0（C = [I, -S_agg]）への W に関する射影: y~ = y - W C' (C W C')^-1 C y
+            S_agg = self.summing_aggregate
+            violation = forecasts[:n_aggregate] - S_agg @ forecasts[n_aggregate:]
+            if method == "ols":
+                system = np.eye(n_aggregate) + (S_agg @ S_agg.T).toarray()
+                x = self._solve(system, violation)
+                bottom = forecasts[n_aggregate:] + S_agg.T @ x
+            else:
+                bottom = self._mint_shrink(forecasts, violation, residuals)
+        reconciled = self.summing @ bottom
+        return reconciled[:, 0] if squeeze else reconciled
+
+    def _mint_shrink(self, forecasts, violation, residuals):
+        if residuals is None:
+            raise ValueError("mint_shrink requires residuals")
+        residuals = np.nan_to_num(np.asarray(residuals, dtype=np.float64)).T
+        if residuals.shape[1] != len(self.labels):
+            raise ValueError(f"residuals must have {len(self.labels)} rows")
+
+        n_times = len(residuals)
+        n_aggregate = self.n_aggregate
+        S_agg = self.summing_aggregate
+        # W = λ D + (1 - λ) R'R / T（D は残差の分散の対角、分散が 0 の系列は平均の分散の小さな値で置き換える）
+        shrink = shrinkage_intensity(residuals)
+        diagonal = (residuals**2).mean(axis=0)
+        floor = diagonal[diagonal > 0].mean() * 1e-6 if (diagonal > 0).any() else 1.0
+        diagonal = np.maximum(diagonal, floor)
+
+        D_agg, D_bottom = diagonal[:n_aggregate], diagonal[n_aggregate:]
+        # R C'（時点 × 集計系列）
+        residual_constraints = residuals[:, :n_aggregate] - (S_agg @ residuals[:, n_aggregate:].T).T
+        system = shrink * (
+            np.diag(D_agg) + (S_agg @ sparse.diags(D_bottom) @ S_agg.T).toarray()
+        ) + (1 - shrink) / n_times * (residual_constraints.T @ residual_constraints)
+        x = self._solve(system, violation)
+
+        # W C' x の最下層の行
+        constrained = np.vstack([x, -(S_agg.T @ x)])
+        correction = shrink * diagonal[:, None] * constrained + (1 - shrink) / n_times * (
+            residuals.T @ (residuals @ constrained)
+        )
+        return forecasts[n_aggregate:] - correction[n_aggregate:]
+
+    @staticmethod
+    def _solve(system, right):
+        try:
+            return np.linalg.solve(system, right)
+        except np.linalg.LinAlgError:
+            return np.linalg.lstsq(system, right, rcond=None)[0]
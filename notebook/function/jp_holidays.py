@@ -0,0 +1,144 @@
+"""
+日本の祝日（国民の祝日・振替休日・国民の休日）の判定。
+
+祝日法の規則を表（HOLIDAY_RULES）で持ち、年ごとに日付を計算するのでネットワークは使いません。
+対象は 2000年〜2099年（春分・秋分の日は計算式による推定値）。
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+# (名前, 月, 日の規則, 開始年, 終了年)
+# 日の規則: 整数 → その日、("monday", n) → 第n月曜日、"spring_equinox" / "autumn_equinox" → 春分日・秋分日
+HOLIDAY_RULES = [
+    ("元日", 1, 1, 1949, None),
+    ("成人の日", 1, ("monday", 2), 2000, None),
+    ("建国記念の日", 2, 11, 1967, None),
+    ("天皇誕生日", 2, 23, 2020, None),
+    ("春分の日", 3, "spring_equinox", 1949, None),
+    ("昭和の日", 4, 29, 2007, None),
+    ("みどりの日", 4, 29, 1989, 2006),
+    ("憲法記念日", 5, 3, 1949, None),
+    ("みどりの日", 5, 4, 2007, None),
+    ("こどもの日", 5, 5, 1949, None),
+    ("海の日", 7, ("monday", 3), 2003, None),
+    ("山の日", 8, 11, 2016, None),
+    ("敬老の日", 9, ("monday", 3), 2003, None),
+    ("秋分の日", 9, "autumn_equinox", 1948, None),
+    ("体育の日", 10, ("monday", 2), 2000, 2019),
+    ("スポーツの日", 10, ("monday", 2), 2020, None),
+    ("文化の日", 11, 3, 1948, None),
+    ("勤労感謝の日", 11, 23, 1948, None),
+    ("天皇誕生日", 12, 23, 1989, 2018),
+]
+
+# 特定の年だけの祝日（即位の日など）
+EXTRA_HOLIDAYS = {
+    datetime.date(2019, 5, 1): "天皇の即位の日",
+    datetime.date(2019, 10, 22): "即位礼正殿の儀の行われる日",
+    datetime.date(2020, 7, 23): "海の日",
+    datetime.date(2020, 7, 24): "スポーツの日",
+    datetime.date(2020, 8, 10): "山の日",
+    datetime.date(2021, 7, 22): "海の日",
+    datetime.date(2021, 7, 23): "スポーツの日",
+    datetime.date(2021, 8, 8): "山の日",
+}
+
+# 東京オリンピック・パラリンピックの特例で移動した年（規則による日付を使わない）
+MOVED_HOLIDAYS = {
+    2020: ["海の日", "スポーツの日", "山の日"],
+    2021: ["海の日", "スポーツの日", "山の日"],
+}
+
+MIN_YEAR = 2000
+MAX_YEAR = 2099
+
+
+def _equinox_day(year, base):
+    # 1980〜2099年の春分日（base=20.8431）・秋分日（base=23.2488）の近似式
+    return int(base + 0.242194 * (year - 1980) - (year - 1980) // 4)
+
+
+def _rule_date(year, month, rule):
+    if isinstance(rule, int):
+        return datetime.date(year, month, rule)
+    if rule == "spring_equinox":
+        return datetime.date(year, month, _equinox_day(year, 20.8431))
+    if rule == "autumn_equinox":
+        return datetime.date(year, month, _equinox_day(year, 23.2488))
+    _, n = rule
+    first = datetime.date(year, month, 1)
+    # 第n月曜日（weekday(): 月曜日が0）
+    return first + datetime.timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+
+def holidays_of_year(year):
+    """
+    指定した年の祝日を返します（振替休日・国民の休日を含む）。
+
+    Parameters:
+    - year (int): 年（2000〜2099）
+
+    Returns:
+    dict: datetime.date → 祝日名
+    """
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"year must be between {MIN_YEAR} and {MAX_YEAR}")
+
+    holidays = {}
+    moved = MOVED_HOLIDAYS.get(year, [])
+    for name, month, rule, start, end in HOLIDAY_RULES:
+        if year < start or (end is not None and year > end) or name in moved:
+            continue
+        holidays[_rule_date(year, month, rule)] = name
+    for date, name in EXTRA_HOLIDAYS.items():
+        if date.year == year:
+            holidays[date] = name
+
+    # 国民の休日: 前日と翌日が祝日の平日
+    for date in sorted(holidays):
+        candidate = date + datetime.timedelta(days=2)
+        between = date + datetime.timedelta(days=1)
+        if candidate in holidays and between not in holidays and between.weekday() != 6:
+            holidays[between] = "国民の休日"
+
+    # 振替休日: 日曜日の祝日の後の最初の祝日でない日
+    for date in sorted(holidays):
+        if date.weekday() == 6:
+            substitute = date + datetime.timedelta(days=1)
+            while substitute in holidays:
+                substitute += datetime.timedelta(days=1)
+            holidays[substitute] = "振替休日"
+
+    return dict(sorted(holidays.items()))
+
+
+def holiday_names(dates):
+    """
+    日付ごとの祝日名を返します（祝日でない日は None）。
+
+    Parameters:
+    - dates (pd.DatetimeIndex or array-like): 日付
+
+    Returns:
+    np.ndarray: 祝日名（object型）
+    """
+    dates = pd.DatetimeIndex(dates)
+    table = {}
+    for year in np.unique(dates.year):
+        table.update(holidays_of_year(int(year)))
+    return np.array([table.get(date) for date in dates.date], dtype=object)
+
+
+def is_holiday(dates):
+    """
+    日付ごとに祝日かどうかを返します。
+
+    Parameters:
+    - dates (pd.DatetimeIndex or array-like): 日付
+
+    Returns:
+    np.ndarray: bool
+    """
+    return pd.notna(holiday_names(dates))
@@ -0,0 +1,302 @@
+"""
+新しく届いた売上の行を、全履歴を読み直さずにその場でスコアリングします。
+
+(商品ID, 店舗ID) ごとに次の状態だけを保持し、行ごとに O(1) でスコアを計算してから状態を更新します。
+- Welford のアルゴリズムによる件数・平均・分散（の途中計算値）
+- 指数的に古い値の影響が減る分位点の推定値（固定の学習率による逐次更新）
+
+状態は小さな npz ファイルに保存するので、取り込みのたびに読み込んで更新できます:
+    scorer = online_anomaly.OnlineScorer.load('../processing_data/online_state.npz')
+    scores = scorer.score(new_rows)
+    scorer.save('../processing_data/online_state.npz')
+"""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# スコアリングする列
+DEFAULT_VALUES = ["売上個数", "商品価格"]
+
+# 推定する分位点（下側・中央・上側）
+DEFAULT_QUANTILES = [0.01, 0.5, 0.99]
+
+# 分位点の推定値を動かす幅（標準偏差に対する割合）。大きいほど古い値を早く忘れる
+DEFAULT_LEARNING_RATE = 0.05
+
+DEFAULT_Z_THRESHOLD = 4.0
+
+# これより少ない件数しかない (商品ID, 店舗ID) では z・分位点による判定をしない
+DEFAULT_MIN_COUNT = 5
+
+# ノートブックで手作業で除外していた商品価格の上限
+PRICE_LIMIT = 500000
+
+STATE_VERSION = 1
+
+
+def _pair_keys(df):
+    # (商品ID, 店舗ID) を1つの int64 にまとめる
+    items = df["商品ID"].to_numpy().astype(np.int64)
+    stores = df["店舗ID"].to_numpy().astype(np.int64)
+    return (items << 32) | stores
+
+
+class OnlineScorer:
+    """
+    (商品ID, 店舗ID) ごとの逐次統計による異常スコアリング。
+
+    Parameters:
+    - values (list): スコアリングする列、デフォルトは ['売上個数', '商品価格']
+    - quantiles (list): 推定する分位点（最初と最後を下側・上側の判定に使う）
+    - learning_rate (float): 分位点の推定値の更新幅（標準偏差に対する割合）
+    - z_threshold (float): |z| がこれを超えた場合に異常とする
+    - min_count (int): 判定に必要な過去の件数（分位点による判定は quantile_min_count 件）
+    """
+
+    def __init__(
+        self,
+        values=None,
+        quantiles=None,
+        learning_rate=DEFAULT_LEARNING_RATE,
+        z_threshold=DEFAULT_Z_THRESHOLD,
+        min_count=DEFAULT_MIN_COUNT,
+    ):
+        self.values = list(DEFAULT_VALUES if values is None else values)
+        self.quantiles = np.asarray(DEFAULT_QUANTILES if quantiles is None else quantiles, dtype=np.float64)
+        self.learning_rate = learning_rate
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+
+        n_values = len(self.values)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.count = np.empty((0, n_values), dtype=np.int64)
+        self.mean = np.empty((0, n_values))
+        self.m2 = np.empty((0, n_values))
+        self.quantile = np.empty((0, n_values, len(self.quantiles)))
+        self._index = None
+
+    @property
+    def quantile_min_count(self):
+        # 下側・上側の分位点の推定値は、外側の値が何度か現れるまで（約 1/τ 件）当てにならない
+        tail = min(self.quantiles[0], 1 - self.quantiles[-1])
+        return max(self.min_count, int(np.ceil(1 / tail)) if tail > 0 else self.min_count)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _slots(self, keys):
+        # キーの位置（ハッシュ表による検索）。初めてのキーは状態の末尾に追加する
+        if self._index is None:
+            self._index = pd.Index(self.keys)
+        slots = self._index.get_indexer(keys)
+        new = slots < 0
+        if new.any():
+            added = pd.unique(keys[new])
+            n_values = len(self.values)
+            self.keys = np.concatenate([self.keys, added])
+            self.count = np.concatenate([self.count, np.zeros((len(added), n_values), dtype=np.int64)])
+            self.mean = np.concatenate([self.mean, np.zeros((len(added), n_values))])
+            self.m2 = np.concatenate([self.m2, np.zeros((len(added), n_values))])
+            self.quantile = np.concatenate(
+                [self.quantile, np.full((len(added), n_values, len(self.quantiles)), np.nan)]
+            )
+            self._index = pd.Index(self.keys)
+            slots = self._index.get_indexer(keys)
+        return slots
+
+    def _std(self, slots):
+        count = self.count[slots]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(count >= 2, np.sqrt(self.m2[slots] / (count - 1)), np.nan)
+
+    def _score_and_update(self, slots, x, update):
+        # slots に重複がない（同じキーの行を含まない）ことを前提に、スコアを計算してから状態を更新する
+        count = self.count[slots]
+        mean = self.mean[slots]
+        std = self._std(slots)
+        quantile = self.quantile[slots]
+
+        observed = ~np.isnan(x)
+        judged = observed & (count >= self.min_count)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = np.where(judged & (std > 0), (x - mean) / std, 0.0)
+        outside = (
+            observed
+            & (count >= self.quantile_min_count)
+            & ((x < quantile[:, :, 0]) | (x > quantile[:, :, -1]))
+        )
+
+        if update:
+            # Welford の更新（値が欠損している列は更新しない）
+            new_count = count + observed
+            delta = np.where(observed, x - mean, 0.0)
+            new_mean = mean + np.where(observed, delta / np.maximum(new_count, 1), 0.0)
+            self.m2[slots] += np.where(observed, delta * (x - new_mean), 0.0)
+            self.mean[slots] = new_mean
+            self.count[slots] = new_count
+
+            # 分位点: q += η·σ·(τ - 1[x < q])（最初の値で初期化、σ が未定の間は値の大きさを目安にする）
+            step = np.where(std > 0, std, np.maximum(np.abs(np.nan_to_num(mean)), 1.0) * 0.1)
+            step = self.learning_rate * step[:, :, None]
+            below = x[:, :, None] < quantile
+            updated = quantile + step * (self.quantiles - below)
+            first = np.isnan(quantile)
+            updated = np.where(first, x[:, :, None], updated)
+            self.quantile[slots] = np.where(observed[:, :, None], updated, quantile)
+        return z, outside
+
+    def score(self, df, update=True):
+        """
+        行ごとの異常スコアを計算し、update=True の場合は状態を更新します。
+        各行はそれより前の行（日付順）までの状態で判定するので、履歴を順に流すとバッチ処理と同じ順序で学習します。
+        同じキーの行は日付順に処理し、異なるキーの行はまとめてベクトル演算で処理します。
+
+        追加する列（values の各列について）:
+        - f'{列}z': (値 - 平均) / 標準偏差
+        - f'{列}分位外れ': 推定した下側・上側の分位点の外側かどうか（過去の件数が quantile_min_count 以上の場合のみ）
+        全体の列:
+        - 価格上限超え: 商品価格 が PRICE_LIMIT 以上かどうか（ノートブックで除外していた行）
+        - 異常スコア: |z| の最大値
+        - 異常: |z| > z_threshold、分位外れ、価格上限超え のいずれかに当てはまるかどうか
+
+        Parameters:
+        - df (pd.DataFrame): 商品ID・店舗ID・日付 と values の列を持つ新しい行
+        - update (bool): 状態を更新するかどうか、デフォルトは True
+
+        Returns:
+        pd.DataFrame: df と同じインデックスのスコア
+        """
+        n_values = len(self.values)
+        z = np.zeros((len(df), n_values))
+        outside = np.zeros((len(df), n_values), dtype=bool)
+
+        if len(df):
+            slots = self._slots(_pair_keys(df))
+            x = np.column_stack([df[value].to_numpy().astype(np.float64) for value in self.values])
+
+            # 同じキーの何件目かで分け、各回では異なるキーの行をまとめて処理する
+            order = np.argsort(df["日付"].to_numpy(), kind="stable")
+            rank = pd.Series(slots[order]).groupby(slots[order]).cumcount().to_numpy()
+            order = order[np.argsort(rank, kind="stable")]
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(rank))])
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                rows = order[start:end]
+                z[rows], outside[rows] = self._score_and_update(slots[rows], x[rows], update)
+
+        scores = pd.DataFrame(index=df.index)
+        for i, value in enumerate(self.values):
+            scores[f"{value}z"] = z[:, i]
+            scores[f"{value}分位外れ"] = outside[:, i]
+        if "商品価格" in df.columns:
+            scores["価格上限超え"] = (df["商品価格"] >= PRICE_LIMIT).to_numpy()
+        else:
+            scores["価格上限超え"] = False
+        scores["異常スコア"] = np.abs(z).max(axis=1) if n_values else 0.0
+        scores["異常"] = (
+            (np.abs(z) > self.z_threshold).any(axis=1)
+            | outside.any(axis=1)
+            | scores["価格上限超え"].to_numpy()
+        )
+        return scores
+
+    def fit(self, frames):
+        """
+        過去の履歴を日付順に流して状態を作ります（スコアは返さない）。
+
+        Parameters:
+        - frames (iterable): 結合済みデータのデータフレーム（create_data.iter_merged_dataset など、古い順）
+
+        Returns:
+        OnlineScorer: self
+        """
+        for df in frames:
+            self.score(df, update=True)
+        return self
+
+    def statistics(self):
+        """
+        保持している (商品ID, 店舗ID) ごとの 件数・平均・標準偏差・分位点 をデータフレームで返します（確認用）。
+        """
+        slots = np.arange(len(self.keys))
+        std = self._std(slots)
+        frame = pd.DataFrame(
+            {"商品ID": (self.keys >> 32).astype("int32"), "店舗ID": (self.keys & 0xFFFFFFFF).astype("int16")}
+        )
+        for i, value in enumerate(self.values):
+            frame[f"{value}件数"] = self.count[:, i]
+            frame[f"{value}平均"] = self.mean[:, i]
+            frame[f"{value}標準偏差"] = std[:, i]
+            for j, q in enumerate(self.quantiles):
+                frame[f"{value}分位点{q:g}"] = self.quantile[:, i, j]
+        return frame
+
+    def save(self, path):
+        """
+        状態を npz ファイルに保存します（一時ファイルに書いてから置き換える）。
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(
+                f,
+                version=STATE_VERSION,
+                values=np.array(self.values),
+                quantiles=self.quantiles,
+                settings=np.array([self.learning_rate, self.z_threshold, self.min_count], dtype=np.float64),
+                keys=self.keys,
+                count=self.count,
+                mean=self.mean,
+                m2=self.m2,
+                quantile=self.quantile,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        save で保存した状態を読み込みます。
+        """
+        with np.load(path) as state:
+            if int(state["version"]) != STATE_VERSION:
+                raise ValueError(f"unsupported state version: {int(state['version'])}")
+            learning_rate, z_threshold, min_count = state["settings"]
+            scorer = cls(
+                values=[str(value) for value in state["values"]],
+                quantiles=state["quantiles"],
+                learning_rate=float(learning_rate),
+                z_threshold=float(z_threshold),
+                min_count=int(min_count),
+            )
+            scorer.keys = state["keys"]
+            scorer.count = state["count"]
+            scorer.mean = state["mean"]
+            scorer.m2 = state["m2"]
+            scorer.quantile = state["quantile"]
+        return scorer
+
+
+def load_or_fit(path, dataset_dir=None):
+    """
+    保存した状態を読み込みます。ファイルがない場合は、dataset_dir の履歴から状態を作ります。
+
+    Parameters:
+    - path (str): 状態のファイルのパス
+    - dataset_dir (str): 履歴のParquetデータセット（create_data.save_merged_dataset の出力）
+
+    Returns:
+    OnlineScorer
+    """
+    if os.path.exists(path):
+        return OnlineScorer.load(path)
+
+    scorer = OnlineScorer()
+    if dataset_dir is not None and os.path.isdir(dataset_dir):
+        from . import create_data
+
+        columns = ["日付", "商品ID", "店舗ID"] + scorer.values
+        scorer.fit(create_data.iter_merged_dataset(dataset_dir, columns=columns))
+    return scorer
@@ -0,0 +1,301 @@
+"""
+店舗ID ごとに独立した集計・トレンド除去を、店舗で分割してプロセスプールで並列に実行します。
+
+生データの走査と日次合計の計算（日次集計キューブの作成）から各ワーカーで行います:
+- Parquetデータセットは店舗IDでパーティション分割されているので、各ワーカーが担当する店舗のファイルだけを読んで
+  SalesCube.from_dataset(store_ids=...) でキューブを作ります（親プロセスはデータを読まない）。
+- データフレームは必要な列だけを店舗ID順に並べて、圧縮なしの Arrow IPC ファイルに1回だけ書き出します
+  （/dev/shm がある場合はそこに置くので、ディスクではなく共有メモリ上のファイルになる）。
+  各ワーカーはファイルをメモリマップし、担当する店舗の行範囲だけを切り出してキューブを作ります。
+ワーカーへ送るのはデータセットまたはファイルのパスと担当範囲だけなので、データは pickle されません。
+結果は店舗ごとの縦持ちのデータを1つのデータフレームにまとめて返します:
+    totals = parallel.total_sales(df, unit='day', workers=4)
+    detrended = parallel.detrended_sales('../processing_data/merged', moving_average_type='stl')
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from . import detrend, schema
+from .cube import CUBE_KEYS, CUBE_VALUES, SalesCube, as_cube, is_dataset
+
+# 共有メモリ上のファイルを置くディレクトリ（ない場合は通常の一時ディレクトリを使う）
+SHARED_MEMORY_DIR = "/dev/shm"
+
+SHARD_FILE = "sales.arrow"
+
+# ワーカー1つあたりの分割数（店舗ごとの行数の偏りをならす）
+SHARDS_PER_WORKER = 2
+
+
+def resolve_workers(workers=None):
+    """
+    ワーカー数の指定（None の場合は CPU 数）を整数にします。
+    """
+    if workers is None:
+        return os.cpu_count() or 1
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+    return int(workers)
+
+
+def balanced_groups(sizes, n_groups):
+    """
+    店舗ID順に並んだ店舗ごとの大きさを、合計がほぼ等しくなるように連続する n_groups 個以下のグループに分けます。
+
+    Returns:
+    list: (開始位置, 終了位置) のリスト（店舗の位置の範囲）
+    """
+    if len(sizes) == 0:
+        return []
+    # 各店舗の手前までの累積（境界）のうち、等分した目標に最も近いところで切る
+    boundaries = np.concatenate([[0], np.cumsum(np.asarray(sizes, dtype=np.float64))])
+    targets = np.linspace(0, boundaries[-1], max(n_groups, 1) + 1)[1:-1]
+    right = np.clip(np.searchsorted(boundaries, targets), 1, len(sizes))
+    cuts = np.where(boundaries[right] - targets < targets - boundaries[right - 1], right, right - 1)
+    cuts = np.unique(np.concatenate([[0], cuts, [len(sizes)]]))
+    return list(zip(cuts[:-1].tolist(), cuts[1:].tolist()))
+
+
+def dataset_store_sizes(dataset_dir):
+    """
+    Parquetデータセットの店舗IDごとのファイルサイズの合計を返します（ファイルは読み込まない）。
+    店舗IDでパーティション分割されていない場合は None を返します。
+    """
+    from . import create_data
+    import pyarrow.dataset as ds
+
+    sizes = {}
+    for fragment in create_data.open_merged_dataset(dataset_dir).get_fragments():
+        store_id = ds.get_partition_keys(fragment.partition_expression).get("店舗ID")
+        if store_id is None:
+            return None
+        sizes[store_id] = sizes.get(store_id, 0) + os.path.getsize(fragment.path)
+    return pd.Series(sizes, dtype="int64").sort_index()
+
+
+class StoreShards:
+    """
+    データを店舗の境界で分割し、各ワーカーが自分の分の日次集計キューブを作るための担当範囲（シャード）を作ります。
+    データフレームは必要な列を店舗ID順に Arrow IPC ファイルへ書き出し、with 文を抜けるとファイルを削除します。
+
+    Parameters:
+    - source (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+      （店舗IDでパーティション分割されたもの、または開いたデータセット）
+    - directory (str): ファイルを置くディレクトリ、None の場合は SHARED_MEMORY_DIR（ない場合は一時ディレクトリ）
+    """
+
+    def __init__(self, source, directory=None):
+        self.dataset = None
+        self.directory = None
+        self.path = None
+        if is_dataset(source):
+            sizes = dataset_store_sizes(source)
+            if sizes is None:
+                raise ValueError("dataset is not partitioned by 店舗ID")
+            self.dataset = source
+            self.store_ids = sizes.index.tolist()
+            self.sizes = sizes.to_numpy()
+            return
+
+        import pyarrow as pa
+
+        # キューブは集計済みなのでそのまま、データフレームはキューブの作成に必要な列だけを書き出す
+        self.aggregated = isinstance(source, SalesCube)
+        if self.aggregated:
+            frame = source.frame
+        else:
+            frame = source[[column for column in CUBE_KEYS + CUBE_VALUES if column in source.columns]]
+        if not frame["店舗ID"].is_monotonic_increasing:
+            frame = frame.sort_values("店舗ID", kind="mergesort", ignore_index=True)
+
+        stores = frame["店舗ID"].to_numpy()
+        # 各店舗の最初の行（末尾に行数を加える）
+        self.store_starts = np.append(np.flatnonzero(np.r_[True, stores[1:] != stores[:-1]]), len(frame))
+        self.store_ids = stores[self.store_starts[:-1]].tolist()
+        self.sizes = np.diff(self.store_starts)
+
+        if directory is None and os.path.isdir(SHARED_MEMORY_DIR):
+            directory = SHARED_MEMORY_DIR
+        self.directory = tempfile.mkdtemp(prefix="store_shards_", dir=directory)
+        self.path = os.path.join(self.directory, SHARD_FILE)
+
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        with pa.OSFile(self.path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    @property
+    def n_stores(self):
+        return len(self.store_ids)
+
+    def shards(self, n_shards):
+        """
+        データの大きさ（行数、データセットの場合はファイルサイズ）がほぼ等しくなるように、
+        店舗の境界で n_shards 個以下に分けた担当範囲を返します（read_shard に渡す、店舗ID順）。
+
+        Returns:
+        list: データセットの場合は ('dataset', データセット, 店舗IDのリスト)、
+        それ以外は ('file', ファイルのパス, 開始行, 終了行, 集計済みかどうか) のリスト
+        """
+        groups = balanced_groups(self.sizes, n_shards)
+        if self.dataset is not None:
+            return [("dataset", self.dataset, self.store_ids[start:end]) for start, end in groups]
+        return [
+            ("file", self.path, int(self.store_starts[start]), int(self.store_starts[end]), self.aggregated)
+            for start, end in groups
+        ]
+
+    def close(self):
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_shard(shard):
+    """
+    StoreShards.shards の担当範囲の日次集計キューブを作ります（ワーカープロセスで実行される）。
+    データセットは担当する店舗のパーティションだけを読み込み、ファイルはメモリマップして行範囲だけを切り出します。
+    """
+    if shard[0] == "dataset":
+        _, dataset, store_ids = shard
+        return SalesCube.from_dataset(dataset, store_ids=store_ids)
+
+    import pyarrow as pa
+
+    _, path, start, end, aggregated = shard
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all().slice(start, end - start)
+        frame = table.to_pandas()
+    if aggregated:
+        return SalesCube(schema.apply_schema(frame))
+    return SalesCube.from_frame(frame)
+
+
+def _total_sales(cube, freq):
+    return cube.rollup(["店舗ID"], freq=freq, values=["売上"])
+
+
+def _detrended_sales(cube, freq, window_size, moving_average_type):
+    return detrend.detrend_panel(
+        cube.rollup(["店舗ID"], freq=freq, values=["売上"]),
+        keys=["店舗ID"],
+        value="売上",
+        window_size=window_size,
+        moving_average_type=moving_average_type,
+    )
+
+
+def _sales_by_weekday(cube):
+    return cube.weekday(["店舗ID", "年"], values=["売上"])
+
+
+# 店舗ごとに独立して計算できる処理（ワーカーには名前で渡す）
+TASKS = {
+    "total_sales": _total_sales,
+    "detrended_sales": _detrended_sales,
+    "sales_by_weekday": _sales_by_weekday,
+}
+
+
+def _run_shard(shard, task, params):
+    return TASKS[task](read_shard(shard), **params)
+
+
+def _can_shard(source):
+    # キューブの作成から分割できるのは、店舗IDの列を持つデータか、店舗IDでパーティション分割されたデータセット
+    if is_dataset(source):
+        return dataset_store_sizes(source) is not None
+    return "店舗ID" in source.columns if isinstance(source, pd.DataFrame) else isinstance(source, SalesCube)
+
+
+def map_stores(source, task, params=None, workers=None):
+    """
+    店舗で分割したデータから、各ワーカーが日次集計キューブを作って TASKS の処理を適用し、結果を1つのデータフレームにまとめます。
+    ワーカー数が1、店舗が1つ、または店舗で分割できないデータの場合はこのプロセスで実行します（結果は同じ）。
+
+    Parameters:
+    - source (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+    - task (str): TASKS のキー
+    - params (dict): 処理に渡す引数
+    - workers (int): ワーカープロセス数、None の場合は CPU 数
+
+    Returns:
+    pd.DataFrame: 店舗ID順に連結した結果
+    """
+    if task not in TASKS:
+        raise ValueError(f"Invalid task: {task}. Use one of {list(TASKS)}.")
+    params = params or {}
+    workers = resolve_workers(workers)
+    if workers == 1 or not _can_shard(source):
+        return TASKS[task](as_cube(source), **params)
+
+    with StoreShards(source) as shards:
+        if shards.n_stores <= 1:
+            return TASKS[task](as_cube(source), **params)
+        parts = shards.shards(min(workers * SHARDS_PER_WORKER, shards.n_stores))
+        with ProcessPoolExecutor(max_workers=min(workers, len(parts))) as executor:
+            futures = [executor.submit(_run_shard, shard, task, params) for shard in parts]
+            results = [future.result() for future in futures]
+    return pd.concat(results, ignore_index=True)
+
+
+def total_sales(source, unit="day", workers=None):
+    """
+    店舗ごと・期間ごとの売上合計を並列に集計します（eda_by_store.aggregate_total_sales_by_store と同じ結果）。
+
+    Parameters:
+    - source (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+    - unit (str): 'day', 'month', 'year' のいずれか、デフォルトは 'day'
+    - workers (int): ワーカープロセス数、None の場合は CPU 数
+
+    Returns:
+    pd.DataFrame: '店舗ID', '日付', '売上' の列を持つ縦持ちのデータ
+    """
+    from .eda_by_store import unit_to_freq
+
+    return map_stores(source, "total_sales", {"freq": unit_to_freq(unit)}, workers=workers)
+
+
+def detrended_sales(source, unit="day", window_size=7, moving_average_type="simple", workers=None):
+    """
+    店舗ごとの売上合計の集計と移動平均の除去を並列に実行します。
+
+    Parameters:
+    - source (pd.DataFrame, SalesCube, or str): 結合済みデータ、日次集計キューブ、またはParquetデータセットのパス
+    - unit (str): 'day', 'month', 'year' のいずれか、デフォルトは 'day'
+    - window_size (int): 移動平均の窓サイズ（'stl' の場合は季節の周期）、デフォルトは 7
+    - moving_average_type (str): 'simple', 'exponential', 'weighted', 'stl' のいずれか、デフォルトは 'simple'
+    - workers (int): ワーカープロセス数、None の場合は CPU 数
+
+    Returns:
+    pd.DataFrame: detrend.detrend_panel の戻り値（'店舗ID', '日付', '売上', '移動平均', '売上除去移動平均' など）
+    """
+    from .eda_by_store import unit_to_freq
+
+    if moving_average_type not in detrend.MOVING_AVERAGE_TYPES:
+        raise ValueError("Invalid moving_average_type. Use 'simple', 'exponential', 'weighted', or 'stl'.")
+    params = {
+        "freq": unit_to_freq(unit),
+        "window_size": window_size,
+        "moving_average_type": moving_average_type,
+    }
+    return map_stores(source, "detrended_sales", params, workers=workers)
+
+
+def sales_by_weekday(source, workers=None):
+    """
+    店舗ごと・年ごとの曜日ごとの売上合計を並列に集計します（eda_by_store.aggregate_sales_by_store_yearly と同じ結果）。
+
+    Returns:
+    pd.DataFrame: '店舗ID', '年', '曜日', '売上' の列を持つ縦持ちのデータ
+    """
+    return map_stores(source, "sales_by_weekday", workers=workers)
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from . import schema
+
+# 準備済みデータに必ず含まれる日付の列
+CALENDAR_COLUMNS = ["曜日", "年", "月", "日", "四半期", "週", "平日/休日"]
+
+
+def is_prepared(df):
+    """
+    描画関数がそのまま使えるデータ（準備済みデータ）かどうかを確認します。
+    日付列がdatetime型で日付順に並んでおり、日付の列（曜日・年・月など）が揃っていれば準備済みとします。
+
+    Parameters:
+    - df (pd.DataFrame): 入力データフレーム
+
+    Returns:
+    bool
+    """
+    if "日付" not in df.columns:
+        return False
+    if not pd.api.types.is_datetime64_any_dtype(df["日付"]):
+        return False
+    if any(column not in df.columns for column in CALENDAR_COLUMNS):
+        return False
+    return df["日付"].is_monotonic_increasing
+
+
+def prepare(df):
+    """
+    データフレームを準備済みデータにします。準備済みの場合はそのまま返し、
+    そうでない場合はコピーに対して 日付列のdatetime型への変換・日付順の並べ替え・日付の列の作成 を行います。
+    入力のデータフレームは変更しません。
+
+    行は日付順に並べますが、インデックスは連番のままにします（pd.Grouper(key='日付') で集計できるように日付は列に残す）。
+
+    Parameters:
+    - df (pd.DataFrame): 結合済みデータ（CSVから読み込んだものでもよい）
+
+    Returns:
+    pd.DataFrame: 準備済みデータ
+    """
+    if is_prepared(df):
+        return df
+
+    from .create_data import add_calendar_columns
+
+    df = df.copy()
+    if not pd.api.types.is_datetime64_any_dtype(df["日付"]):
+        df["日付"] = pd.to_datetime(df["日付"])
+    if not df["日付"].is_monotonic_increasing:
+        df = df.sort_values(by="日付", kind="mergesort", ignore_index=True)
+
+    # 日付の列が欠けている場合のみ作成する
+    if any(column not in df.columns for column in CALENDAR_COLUMNS):
+        calendar = add_calendar_columns(df[["日付"]].copy())
+        for column in CALENDAR_COLUMNS:
+            if column not in df.columns:
+                df[column] = calendar[column]
+
+    return schema.apply_schema(df)
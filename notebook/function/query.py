@@ -0,0 +1,542 @@
+"""
+結合済みデータ（Parquetデータセット）への問い合わせ。
+
+SQL（SELECT 文のサブセット）または Python の引数で条件・集計を指定すると、
+- WHERE の条件はデータセットのフィルタとして渡すので、該当しない 年/月/店舗ID のパーティションのファイルは開かず、
+  他の列の条件も行グループの統計値で読み飛ばされる（述語プッシュダウン）
+- 読み込むのは SELECT・GROUP BY・ORDER BY で使う列だけ
+- 読み込みと集計（GROUP BY）は pyarrow のスレッドプールで並列に実行する
+ので、merged.csv 全体を読み込む新しいセルを書く必要はありません。
+結果は結合済みデータと同じ型（schema.apply_schema）のデータフレームで、eda.py の関数にそのまま渡せます。
+
+例（ノートブックで）:
+    query.sql(
+        "SELECT 商品ID, SUM(売上) AS 売上 FROM sales "
+        "WHERE 店舗ID = 7 AND 平日/休日 = 1 AND 四半期 = 4 "
+        "GROUP BY 商品ID ORDER BY 売上 DESC LIMIT 20",
+        '../processing_data/merged',
+    )
+    query.run('../processing_data/merged', where={'店舗ID': 7, '四半期': 4}, group_by=['商品ID'], aggregate={'売上': 'sum'})
+
+コマンドライン（notebook ディレクトリで実行する）:
+    python -m function.query "SELECT 店舗ID, SUM(売上) AS 売上 FROM sales GROUP BY 店舗ID" --dataset ../processing_data/merged
+"""
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from . import schema
+
+# SQL の集計関数 → pyarrow の集計関数
+AGGREGATE_FUNCTIONS = {
+    "sum": "sum",
+    "count": "count",
+    "avg": "mean",
+    "mean": "mean",
+    "min": "min",
+    "max": "max",
+}
+
+COMPARISON_OPERATORS = ["=", "!=", "<>", "<", "<=", ">", ">="]
+
+KEYWORDS = {
+    "select", "from", "where", "group", "by", "order", "limit", "as", "and", "or", "not",
+    "in", "between", "is", "null", "asc", "desc", "distinct",
+}
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"[^"]+")
+    |(?P<number>-?\d+(?:\.\d+)?(?![^\s(),'"<>=!*]))
+    |(?P<operator><=|>=|<>|!=|=|<|>)
+    |(?P<punctuation>[(),*])
+    |(?P<word>[^\s(),'"<>=!*]+)
+    """,
+    re.VERBOSE,
+)
+
+
+class QueryError(ValueError):
+    """
+    SQL の構文や列名の誤り。
+    """
+
+
+def tokenize(text):
+    """
+    SQL を (種類, 値) のトークンに分けます。
+    列名は日本語や '平日/休日' のような記号を含んでもそのまま書けます（空白などを含む場合は "..." で囲む）。
+    """
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if match is None:
+            raise QueryError(f"unexpected character at {position}: {text[position:position + 10]!r}")
+        kind = match.lastgroup
+        value = match.group()
+        position = match.end()
+        if kind == "space":
+            continue
+        if kind == "string":
+            value = value[1:-1].replace("''", "'")
+        elif kind == "quoted":
+            kind, value = "word", value[1:-1]
+        elif kind == "number":
+            value = float(value) if "." in value else int(value)
+        elif kind == "word" and value.lower() in KEYWORDS:
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser:
+    # SELECT 文のサブセットを問い合わせの計画（dict）に変換する再帰下降パーサ
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.position = 0
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token_kind, token_value = self.peek()
+        if token_kind == kind and (value is None or token_value == value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind, value=None):
+        if not self.accept(kind, value):
+            raise QueryError(f"expected {value or kind} but found {self.peek()[1]!r}")
+
+    def identifier(self):
+        kind, value = self.take()
+        if kind != "word":
+            raise QueryError(f"expected a column name but found {value!r}")
+        return value
+
+    def literal(self):
+        kind, value = self.take()
+        if kind in ("string", "number"):
+            return value
+        if kind == "keyword" and value == "null":
+            return None
+        raise QueryError(f"expected a value but found {value!r}")
+
+    def parse(self):
+        self.expect("keyword", "select")
+        plan = {"select": self.select_list()}
+        self.expect("keyword", "from")
+        kind, value = self.take()
+        if kind not in ("word", "string"):
+            raise QueryError("expected a table name or a dataset path after FROM")
+        plan["source"] = value if kind == "string" else None
+        plan["where"] = self.condition() if self.accept("keyword", "where") else None
+        plan["group_by"] = []
+        if self.accept("keyword", "group"):
+            self.expect("keyword", "by")
+            plan["group_by"] = self.comma_separated(self.identifier)
+        plan["order_by"] = []
+        if self.accept("keyword", "order"):
+            self.expect("keyword", "by")
+            plan["order_by"] = self.comma_separated(self.order_item)
+        plan["limit"] = None
+        if self.accept("keyword", "limit"):
+            plan["limit"] = self.literal()
+        if self.peek()[0] is not None:
+            raise QueryError(f"unexpected {self.peek()[1]!r}")
+        return plan
+
+    def comma_separated(self, item):
+        items = [item()]
+        while self.accept("punctuation", ","):
+            items.append(item())
+        return items
+
+    def select_list(self):
+        if self.accept("punctuation", "*"):
+            return []
+        return self.comma_separated(self.select_item)
+
+    def select_item(self):
+        kind, value = self.peek()
+        if kind == "word" and value.lower() in AGGREGATE_FUNCTIONS and self.peek(1) == ("punctuation", "("):
+            self.take()
+            self.expect("punctuation", "(")
+            distinct = self.accept("keyword", "distinct")
+            column = None if self.accept("punctuation", "*") else self.identifier()
+            self.expect("punctuation", ")")
+            function = value.lower()
+            name = f"{function}({'distinct ' if distinct else ''}{column or '*'})"
+            item = {"function": function, "column": column, "distinct": distinct, "name": name}
+        else:
+            column = self.identifier()
+            item = {"function": None, "column": column, "distinct": False, "name": column}
+        if self.accept("keyword", "as"):
+            item["name"] = self.identifier()
+        return item
+
+    def order_item(self):
+        name = self.identifier()
+        descending = False
+        if self.accept("keyword", "desc"):
+            descending = True
+        else:
+            self.accept("keyword", "asc")
+        return (name, descending)
+
+    # 条件式: OR < AND < NOT < 比較
+    def condition(self):
+        node = self.conjunction()
+        while self.accept("keyword", "or"):
+            node = ("or", node, self.conjunction())
+        return node
+
+    def conjunction(self):
+        node = self.negation()
+        while self.accept("keyword", "and"):
+            node = ("and", node, self.negation())
+        return node
+
+    def negation(self):
+        if self.accept("keyword", "not"):
+            return ("not", self.negation())
+        if self.accept("punctuation", "("):
+            node = self.condition()
+            self.expect("punctuation", ")")
+            return node
+        return self.predicate()
+
+    def predicate(self):
+        column = self.identifier()
+        negate = self.accept("keyword", "not")
+        if self.accept("keyword", "in"):
+            self.expect("punctuation", "(")
+            values = self.comma_separated(self.literal)
+            self.expect("punctuation", ")")
+            node = ("in", column, values)
+        elif self.accept("keyword", "between"):
+            low = self.literal()
+            self.expect("keyword", "and")
+            node = ("between", column, low, self.literal())
+        elif self.accept("keyword", "is"):
+            negate = self.accept("keyword", "not")
+            self.expect("keyword", "null")
+            node = ("is_null", column)
+        else:
+            kind, operator = self.take()
+            if kind != "operator":
+                raise QueryError(f"expected a comparison after {column!r}")
+            node = ("compare", column, operator, self.literal())
+        return ("not", node) if negate else node
+
+
+def parse(text):
+    """
+    SQL（SELECT 文のサブセット）を問い合わせの計画に変換します。
+
+    対応する構文:
+        SELECT * | 列, 集計関数(列) [AS 別名], ...   （集計関数: SUM, COUNT, AVG, MIN, MAX, COUNT(*), COUNT(DISTINCT 列)）
+        FROM テーブル名 | 'データセットのパス'
+        [WHERE 条件]   （=, !=, <>, <, <=, >, >=, IN (...), BETWEEN ... AND ..., IS [NOT] NULL, AND, OR, NOT, 括弧）
+        [GROUP BY 列, ...]
+        [ORDER BY 列 [ASC | DESC], ...]
+        [LIMIT 件数]
+
+    Returns:
+    dict: run_plan に渡す計画
+    """
+    return _Parser(text).parse()
+
+
+def _field(column, dataset_schema):
+    if dataset_schema.get_field_index(column) < 0:
+        raise QueryError(f"unknown column: {column}")
+    return ds.field(column), dataset_schema.field(column).type
+
+
+def _scalar(value, field_type):
+    # 日付の列と比較する文字列は日時に変換する
+    if value is not None and pa.types.is_timestamp(field_type):
+        return pd.Timestamp(value)
+    return value
+
+
+def to_expression(node, dataset_schema):
+    """
+    計画の WHERE 条件を pyarrow のフィルタ式に変換します。
+    """
+    kind = node[0]
+    if kind == "and":
+        return to_expression(node[1], dataset_schema) & to_expression(node[2], dataset_schema)
+    if kind == "or":
+        return to_expression(node[1], dataset_schema) | to_expression(node[2], dataset_schema)
+    if kind == "not":
+        return ~to_expression(node[1], dataset_schema)
+
+    field, field_type = _field(node[1], dataset_schema)
+    if kind == "in":
+        return field.isin([_scalar(value, field_type) for value in node[2]])
+    if kind == "between":
+        return (field >= _scalar(node[2], field_type)) & (field <= _scalar(node[3], field_type))
+    if kind == "is_null":
+        return field.is_null()
+
+    operator, value = node[2], _scalar(node[3], field_type)
+    if operator == "=":
+        return field == value
+    if operator in ("!=", "<>"):
+        return field != value
+    if operator == "<":
+        return field < value
+    if operator == "<=":
+        return field <= value
+    if operator == ">":
+        return field > value
+    return field >= value
+
+
+def where_to_node(where):
+    """
+    Python の条件の指定（列名 → 値）を計画の WHERE 条件に変換します。
+    値はスカラー（=）、リスト（IN）、(演算子, 値) のタプル（例: ('>=', '2019-10-01')）、
+    ('between', 下限, 上限) のいずれかです。
+    """
+    nodes = []
+    for column, condition in (where or {}).items():
+        if isinstance(condition, (list, set)):
+            nodes.append(("in", column, list(condition)))
+        elif isinstance(condition, tuple) and condition and str(condition[0]).lower() == "between":
+            nodes.append(("between", column, condition[1], condition[2]))
+        elif isinstance(condition, tuple):
+            if condition[0] not in COMPARISON_OPERATORS:
+                raise QueryError(f"unknown operator: {condition[0]}")
+            nodes.append(("compare", column, condition[0], condition[1]))
+        else:
+            nodes.append(("compare", column, "=", condition))
+    node = None
+    for item in nodes:
+        node = item if node is None else ("and", node, item)
+    return node
+
+
+def _open(source):
+    if isinstance(source, ds.Dataset):
+        return source
+    if isinstance(source, pd.DataFrame):
+        return ds.dataset(pa.Table.from_pandas(source, preserve_index=False))
+    from . import create_data
+
+    return create_data.open_merged_dataset(source)
+
+
+def run_plan(plan, source=None, use_threads=True):
+    """
+    計画を実行します（parse・run の共通の処理）。
+
+    Parameters:
+    - plan (dict): parse の戻り値
+    - source (str, pyarrow.dataset.Dataset, or pd.DataFrame): データセットのディレクトリなど。
+      None の場合は計画の FROM のパス
+    - use_threads (bool): 読み込み・集計を並列に実行するかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame
+    """
+    source = source if source is not None else plan.get("source")
+    if source is None:
+        raise QueryError("no dataset given; pass source or use FROM '<dataset path>'")
+    dataset = _open(source)
+    dataset_schema = dataset.schema
+
+    select = plan.get("select") or []
+    group_by = list(plan.get("group_by") or [])
+    order_by = list(plan.get("order_by") or [])
+    aggregates = [item for item in select if item["function"] is not None]
+    output_names = [item["name"] for item in select]
+
+    # 必要な列だけを読み込み、WHERE はスキャンに渡す
+    if select:
+        columns = group_by + [item["column"] for item in select if item["column"] is not None]
+        columns += [name for name, _ in order_by if name not in output_names]
+        columns = list(dict.fromkeys(columns))
+        if not columns and aggregates:
+            # COUNT(*) だけの場合も件数を数えるために最小の列を読む
+            columns = [dataset_schema.names[0]]
+    else:
+        columns = list(dataset_schema.names)
+    for column in columns:
+        _field(column, dataset_schema)
+    where = plan.get("where")
+    table = dataset.to_table(
+        columns=columns,
+        filter=to_expression(where, dataset_schema) if where is not None else None,
+        use_threads=use_threads,
+    )
+
+    if aggregates or group_by:
+        for item in select:
+            if item["function"] is None and item["column"] not in group_by:
+                raise QueryError(f"{item['column']} must appear in GROUP BY or be used in an aggregate function")
+        specs, names = [], []
+        for item in aggregates:
+            function = AGGREGATE_FUNCTIONS[item["function"]]
+            if item["column"] is None:
+                specs.append(([], "count_all"))
+            elif item["distinct"]:
+                specs.append((item["column"], "count_distinct"))
+            else:
+                specs.append((item["column"], function))
+            names.append(item["name"])
+        result = table.group_by(group_by, use_threads=use_threads).aggregate(specs)
+        # キー以外の列が集計結果（pyarrow のバージョンによってキーとの前後が変わる）なので、順に SELECT の名前を付ける
+        names = iter(names)
+        table = result.rename_columns(
+            [name if name in group_by else next(names) for name in result.column_names]
+        )
+        sources = [item["name"] if item["function"] else item["column"] for item in select]
+    elif select:
+        sources = [item["column"] for item in select]
+    if select:
+        # ORDER BY で使う SELECT にない列は並べ替えの後で除く
+        extras = [name for name, _ in order_by if name not in output_names and name not in sources]
+        table = table.select(sources + extras).rename_columns(output_names + extras)
+
+    # 辞書型（カテゴリ）の列は pyarrow では並べ替えられないので、その場合は pandas で並べ替える
+    sortable = all(
+        not pa.types.is_dictionary(table.schema.field(name).type) for name, _ in order_by
+    )
+    limit = plan.get("limit")
+    if order_by and sortable:
+        table = table.sort_by([(name, "descending" if descending else "ascending") for name, descending in order_by])
+    if limit is not None and (sortable or not order_by):
+        table = table.slice(0, int(limit))
+
+    df = schema.apply_schema(table.to_pandas())
+    if order_by and not sortable:
+        df = df.sort_values(
+            by=[name for name, _ in order_by],
+            ascending=[not descending for _, descending in order_by],
+            kind="mergesort",
+            ignore_index=True,
+        )
+        if limit is not None:
+            df = df.head(int(limit))
+    if select:
+        df = df[output_names]
+    else:
+        # SELECT * は分割キーの列が末尾に付くので、保存時の列順に戻す
+        pandas_metadata = dataset_schema.pandas_metadata or {}
+        column_order = [column["name"] for column in pandas_metadata.get("columns", [])]
+        column_order = [column for column in column_order if column in df.columns]
+        if len(column_order) == len(df.columns):
+            df = df[column_order]
+    return df
+
+
+def sql(text, source=None, use_threads=True):
+    """
+    SQL（SELECT 文のサブセット、parse を参照）で問い合わせます。
+
+    Parameters:
+    - text (str): SQL
+    - source (str, pyarrow.dataset.Dataset, or pd.DataFrame): データセットのディレクトリなど。
+      None の場合は FROM に書いたパス（例: FROM '../processing_data/merged'）
+    - use_threads (bool): 読み込み・集計を並列に実行するかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame
+    """
+    return run_plan(parse(text), source=source, use_threads=use_threads)
+
+
+def run(source, columns=None, where=None, group_by=None, aggregate=None, order_by=None, limit=None, use_threads=True):
+    """
+    Python の引数で問い合わせます（SQL と同じ処理）。
+
+    Parameters:
+    - source (str, pyarrow.dataset.Dataset, or pd.DataFrame): データセットのディレクトリなど
+    - columns (list): 取り出す列（group_by を指定した場合はキー以外に集計しない列は指定できない）、None の場合は全列
+    - where (dict): 条件（where_to_node を参照）。例: {'店舗ID': 7, '平日/休日': 1, '四半期': 4}
+    - group_by (list): 集計キー
+    - aggregate (dict): 列名 → 集計関数（'sum', 'count', 'mean', 'min', 'max'）またはそのリスト。
+      結果の列名は集計関数が1つなら元の列名、複数なら f'{列}_{関数}'
+    - order_by (list): 列名、または (列名, 'desc') のリスト
+    - limit (int): 件数の上限
+    - use_threads (bool): 読み込み・集計を並列に実行するかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame
+    """
+    group_by = list(group_by or [])
+    select = [{"function": None, "column": column, "distinct": False, "name": column} for column in (columns or group_by)]
+    for column, functions in (aggregate or {}).items():
+        functions = [functions] if isinstance(functions, str) else list(functions)
+        for function in functions:
+            if function not in AGGREGATE_FUNCTIONS:
+                raise QueryError(f"unknown aggregate function: {function}")
+            name = column if len(functions) == 1 else f"{column}_{function}"
+            select.append({"function": function, "column": column, "distinct": False, "name": name})
+
+    orders = []
+    for item in order_by or []:
+        if isinstance(item, str):
+            orders.append((item, False))
+        else:
+            orders.append((item[0], str(item[1]).lower() in ("desc", "descending")))
+
+    plan = {
+        "select": select,
+        "where": where_to_node(where),
+        "group_by": group_by,
+        "order_by": orders,
+        "limit": limit,
+    }
+    return run_plan(plan, source=source, use_threads=use_threads)
+
+
+def main(argv=None):
+    """
+    notebook ディレクトリで実行する:
+        python -m function.query "SELECT 商品ID, SUM(売上) AS 売上 FROM sales WHERE 店舗ID = 7 GROUP BY 商品ID ORDER BY 売上 DESC LIMIT 20"
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="結合済みデータ（Parquetデータセット）への SQL の問い合わせ")
+    parser.add_argument("query", help="SQL（SELECT 文）")
+    parser.add_argument("--dataset", default="../processing_data/merged", help="データセットのディレクトリ")
+    parser.add_argument("--output", default=None, help="結果を保存するCSV・Parquetファイル（拡張子で判定）")
+    parser.add_argument("--threads", type=int, default=None, help="読み込み・集計のスレッド数（既定は CPU 数）")
+    args = parser.parse_args(argv)
+
+    if args.threads is not None:
+        pa.set_cpu_count(args.threads)
+        pa.set_io_thread_count(args.threads)
+
+    plan = parse(args.query)
+    df = run_plan(plan, source=plan["source"] or args.dataset, use_threads=args.threads != 1)
+    if args.output is None:
+        with pd.option_context("display.max_rows", None, "display.width", None):
+            print(df.to_string(index=False))
+    elif os.path.splitext(args.output)[1] == ".parquet":
+        df.to_parquet(args.output, index=False)
+    else:
+        df.to_csv(args.output, index=False, encoding="shift_jis")
+    return df
+
+
+if __name__ == "__main__":
+    main()
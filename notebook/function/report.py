@@ -0,0 +1,298 @@
+"""
+店舗ごとのグラフを画像ファイルとして一括で書き出すバッチ処理。
+
+plt.show() で1枚ずつ表示する代わりに、(グラフの種類, 集計単位, 店舗ID) ごとの描画を
+プロセスプールで並列に実行し、PNG/SVG と一覧ページ (index.html) を出力します。
+描画するデータと設定が前回と同じ画像は描き直しません。
+
+notebook ディレクトリで実行する:
+    python -m function.report ../processing_data/merged ../output/report --workers 4
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from .aggregation import split_by
+from .cube import SalesCube, as_cube
+
+# グラフの種類 → (集計関数, 描画関数, 集計単位ごとに描画するかどうか)
+# 関数は eda_by_store の名前で持つ（ワーカープロセスで読み込む）
+FIGURES = {
+    "total_sales_by_store": ("aggregate_total_sales_by_store", "draw_total_sales_by_store", True),
+    "sales_by_store_category": ("aggregate_sales_by_store_category", "draw_sales_by_store_category", True),
+    "detrended_sales_by_store": ("aggregate_total_sales_by_store", "draw_detrended_sales_by_store", True),
+    "sales_by_store_yearly": ("aggregate_sales_by_store_yearly", "draw_sales_by_store_yearly", False),
+}
+
+FORMATS = ["png", "svg"]
+
+MANIFEST_NAME = "manifest.json"
+INDEX_NAME = "index.html"
+
+
+def _init_worker():
+    # 画面のないプロセスで描画するので、非対話のバックエンドを使う
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _fingerprint(data, params):
+    # 描画するデータと設定から画像の識別子を作る（同じなら描き直さない）
+    digest = hashlib.sha1()
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    digest.update(",".join(data.columns).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _file_name(figure, unit, store_id, fmt):
+    if unit is None:
+        return f"{figure}/store_{store_id}.{fmt}"
+    return f"{figure}/{unit}/store_{store_id}.{fmt}"
+
+
+def build_tasks(source, figures=None, units=("day",), fmt="png", window_size=7, moving_average_type="simple"):
+    """
+    (グラフの種類, 集計単位, 店舗ID) ごとの描画タスクを作成します。
+    集計はここで1回だけ行い、各タスクには描画に使う店舗分のデータだけを持たせます。
+
+    Parameters:
+    - source (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+    - figures (list): 描画するグラフの種類（FIGURES のキー）、None の場合はすべて
+    - units (list): 集計単位 ('day', 'month', 'year')
+    - fmt (str): 画像の形式 ('png' または 'svg')
+    - window_size (int): detrended_sales_by_store の移動平均の窓サイズ
+    - moving_average_type (str): detrended_sales_by_store の移動平均の種類
+
+    Returns:
+    list: タスク（dict）のリスト
+    """
+    from . import eda_by_store
+
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid fmt. Use one of {FORMATS}.")
+    figures = list(FIGURES) if figures is None else list(figures)
+    for figure in figures:
+        if figure not in FIGURES:
+            raise ValueError(f"Invalid figure: {figure}. Use one of {list(FIGURES)}.")
+    for unit in units:
+        eda_by_store.unit_to_freq(unit)
+
+    cube = as_cube(source)
+    tasks = []
+    for figure in figures:
+        aggregate_name, draw_name, by_unit = FIGURES[figure]
+        aggregate = getattr(eda_by_store, aggregate_name)
+        for unit in units if by_unit else [None]:
+            aggregated = aggregate(cube) if unit is None else aggregate(cube, unit=unit)
+            for store_id, data in split_by(aggregated, ["店舗ID"]):
+                params = {"figure": figure, "unit": unit, "store_id": store_id, "fmt": fmt}
+                if figure == "detrended_sales_by_store":
+                    params.update(window_size=window_size, moving_average_type=moving_average_type)
+                tasks.append(
+                    {
+                        "draw": draw_name,
+                        "params": params,
+                        "data": data,
+                        "file_name": _file_name(figure, unit, store_id, fmt),
+                        "fingerprint": _fingerprint(data, params),
+                    }
+                )
+    return tasks
+
+
+def render_task(task, output_dir):
+    """
+    タスク1件分のグラフを描画してファイルに保存します（ワーカープロセスで実行される）。
+
+    Returns:
+    str: 保存したファイル名（output_dir からの相対パス）
+    """
+    import matplotlib.pyplot as plt
+
+    from . import eda_by_store
+
+    params = task["params"]
+    data = task["data"]
+    draw = getattr(eda_by_store, task["draw"])
+
+    if params["figure"] == "detrended_sales_by_store":
+        data = eda_by_store.detrend_store_sales(
+            data, window_size=params["window_size"], moving_average_type=params["moving_average_type"]
+        )
+    if params["unit"] is None:
+        fig = draw(params["store_id"], data)
+    else:
+        fig = draw(params["store_id"], data, unit=params["unit"])
+
+    path = os.path.join(output_dir, task["file_name"])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig.savefig(path, format=params["fmt"], bbox_inches="tight")
+    plt.close(fig)
+    return task["file_name"]
+
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_manifest(output_dir, manifest):
+    with open(os.path.join(output_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def write_index(output_dir, tasks):
+    """
+    書き出した画像の一覧ページ (index.html) を作成します。
+    """
+    sections = {}
+    for task in tasks:
+        params = task["params"]
+        title = params["figure"] if params["unit"] is None else f"{params['figure']} ({params['unit']})"
+        sections.setdefault(title, []).append(task)
+
+    lines = [
+        "<!DOCTYPE html>",
+        '<html lang="ja">',
+        '<head><meta charset="utf-8"><title>店舗別グラフ</title></head>',
+        "<body>",
+        "<h1>店舗別グラフ</h1>",
+    ]
+    for title, section_tasks in sections.items():
+        lines.append(f"<h2>{html.escape(title)}</h2>")
+        for task in section_tasks:
+            src = html.escape(task["file_name"])
+            alt = html.escape(f"店舗ID {task['params']['store_id']}")
+            lines.append(f'<figure><img src="{src}" alt="{alt}" width="800"><figcaption>{alt}</figcaption></figure>')
+    lines += ["</body>", "</html>"]
+
+    path = os.path.join(output_dir, INDEX_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def render_report(
+    source,
+    output_dir,
+    figures=None,
+    units=("day",),
+    fmt="png",
+    workers=None,
+    force=False,
+    window_size=7,
+    moving_average_type="simple",
+    verbose=True,
+):
+    """
+    店舗ごとのグラフをプロセスプールで並列に描画して output_dir に書き出し、一覧ページを作成します。
+    前回と描画するデータ・設定が同じで画像が残っているものはスキップします。
+
+    Parameters:
+    - source (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+    - output_dir (str): 出力先のディレクトリ
+    - figures (list): 描画するグラフの種類（FIGURES のキー）、None の場合はすべて
+    - units (list): 集計単位 ('day', 'month', 'year')、デフォルトは ('day',)
+    - fmt (str): 画像の形式 ('png' または 'svg')、デフォルトは 'png'
+    - workers (int): ワーカープロセス数、None の場合は CPU 数、1 の場合はこのプロセスで描画する
+    - force (bool): 変更がなくてもすべて描き直すかどうか
+    - window_size (int): detrended_sales_by_store の移動平均の窓サイズ
+    - moving_average_type (str): detrended_sales_by_store の移動平均の種類
+    - verbose (bool): 件数を表示するかどうか
+
+    Returns:
+    dict: 'rendered'（描画したファイル）, 'skipped'（スキップしたファイル）,
+    'failed'（描画に失敗したファイル → エラー）, 'index'（一覧ページのパス）
+    """
+    tasks = build_tasks(
+        source,
+        figures=figures,
+        units=units,
+        fmt=fmt,
+        window_size=window_size,
+        moving_average_type=moving_average_type,
+    )
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = _load_manifest(output_dir)
+
+    pending = []
+    skipped = []
+    for task in tasks:
+        unchanged = manifest.get(task["file_name"]) == task["fingerprint"]
+        if not force and unchanged and os.path.exists(os.path.join(output_dir, task["file_name"])):
+            skipped.append(task["file_name"])
+        else:
+            pending.append(task)
+
+    rendered = []
+    failed = {}
+    if workers == 1:
+        _init_worker()
+        for task in pending:
+            try:
+                rendered.append(render_task(task, output_dir))
+            except Exception as e:
+                failed[task["file_name"]] = repr(e)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = {executor.submit(render_task, task, output_dir): task for task in pending}
+            for future in as_completed(futures):
+                try:
+                    rendered.append(future.result())
+                except Exception as e:
+                    failed[futures[future]["file_name"]] = repr(e)
+
+    # 描画に失敗した画像は次回も描き直す
+    for task in pending:
+        if task["file_name"] in failed:
+            manifest.pop(task["file_name"], None)
+        else:
+            manifest[task["file_name"]] = task["fingerprint"]
+    _save_manifest(output_dir, manifest)
+    index_path = write_index(output_dir, [task for task in tasks if task["file_name"] not in failed])
+
+    if verbose:
+        print(f"描画: {len(rendered)} 件, スキップ: {len(skipped)} 件, 失敗: {len(failed)} 件 → {index_path}")
+        for file_name, error in failed.items():
+            print(f"  失敗: {file_name}: {error}")
+    return {"rendered": sorted(rendered), "skipped": skipped, "failed": failed, "index": index_path}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="店舗ごとのグラフを画像ファイルに一括で書き出す")
+    parser.add_argument("source", help="Parquetデータセットのディレクトリ、または SalesCube.save で保存したファイル")
+    parser.add_argument("output_dir", help="出力先のディレクトリ")
+    parser.add_argument("--figures", nargs="+", choices=list(FIGURES), help="描画するグラフの種類")
+    parser.add_argument("--units", nargs="+", default=["day"], choices=["day", "month", "year"], help="集計単位")
+    parser.add_argument("--format", dest="fmt", default="png", choices=FORMATS, help="画像の形式")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数")
+    parser.add_argument("--force", action="store_true", help="変更がなくてもすべて描き直す")
+    args = parser.parse_args(argv)
+
+    if os.path.isdir(args.source):
+        source = SalesCube.from_dataset(args.source)
+    else:
+        source = SalesCube.load(args.source)
+    render_report(
+        source,
+        args.output_dir,
+        figures=args.figures,
+        units=args.units,
+        fmt=args.fmt,
+        workers=args.workers,
+        force=args.force,
+    )
+
+
+if __name__ == "__main__":
+    main()
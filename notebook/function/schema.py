@@ -0,0 +1,116 @@
+import pandas as pd
+
+# 曜日の順序（dt.day_name() の値）
+WEEKDAY_ORDER = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+# 同じ文字列が行ごとに繰り返される列はカテゴリ型（辞書エンコード）で保持する
+CATEGORY_COLUMNS = ["商品カテゴリ名", "商品カテゴリ", "商品名"]
+
+# 値の範囲に合わせた整数型
+INTEGER_DTYPES = {
+    "店舗ID": "int16",
+    "商品ID": "int32",
+    "商品カテゴリID": "int16",
+    "商品価格": "int32",
+    "売上個数": "int32",
+    "売上": "int64",
+    "年": "int16",
+    "月": "int8",
+    "日": "int8",
+    "四半期": "int8",
+    "週": "int8",
+    "平日/休日": "int8",
+    "祝日": "int8",
+    "日付キー": "int32",
+}
+
+
+def memory_usage(df):
+    """
+    データフレームのメモリ使用量（文字列の中身も含む）をバイト数で返します。
+    """
+    return int(df.memory_usage(deep=True).sum())
+
+
+def apply_schema(df):
+    """
+    結合済みデータにカテゴリ型・幅の狭い整数型を適用します。
+    既に型が合っている列はそのまま使うので、読み込み済みのデータに何度適用しても安価です。
+
+    Parameters:
+    - df (pd.DataFrame): 結合済みデータ（一部の列だけでもよい）
+
+    Returns:
+    pd.DataFrame: 型を変換したデータフレーム（入力は変更しない）
+    """
+    df = df.copy(deep=False)
+
+    if "日付" in df.columns and not pd.api.types.is_datetime64_any_dtype(df["日付"]):
+        df["日付"] = pd.to_datetime(df["日付"])
+
+    for column, dtype in INTEGER_DTYPES.items():
+        if column in df.columns and df[column].dtype != dtype:
+            df[column] = df[column].astype(dtype)
+
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+
+    if "曜日" in df.columns:
+        weekday_dtype = pd.CategoricalDtype(WEEKDAY_ORDER, ordered=True)
+        if df["曜日"].dtype != weekday_dtype:
+            df["曜日"] = df["曜日"].astype(str).astype(weekday_dtype)
+
+    return df
+
+
+def optimize(df, verbose=True):
+    """
+    apply_schema を適用し、変換前後のメモリ使用量を表示します。
+    （CSVから読み込んだデータなどを圧縮する場合に使用）
+
+    Parameters:
+    - df (pd.DataFrame): 結合済みデータ
+    - verbose (bool): メモリ使用量を表示するかどうか、デフォルトは True
+
+    Returns:
+    pd.DataFrame
+    """
+    before = memory_usage(df)
+    compact_df = apply_schema(df)
+    after = memory_usage(compact_df)
+
+    if verbose:
+        print(memory_report(before, after))
+    return compact_df
+
+
+def memory_report(before, after):
+    """
+    変換前後のメモリ使用量（バイト数）を表示用の文字列にします。
+    """
+    reduction = 1 - after / before if before else 0.0
+    return (
+        f"メモリ使用量: {before / 1024 ** 2:,.1f} MB -> {after / 1024 ** 2:,.1f} MB"
+        f" ({reduction:.1%} 削減)"
+    )
+
+
+def remove_unused_categories(df):
+    """
+    集計・絞り込み後のデータからカテゴリ型の未使用カテゴリを除きます。
+    （seabornの凡例やgroupbyに存在しないカテゴリが出ないようにする）
+    """
+    df = df.copy(deep=False)
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.remove_unused_categories()
+    return df
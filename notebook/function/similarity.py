@@ -0,0 +1,347 @@
+"""
+売上推移の似ている商品の検索。
+
+商品 × 日付 の売上の行列を一度だけ作り、問い合わせの系列との 相関・コサイン類似度・DTW距離 を
+全商品について行列演算でまとめて計算して、上位 k 件を返します。
+全商品どうしの近傍表（nearest_neighbours）を作っておけば、商品を指定した検索は表を引くだけになります。
+
+例（ノートブックで）:
+    matrix = similarity.SalesMatrix.from_frame(df, key='商品カテゴリ名')
+    matrix.search('ギフト - フィギュア', k=5, where={'商品カテゴリ': ['映画', 'ゲーム', 'PCゲーム']})
+"""
+import numpy as np
+import pandas as pd
+
+from . import cube as cube_module
+
+SIMILARITY_METHODS = ["correlation", "cosine", "dtw"]
+
+# 行列を作るときに一緒に保持する、キーごとに1つの値を持つ列
+DEFAULT_ATTRIBUTES = ["商品カテゴリ名", "商品カテゴリ", "商品名"]
+
+
+def _rolling_envelope(query, window):
+    # 各位置の前後 window の範囲の最大値・最小値（LB_Keogh の上下の包絡線）
+    padded_max = np.pad(query, window, constant_values=-np.inf)
+    padded_min = np.pad(query, window, constant_values=np.inf)
+    upper = np.lib.stride_tricks.sliding_window_view(padded_max, 2 * window + 1).max(axis=1)
+    lower = np.lib.stride_tricks.sliding_window_view(padded_min, 2 * window + 1).min(axis=1)
+    return upper, lower
+
+
+def lb_keogh(matrix, query, window):
+    """
+    DTW距離の下限（LB_Keogh）を全行まとめて計算します。
+    """
+    upper, lower = _rolling_envelope(query, window)
+    above = np.clip(matrix - upper, 0, None)
+    below = np.clip(lower - matrix, 0, None)
+    return np.sqrt((above**2 + below**2).sum(axis=1))
+
+
+def dtw_distance(matrix, query, window):
+    """
+    各行と query の DTW距離（差の2乗の和の平方根、|i - j| <= window の帯の中だけを探索する）を全行まとめて計算します。
+    行ごと・位置ごとの Python のループはなく、query の位置ごとに帯の幅のベクトル演算を行います。
+
+    Parameters:
+    - matrix (np.ndarray): 行 × 位置 の行列
+    - query (np.ndarray): 問い合わせの系列（matrix の列数と同じ長さ）
+    - window (int): 帯の幅
+
+    Returns:
+    np.ndarray: 行ごとの距離
+    """
+    n_rows, length = matrix.shape
+    previous = np.full((n_rows, length + 1), np.inf)
+    previous[:, 0] = 0.0
+    for i in range(1, length + 1):
+        lo = max(1, i - window)
+        hi = min(length, i + window)
+        cost = (matrix[:, lo - 1 : hi] - query[i - 1]) ** 2
+        # 上と左上からの最小値
+        reach = cost + np.minimum(previous[:, lo : hi + 1], previous[:, lo - 1 : hi])
+        # 左からの経路: cur[j] = min(reach[j], cost[j] + cur[j-1]) を累積和と累積最小値で解く
+        cumulative = np.cumsum(cost, axis=1)
+        current = np.full((n_rows, length + 1), np.inf)
+        current[:, lo : hi + 1] = cumulative + np.minimum.accumulate(reach - cumulative, axis=1)
+        previous = current
+    return np.sqrt(previous[:, length])
+
+
+def _normalize(matrix, method):
+    if method == "zscore":
+        centered = matrix - matrix.mean(axis=1, keepdims=True)
+        scale = matrix.std(axis=1, keepdims=True)
+    else:
+        centered = matrix
+        scale = np.sqrt((matrix**2).sum(axis=1, keepdims=True))
+    # 一定の系列（売上のない商品など）は 0 にする
+    return np.divide(centered, scale, out=np.zeros_like(centered), where=scale > 0)
+
+
+class SalesMatrix:
+    """
+    キー（商品ID など）× 日付 の売上の行列。正規化した行列と近傍表は一度計算したものを再利用します。
+
+    Parameters:
+    - matrix (np.ndarray): キー × 日付 の値（値のない日は 0）
+    - labels (pd.DataFrame): 各行のキーと属性（商品カテゴリ など）
+    - dates (pd.DatetimeIndex): 列の日付
+    - keys (list): labels のうちキーの列
+    """
+
+    def __init__(self, matrix, labels, dates, keys):
+        self.matrix = matrix
+        self.labels = labels.reset_index(drop=True)
+        self.dates = dates
+        self.keys = list(keys)
+        self.index = None
+        self._normalized = {}
+
+    @classmethod
+    def from_frame(cls, df, key="商品ID", value="売上", freq="D", attributes=None):
+        """
+        結合済みデータ（または日次集計キューブ）から キー × 期間 の行列を作ります。
+
+        Parameters:
+        - df (pd.DataFrame or SalesCube): 結合済みデータ、または日次集計キューブ
+        - key (str or list): 行のキー（例: '商品ID', '商品カテゴリ名'）
+        - value (str): 値の列、デフォルトは '売上'
+        - freq (str): 期間の指定 ('D', 'W', 'M')、デフォルトは 'D'
+        - attributes (list): 各行に保持する列（キーごとに1つの値を持つもの）、
+          None の場合は DEFAULT_ATTRIBUTES のうち df にあるもの
+
+        Returns:
+        SalesMatrix
+        """
+        keys = [key] if isinstance(key, str) else list(key)
+        if isinstance(df, cube_module.SalesCube) or all(name in cube_module.CUBE_KEYS for name in keys):
+            rolled = cube_module.as_cube(df).rollup(keys, freq=freq, values=[value])
+        else:
+            rolled = (
+                df.groupby(keys + [pd.Grouper(key="日付", freq=freq)], observed=True, sort=True)[value]
+                .sum()
+                .reset_index()
+            )
+
+        # 縦持ちのデータをコードで行列に配置する（pivot_table を使わない）
+        grouped = rolled.groupby(keys, observed=True, sort=True)
+        row_codes = grouped.ngroup().to_numpy()
+        labels = grouped.size().index.to_frame(index=False)
+        dates = pd.date_range(rolled["日付"].min(), rolled["日付"].max(), freq=freq)
+        column_codes = dates.get_indexer(rolled["日付"])
+        matrix = np.zeros((len(labels), len(dates)))
+        np.add.at(matrix, (row_codes, column_codes), rolled[value].to_numpy().astype(np.float64))
+
+        if attributes is None:
+            attributes = DEFAULT_ATTRIBUTES if isinstance(df, pd.DataFrame) else []
+        attributes = [
+            name
+            for name in attributes
+            if isinstance(df, pd.DataFrame) and name in df.columns and name not in keys
+        ]
+        if attributes:
+            values = df[keys + attributes].drop_duplicates(subset=keys)
+            labels = labels.merge(values, on=keys, how="left")
+        return cls(matrix, labels, dates, keys)
+
+    def __len__(self):
+        return len(self.matrix)
+
+    def normalized(self, method="zscore"):
+        """
+        行ごとに正規化した行列を返します（'zscore': 平均0・標準偏差1、'l2': 長さ1）。
+        """
+        if method not in self._normalized:
+            self._normalized[method] = _normalize(self.matrix, method)
+        return self._normalized[method]
+
+    def position(self, label):
+        """
+        キーの値（複数のキーの場合はタプル）に対応する行番号を返します。
+        """
+        label = label if isinstance(label, tuple) else (label,)
+        mask = np.ones(len(self.labels), dtype=bool)
+        for name, value in zip(self.keys, label):
+            mask &= (self.labels[name] == value).to_numpy()
+        positions = np.flatnonzero(mask)
+        if len(positions) == 0:
+            raise KeyError(label)
+        return int(positions[0])
+
+    def vector(self, query):
+        """
+        問い合わせを行列の列（日付）に揃えた系列にします。
+
+        Parameters:
+        - query: キーの値（行列の行）、日付をインデックスとする pd.Series、または列数と同じ長さの配列
+
+        Returns:
+        np.ndarray
+        """
+        if isinstance(query, pd.Series):
+            return query.reindex(self.dates, fill_value=0).to_numpy().astype(np.float64)
+        if isinstance(query, np.ndarray):
+            if len(query) != len(self.dates):
+                raise ValueError("query must have one value per date")
+            return query.astype(np.float64)
+        return self.matrix[self.position(query)]
+
+    def _mask(self, where):
+        mask = np.ones(len(self), dtype=bool)
+        for column, condition in (where or {}).items():
+            values = condition if isinstance(condition, (list, tuple, set)) else [condition]
+            mask &= self.labels[column].isin(values).to_numpy()
+        return mask
+
+    def similarity(self, query, method="correlation"):
+        """
+        全行と query の類似度（'correlation': 相関係数、'cosine': コサイン類似度）を1回の行列積で計算します。
+        """
+        vector = self.vector(query)[None, :]
+        if method == "correlation":
+            return self.normalized("zscore") @ _normalize(vector, "zscore")[0] / len(self.dates)
+        if method == "cosine":
+            return self.normalized("l2") @ _normalize(vector, "l2")[0]
+        raise ValueError("Invalid method. Use 'correlation' or 'cosine'.")
+
+    def _dtw_top_k(self, query, candidates, k, window):
+        # LB_Keogh の小さい順に DTW距離を計算し、k 番目の距離より下限が大きい候補は計算しない
+        matrix = self.normalized("zscore")
+        vector = _normalize(self.vector(query)[None, :], "zscore")[0]
+        lower_bounds = lb_keogh(matrix[candidates], vector, window)
+        order = candidates[np.argsort(lower_bounds, kind="stable")]
+        sorted_bounds = np.sort(lower_bounds, kind="stable")
+
+        batch_size = max(4 * k, 64)
+        positions = np.empty(0, dtype=np.int64)
+        distances = np.empty(0)
+        for start in range(0, len(order), batch_size):
+            if len(distances) >= k and sorted_bounds[start] >= np.sort(distances)[k - 1]:
+                break
+            batch = order[start : start + batch_size]
+            positions = np.concatenate([positions, batch])
+            distances = np.concatenate([distances, dtw_distance(matrix[batch], vector, window)])
+        best = np.argsort(distances, kind="stable")[:k]
+        return positions[best], distances[best]
+
+    def search(self, query, k=10, method="correlation", where=None, window=None, exclude_query=True):
+        """
+        query に売上推移が似ている行を上位 k 件返します。
+
+        Parameters:
+        - query: キーの値（例: 'ギフト - フィギュア'）、日付をインデックスとする pd.Series、または配列
+        - k (int): 返す件数、デフォルトは 10
+        - method (str): 'correlation'（相関係数）、'cosine'（コサイン類似度）、
+          'dtw'（平均0・標準偏差1 に揃えた系列の DTW距離、小さいほど似ている）のいずれか、デフォルトは 'correlation'
+        - where (dict): 列名 → 値（またはリスト）の候補の絞り込み条件（例: {'商品カテゴリ': ['映画', 'ゲーム']}）
+        - window (int): 'dtw' の帯の幅（期間の数）、None の場合は系列の長さの 10%
+        - exclude_query (bool): query がキーの値の場合に、自分自身を結果から除くかどうか、デフォルトは True
+
+        Returns:
+        pd.DataFrame: labels の列と '類似度'（'dtw' の場合は 'DTW距離'）, '順位' の列
+        """
+        if method not in SIMILARITY_METHODS:
+            raise ValueError("Invalid method. Use 'correlation', 'cosine', or 'dtw'.")
+
+        is_label = not isinstance(query, (pd.Series, np.ndarray))
+        mask = self._mask(where)
+        if is_label and exclude_query:
+            mask[self.position(query)] = False
+
+        # 近傍表があれば、キーの値での検索は表を引くだけにする
+        if (
+            self.index is not None
+            and is_label
+            and exclude_query
+            and method == self.index.attrs.get("method")
+            and k <= self.index.attrs.get("k", 0)
+        ):
+            hits = self.index[self.index["行"] == self.position(query)]
+            hits = hits[mask[hits["近傍"].to_numpy()]].head(k)
+            if len(hits) >= min(k, int(mask.sum())):
+                return self._result(hits["近傍"].to_numpy(), hits["類似度"].to_numpy(), "類似度")
+
+        candidates = np.flatnonzero(mask)
+        k = min(k, len(candidates))
+        if method == "dtw":
+            window = max(1, len(self.dates) // 10) if window is None else window
+            positions, distances = self._dtw_top_k(query, candidates, k, window)
+            return self._result(positions, distances, "DTW距離")
+
+        scores = self.similarity(query, method)[candidates]
+        top = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self._result(candidates[top], scores[top], "類似度")
+
+    def _result(self, positions, scores, column):
+        result = self.labels.iloc[positions].reset_index(drop=True)
+        result[column] = scores
+        result["順位"] = np.arange(1, len(result) + 1)
+        return result
+
+    def nearest_neighbours(self, k=10, method="correlation", block_size=1024):
+        """
+        全行について類似度の上位 k 件の近傍表を作り、search で使えるように保持します。
+        行列積はブロックごとに計算するので、メモリ使用量は block_size × 行数 に比例します。
+
+        Parameters:
+        - k (int): 行ごとに保持する近傍の数、デフォルトは 10
+        - method (str): 'correlation' または 'cosine'、デフォルトは 'correlation'
+        - block_size (int): 1回に計算する行数、デフォルトは 1024
+
+        Returns:
+        pd.DataFrame: '行', '近傍', '類似度', '順位' の列を持つ近傍表
+        """
+        if method == "correlation":
+            normalized, scale = self.normalized("zscore"), len(self.dates)
+        elif method == "cosine":
+            normalized, scale = self.normalized("l2"), 1
+        else:
+            raise ValueError("Invalid method. Use 'correlation' or 'cosine'.")
+
+        k = min(k, len(self) - 1)
+        rows, neighbours, scores = [], [], []
+        for start in range(0, len(self), block_size):
+            block = normalized[start : start + block_size] @ normalized.T / scale
+            block_rows = np.arange(start, start + len(block))
+            # 自分自身は除く
+            block[np.arange(len(block)), block_rows] = -np.inf
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            rows.append(np.repeat(block_rows, k))
+            neighbours.append(np.take_along_axis(top, order, axis=1).ravel())
+            scores.append(np.take_along_axis(top_scores, order, axis=1).ravel())
+
+        index = pd.DataFrame(
+            {
+                "行": np.concatenate(rows) if rows else np.empty(0, dtype=np.int64),
+                "近傍": np.concatenate(neighbours) if neighbours else np.empty(0, dtype=np.int64),
+                "類似度": np.concatenate(scores) if scores else np.empty(0),
+            }
+        )
+        index["順位"] = np.tile(np.arange(1, k + 1), len(self)) if k > 0 else np.empty(0, dtype=np.int64)
+        index.attrs.update({"method": method, "k": k})
+        self.index = index
+        return index
+
+    def save_index(self, path):
+        """
+        近傍表をParquetファイルに保存します。
+        """
+        if self.index is None:
+            raise ValueError("call nearest_neighbours first")
+        table = self.index.assign(方法=self.index.attrs["method"])
+        table.to_parquet(path, index=False)
+
+    def load_index(self, path):
+        """
+        save_index で保存した近傍表を読み込みます（同じデータから作った行列に対して使うこと）。
+        """
+        table = pd.read_parquet(path)
+        index = table.drop(columns="方法")
+        index.attrs.update({"method": table["方法"].iloc[0], "k": int(table["順位"].max())})
+        self.index = index
+        return index